@@ -2,13 +2,94 @@
 A cli entry point to do quick calls to PyHTCC
 """
 import argparse
+import csv
 import getpass
+import json
 import os
 import pprint
-
-from csmlog import enableConsoleLogging
+import sys
+import typing
 
 from pyhtcc import PyHTCC
+from pyhtcc.pyhtcc import DetailLevel
+
+# fields shown in csv output if --fields isn't given
+DEFAULT_CSV_FIELDS = (
+    "DeviceID",
+    "Name",
+    "DispTemp",
+    "DispUnits",
+    "IndoorHumi",
+    "EquipmentOutputStatus",
+    "latestData.uiData.HeatSetpoint",
+    "latestData.uiData.CoolSetpoint",
+)
+
+
+def _get_field(zone_info: dict, field: str) -> typing.Any:
+    """gets the value at the given dotted path (like latestData.uiData.HeatSetpoint) or None if it isn't there"""
+    value = zone_info
+    for key in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _get_output_fields(
+    fmt: str, fields: typing.Optional[typing.List[str]]
+) -> typing.Optional[typing.List[str]]:
+    """returns the (dotted path) fields written in the given format, or None if every field is written"""
+    if not fields and fmt == "csv":
+        return list(DEFAULT_CSV_FIELDS)
+    return fields
+
+
+def _get_detail_for_fields(fields: typing.Optional[typing.List[str]]) -> DetailLevel:
+    """
+    returns the lowest DetailLevel needed to get all of the given (dotted path) fields (see _get_output_fields()).
+    None means every field, so needs DetailLevel.Full.
+    """
+    if not fields:
+        return DetailLevel.Full
+    return DetailLevel.for_fields(f.split(".")[0] for f in fields)
+
+
+def _write_zone_infos(
+    zone_infos: typing.Iterable[dict],
+    fmt: str,
+    fields: typing.Optional[typing.List[str]],
+    out: typing.TextIO,
+) -> None:
+    """
+    Writes each zone info to out in the given format (pprint, json, ndjson or csv), as each one is ready.
+    If fields is given, only those (dotted path) fields are written.
+    """
+    fields = _get_output_fields(fmt, fields)
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(fields)
+
+    if fmt == "json":
+        out.write("[")
+
+    for idx, zone_info in enumerate(zone_infos):
+        if fields:
+            zone_info = {f: _get_field(zone_info, f) for f in fields}
+
+        if fmt == "csv":
+            writer.writerow([zone_info[f] for f in fields])
+        elif fmt == "ndjson":
+            out.write(json.dumps(zone_info) + "\n")
+        elif fmt == "json":
+            out.write(("," if idx else "") + "\n" + json.dumps(zone_info, indent=2))
+        else:
+            pprint.pprint(zone_info, stream=out)
+
+        out.flush()
+
+    if fmt == "json":
+        out.write("\n]\n")
 
 
 def main():
@@ -32,7 +113,7 @@ def main():
         "-n",
         "--name",
         type=str,
-        help="Thermostat name to target. If not given, targets all zones",
+        help="Thermostat name (case-insensitive, can be a glob like 'up*') to target. If not given, targets all zones",
     )
     parser.add_argument(
         "-s",
@@ -40,6 +121,18 @@ def main():
         action="store_true",
         help="If given, will show info and quit.",
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=("pprint", "json", "ndjson", "csv"),
+        help="Format to show info in. Implies --show-info. Defaults to pprint",
+    )
+    parser.add_argument(
+        "--fields",
+        type=lambda s: [f.strip() for f in s.split(",") if f.strip()],
+        help="Comma separated (dotted path) fields to show, like: Name,DispTemp,latestData.uiData.HeatSetpoint. "
+        "Implies --show-info. Per-zone requests are only made if the given fields need them.",
+    )
     parser.add_argument(
         "-d", "--debug", action="store_true", help="If given, will log to stdout"
     )
@@ -57,9 +150,40 @@ def main():
     heat_cool_action_group.add_argument(
         "-C", "--cool", type=int, help="Set a target cooling temperature"
     )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    apply_parser = subparsers.add_parser(
+        "apply",
+        help="Apply a json/toml plan of per-zone targets (heat, cool, hold_until, fan, mode) concurrently",
+    )
+    apply_parser.add_argument("plan", type=str, help="Path to a .json or .toml plan")
+    apply_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="Max number of zones to change at the same time",
+    )
+    apply_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="If given, will show the changes that would be made and quit.",
+    )
     args = parser.parse_args()
 
+    plan = None
+    if args.command == "apply":
+        # fail on a bad plan before logging in
+        from pyhtcc.plan import load_plan
+
+        plan = load_plan(args.plan)
+
     if args.debug:
+        from csmlog import enableConsoleLogging
+
+        from pyhtcc.pyhtcc import _setup_logging
+
+        _setup_logging()
         enableConsoleLogging()
 
     if args.user:
@@ -82,15 +206,45 @@ def main():
 
     pyhtcc = PyHTCC(user, password)
 
+    if plan is not None:
+        from pyhtcc.plan import apply_plan
+
+        results = apply_plan(
+            pyhtcc, plan, max_workers=args.workers, dry_run=args.dry_run
+        )
+        failed = False
+        for name, result in sorted(results.items()):
+            if isinstance(result, Exception):
+                failed = True
+                print(f"{name}: FAILED ({result})")
+            else:
+                print(
+                    f"{name}: {'would submit' if args.dry_run else 'submitted'} {result}"
+                )
+
+        if args.logout:
+            pyhtcc.logout()
+
+        sys.exit(1 if failed else 0)
+
+    zones = None
     if args.name:
-        zones = [pyhtcc.get_zone_by_name(args.name)]
-    else:
-        zones = pyhtcc.get_all_zones()
+        zones = pyhtcc.get_zones_by_name(args.name)
+        if not zones:
+            raise NameError(f"Could not find a zone with the given name: {args.name}")
+
+    if args.show_info or args.format or args.fields:
+        fmt = args.format or "pprint"
+        fields = _get_output_fields(fmt, args.fields)
+        if zones is not None:
+            zone_infos = [i.zone_info for i in zones]
+        else:
+            zone_infos = pyhtcc.iter_zones_info(detail=_get_detail_for_fields(fields))
 
-        for i in zones:
-            if args.show_info:
-                pprint.pprint(i.zone_info)
+        _write_zone_infos(zone_infos, fmt, fields, sys.stdout)
 
+    if args.heat or args.cool:
+        for i in zones or pyhtcc.get_all_zones():
             if args.heat:
                 print(f"Setting setpoint for {i.get_name()} to {args.heat}")
                 i.set_permanent_heat_setpoint(args.heat)
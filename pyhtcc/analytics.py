@@ -0,0 +1,333 @@
+"""
+Vectorized runtime and duty-cycle analytics over recorded zone history.
+
+This module requires numpy. Install it via: pip install pyhtcc[analytics]
+"""
+from __future__ import annotations
+
+import datetime
+import typing
+
+try:
+    import numpy as np  # depends (optional)
+except ImportError:  # pragma: no cover
+    np = None
+
+from .pyhtcc import SystemMode
+
+HEAT_MODES = (SystemMode.Heat, SystemMode.AutoHeat, SystemMode.EMHeat)
+COOL_MODES = (SystemMode.Cool, SystemMode.AutoCool)
+
+
+def _require_numpy() -> None:
+    """raises an ImportError with a helpful message if numpy is unavailable"""
+    if np is None:
+        raise ImportError(
+            "numpy is required for pyhtcc.analytics. Install it via: pip install pyhtcc[analytics]"
+        )
+
+
+def _to_epoch_seconds(timestamps) -> "np.ndarray":
+    """converts datetime64s, datetimes or numbers to float epoch seconds"""
+    arr = np.asarray(timestamps)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype("datetime64[ns]").astype(np.int64) / 1e9
+
+    if arr.dtype == object:
+        return np.array(
+            [
+                t.timestamp() if isinstance(t, datetime.datetime) else float(t)
+                for t in arr
+            ],
+            dtype=np.float64,
+        )
+
+    return arr.astype(np.float64)
+
+
+class RuntimeSummary(typing.NamedTuple):
+    """
+    Per (zone, window) metrics computed by RecordedHistory.summarize().
+    Each field is a numpy array with one entry per (zone, window) pair that had samples.
+
+    Runtimes and durations are in seconds. tracking_error is the time-weighted mean absolute difference
+        between the displayed temperature and the active setpoint (NaN if the system was never heating/cooling).
+    """
+
+    device_ids: "np.ndarray"
+    window_starts: "np.ndarray"
+    duration: "np.ndarray"
+    heat_runtime: "np.ndarray"
+    cool_runtime: "np.ndarray"
+    fan_runtime: "np.ndarray"
+    heat_duty_cycle: "np.ndarray"
+    cool_duty_cycle: "np.ndarray"
+    cycles: "np.ndarray"
+    cycles_per_hour: "np.ndarray"
+    tracking_error: "np.ndarray"
+
+
+class RecordedHistory:
+    """
+    Columnar, numpy-backed history of sampled zone state across any number of zones.
+
+    Samples are sorted by (device id, timestamp) once on construction. Each sample is considered to hold
+        until the next sample of the same zone (capped by max_sample_gap), which is what runtimes are based on.
+    """
+
+    def __init__(
+        self,
+        device_ids,
+        timestamps,
+        equipment_output_status,
+        system_switch_position,
+        fan_is_running,
+        temperature=None,
+        heat_setpoint=None,
+        cool_setpoint=None,
+        max_sample_gap: typing.Optional[float] = None,
+    ):
+        """
+        Initializer for a RecordedHistory object.
+        Takes equal-length sequences (or numpy arrays) with one entry per sample.
+
+        timestamps may be epoch seconds, datetime.datetime objects or numpy datetime64 values.
+        If max_sample_gap (seconds) is given, no sample is considered to last longer than that. This keeps
+            gaps in recording from being counted as runtime.
+        """
+        _require_numpy()
+
+        device_ids = np.asarray(device_ids, dtype=np.int64)
+        timestamps = _to_epoch_seconds(timestamps)
+        n = len(device_ids)
+
+        def _column(values, dtype):
+            if values is None:
+                return np.full(n, np.nan) if dtype == np.float64 else np.zeros(n, dtype)
+            return np.asarray(values, dtype=dtype)
+
+        columns = {
+            "eos": _column(equipment_output_status, np.int64),
+            "mode": _column(system_switch_position, np.int64),
+            "fan": _column(fan_is_running, np.bool_),
+            "temp": _column(temperature, np.float64),
+            "heat_sp": _column(heat_setpoint, np.float64),
+            "cool_sp": _column(cool_setpoint, np.float64),
+        }
+
+        for name, col in columns.items():
+            if len(col) != n or len(timestamps) != n:
+                raise ValueError(f"All columns must have the same length ({name})")
+
+        # sort once by (device id, timestamp) unless the data already is
+        if n > 1 and not (
+            np.all(device_ids[1:] >= device_ids[:-1])
+            and np.all(
+                (device_ids[1:] != device_ids[:-1])
+                | (timestamps[1:] >= timestamps[:-1])
+            )
+        ):
+            order = np.lexsort((timestamps, device_ids))
+            device_ids = device_ids[order]
+            timestamps = timestamps[order]
+            columns = {k: v[order] for k, v in columns.items()}
+
+        self.timestamps = timestamps
+
+        same_zone_as_next = np.zeros(n, dtype=np.bool_)
+        if n > 1:
+            same_zone_as_next[:-1] = device_ids[1:] == device_ids[:-1]
+
+        # since we're sorted, each zone is a contiguous run of samples: [bounds[i], bounds[i + 1])
+        zone_starts = (
+            np.flatnonzero(np.r_[True, ~same_zone_as_next[:-1]])
+            if n
+            else np.zeros(0, np.int64)
+        )
+        self.zone_ids = device_ids[zone_starts]
+        self._zone_bounds = np.r_[zone_starts, n]
+
+        # how long each sample holds for: until the next sample of the same zone
+        dt = np.zeros(n)
+        if n > 1:
+            dt[:-1] = np.diff(timestamps)
+        dt[~same_zone_as_next] = 0
+        if max_sample_gap is not None:
+            np.minimum(dt, max_sample_gap, out=dt)
+
+        on = columns["eos"] != 0
+        heating = np.isin(columns["mode"], HEAT_MODES)
+        cooling = np.isin(columns["mode"], COOL_MODES)
+
+        # a cycle starts when output turns on after being off in the previous sample of the same zone
+        cycle_starts = np.zeros(n, dtype=np.int64)
+        if n > 1:
+            cycle_starts[1:] = on[1:] & ~on[:-1] & same_zone_as_next[:-1]
+
+        setpoint = np.where(
+            heating, columns["heat_sp"], np.where(cooling, columns["cool_sp"], np.nan)
+        )
+        abs_error = np.abs(columns["temp"] - setpoint)
+        error_valid = ~np.isnan(abs_error)
+
+        # Prefix sums of every per-sample quantity. Any contiguous run of samples (a zone/window pair)
+        #   then sums in O(1) as prefix[end] - prefix[start], so summarize() never touches every sample.
+        def _prefix(values):
+            return np.r_[0, np.cumsum(values)]
+
+        self._prefix = {
+            "duration": _prefix(dt),
+            "heat_runtime": _prefix(dt * (on & heating)),
+            "cool_runtime": _prefix(dt * (on & cooling)),
+            "fan_runtime": _prefix(dt * columns["fan"]),
+            "cycles": _prefix(cycle_starts),
+            "error_weight": _prefix(dt * error_valid),
+            "error_sum": _prefix(np.where(error_valid, abs_error, 0.0) * dt),
+        }
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_records(
+        cls, records: typing.Iterable[dict], **kwargs
+    ) -> "RecordedHistory":
+        """
+        Builds a RecordedHistory from flat dict records. Each record needs the keys:
+            timestamp, DeviceID, EquipmentOutputStatus, SystemSwitchPosition, fanIsRunning
+        and can optionally have:
+            DispTemperature, HeatSetpoint, CoolSetpoint
+        """
+        _require_numpy()
+        keys = (
+            "DeviceID",
+            "timestamp",
+            "EquipmentOutputStatus",
+            "SystemSwitchPosition",
+            "fanIsRunning",
+            "DispTemperature",
+            "HeatSetpoint",
+            "CoolSetpoint",
+        )
+        columns = {k: [] for k in keys}
+        for record in records:
+            for k in keys:
+                columns[k].append(record.get(k))
+
+        return cls(*(columns[k] for k in keys), **kwargs)
+
+    @classmethod
+    def from_zone_infos(
+        cls,
+        samples: typing.Iterable[typing.Tuple[typing.Any, dict]],
+        **kwargs,
+    ) -> "RecordedHistory":
+        """
+        Builds a RecordedHistory from (timestamp, zone_info) pairs, where zone_info is a dict as returned
+            by PyHTCC.get_zones_info() or Zone.zone_info.
+        """
+
+        def _flatten(timestamp, zone_info):
+            latest = zone_info["latestData"]
+            ui_data = latest["uiData"]
+            return {
+                "timestamp": timestamp,
+                "DeviceID": zone_info["DeviceID"],
+                "EquipmentOutputStatus": ui_data["EquipmentOutputStatus"],
+                "SystemSwitchPosition": ui_data["SystemSwitchPosition"],
+                "fanIsRunning": latest["fanData"]["fanIsRunning"],
+                "DispTemperature": ui_data.get("DispTemperature"),
+                "HeatSetpoint": ui_data.get("HeatSetpoint"),
+                "CoolSetpoint": ui_data.get("CoolSetpoint"),
+            }
+
+        return cls.from_records((_flatten(t, z) for t, z in samples), **kwargs)
+
+    def summarize(
+        self,
+        window: typing.Optional[float] = None,
+        start=None,
+        end=None,
+    ) -> RuntimeSummary:
+        """
+        Computes runtime metrics for every zone, optionally bucketed into windows of the given length (seconds).
+        Windows are aligned to the epoch (so window=86400 gives UTC days). Without a window, each zone gets
+            a single bucket covering all of its samples.
+
+        start/end (epoch seconds or datetimes) restrict the samples considered. A sample's full duration is
+            attributed to the window the sample starts in.
+        """
+        start = None if start is None else _to_epoch_seconds([start])[0]
+        end = None if end is None else _to_epoch_seconds([end])[0]
+
+        seg_starts = []
+        seg_ends = []
+        seg_zones = []
+        seg_windows = []
+        for zone_idx in range(len(self.zone_ids)):
+            lo, hi = self._zone_bounds[zone_idx], self._zone_bounds[zone_idx + 1]
+            zone_ts = self.timestamps[lo:hi]
+            first, last = 0, len(zone_ts)
+            if start is not None:
+                first = np.searchsorted(zone_ts, start, "left")
+            if end is not None:
+                last = np.searchsorted(zone_ts, end, "left")
+            if first >= last:
+                continue
+
+            if window is None:
+                starts = np.array([first])
+                ends = np.array([last])
+                windows = np.zeros(1)
+            else:
+                first_window = np.floor(zone_ts[first] / window)
+                last_window = np.floor(zone_ts[last - 1] / window)
+                edges = np.arange(first_window + 1, last_window + 1) * window
+                cuts = np.searchsorted(zone_ts[first:last], edges, "left") + first
+                starts = np.r_[first, cuts]
+                ends = np.r_[cuts, last]
+                windows = np.arange(first_window, last_window + 1) * window
+
+                # windows without any samples are dropped
+                keep = ends > starts
+                starts, ends, windows = starts[keep], ends[keep], windows[keep]
+
+            seg_starts.append(starts + lo)
+            seg_ends.append(ends + lo)
+            seg_zones.append(np.full(len(starts), zone_idx))
+            seg_windows.append(windows)
+
+        if seg_starts:
+            seg_starts = np.concatenate(seg_starts)
+            seg_ends = np.concatenate(seg_ends)
+            seg_zones = np.concatenate(seg_zones)
+            seg_windows = np.concatenate(seg_windows)
+        else:
+            seg_starts = seg_ends = seg_zones = np.zeros(0, dtype=np.int64)
+            seg_windows = np.zeros(0)
+
+        sums = {
+            name: (prefix[seg_ends] - prefix[seg_starts]).astype(np.float64)
+            for name, prefix in self._prefix.items()
+        }
+        duration = sums["duration"]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            heat_duty_cycle = sums["heat_runtime"] / duration
+            cool_duty_cycle = sums["cool_runtime"] / duration
+            cycles_per_hour = sums["cycles"] / (duration / 3600.0)
+            tracking_error = sums["error_sum"] / sums["error_weight"]
+
+        return RuntimeSummary(
+            device_ids=self.zone_ids[seg_zones],
+            window_starts=seg_windows,
+            duration=duration,
+            heat_runtime=sums["heat_runtime"],
+            cool_runtime=sums["cool_runtime"],
+            fan_runtime=sums["fan_runtime"],
+            heat_duty_cycle=heat_duty_cycle,
+            cool_duty_cycle=cool_duty_cycle,
+            cycles=sums["cycles"],
+            cycles_per_hour=cycles_per_hour,
+            tracking_error=tracking_error,
+        )
@@ -0,0 +1,255 @@
+"""
+Record/replay sessions, for running PyHTCC against recorded portal traffic (like for offline benchmarks).
+
+    cassette = Cassette("tcc.json")
+    pyhtcc = PyHTCC(username, password, session_factory=cassette.record_session)
+    pyhtcc.get_zones_info()
+    cassette.save()
+
+    cassette = Cassette.load("tcc.json")
+    pyhtcc = PyHTCC("user", "pass", session_factory=cassette.replay_session)
+    pyhtcc.get_zones_info()  # no network traffic
+"""
+from __future__ import annotations
+
+import collections
+import datetime
+import json
+import re
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests  # depends
+import requests.structures  # depends
+
+from .pyhtcc import logger
+
+CASSETTE_VERSION = 1
+
+# response headers kept in a cassette (others, like Set-Cookie, are dropped)
+RECORDED_HEADERS = ("Content-Type",)
+
+USERNAME_PLACEHOLDER = "<USERNAME>"
+PASSWORD_PLACEHOLDER = "<PASSWORD>"
+
+
+class CassetteError(EnvironmentError):
+    """raised if a replayed request has no matching recorded interaction"""
+
+    pass
+
+
+def _scrub_body(value: typing.Any, secrets: typing.Dict[str, str]) -> typing.Any:
+    """
+    replaces every (possibly nested) string value of a request body that is exactly a secret (like the login
+        form's fields) with its placeholder. Secrets within other values are left alone.
+    """
+    if isinstance(value, str):
+        return secrets.get(value, value)
+
+    if isinstance(value, dict):
+        return {k: _scrub_body(v, secrets) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_scrub_body(v, secrets) for v in value]
+
+    return value
+
+
+def _scrub_text(text: str, secrets: typing.Dict[str, str]) -> str:
+    """
+    replaces every whole-token occurrence of a secret (or its url-encoded form) in the given text with its
+        placeholder. A secret within a longer token (like '1234' in '/portal/12345/') is left alone.
+    """
+    for secret, placeholder in secrets.items():
+        forms = {
+            secret,
+            urllib.parse.quote_plus(secret),
+            urllib.parse.quote(secret, safe=""),
+        }
+        pattern = "|".join(re.escape(f) for f in sorted(forms, key=len, reverse=True))
+        # a trailing '.' (like at the end of a sentence) still ends the token
+        text = re.sub(
+            rf"(?<![\w@.+%-])(?:{pattern})(?![\w@+%-]|\.\w)", placeholder, text
+        )
+
+    return text
+
+
+def _get_secrets(session: requests.Session) -> typing.Dict[str, str]:
+    """returns secret -> placeholder for the credentials in the session's auth"""
+    secrets = {}
+    if isinstance(session.auth, tuple):
+        for secret, placeholder in zip(
+            session.auth, (USERNAME_PLACEHOLDER, PASSWORD_PLACEHOLDER)
+        ):
+            if isinstance(secret, bytes):
+                secret = secret.decode("utf-8")
+            if secret:
+                secrets[secret] = placeholder
+
+    return secrets
+
+
+def _get_echoed_secrets(secrets: typing.Dict[str, str]) -> typing.Dict[str, str]:
+    """returns the secrets that the portal may echo back (only the username: the password is never sent back)"""
+    return {k: v for k, v in secrets.items() if v == USERNAME_PLACEHOLDER}
+
+
+def _get_body(args: tuple, kwargs: dict) -> typing.Any:
+    """gets the json or form body from the args given to requests.Session.request()"""
+    if kwargs.get("json") is not None:
+        return kwargs["json"]
+    if kwargs.get("data") is not None:
+        return kwargs["data"]
+    # request(method, url, params, data, ...)
+    return args[1] if len(args) > 1 else None
+
+
+def _get_key(
+    method: str, url: str, body: typing.Any, secrets: typing.Dict[str, str]
+) -> str:
+    """returns the (scrubbed) key that a request is matched by"""
+    return json.dumps(
+        [
+            method.upper(),
+            _scrub_text(url, _get_echoed_secrets(secrets)),
+            # an already encoded body
+            _scrub_text(body, secrets)
+            if isinstance(body, str)
+            else _scrub_body(body, secrets),
+        ]
+    )
+
+
+class Cassette:
+    """
+    Holds recorded interactions (request -> response). Credentials are scrubbed from everything that is recorded.
+    """
+
+    def __init__(self, path: str, interactions: typing.Optional[list] = None):
+        self.path = path
+        self.interactions = interactions or []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        """loads a Cassette that was saved to the given path"""
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        if data.get("version") != CASSETTE_VERSION:
+            raise CassetteError(f"Unsupported cassette version: {data.get('version')}")
+
+        return cls(path, data["interactions"])
+
+    def save(self) -> None:
+        """saves the recorded interactions to self.path"""
+        with self._lock:
+            data = {
+                "version": CASSETTE_VERSION,
+                "interactions": list(self.interactions),
+            }
+
+        with open(self.path, "w") as f:
+            json.dump(data, f, indent=1)
+
+    def record_session(self) -> "RecordingSession":
+        """creates a session that records into this cassette. Can be given as PyHTCC's session_factory"""
+        return RecordingSession(self)
+
+    def replay_session(self, time_scale: float = 1.0) -> "ReplaySession":
+        """
+        creates a session that replays from this cassette. Can be given as PyHTCC's session_factory.
+        Each response is returned after its recorded time multiplied by time_scale (0 to not wait at all).
+        """
+        return ReplaySession(self, time_scale=time_scale)
+
+    def _add(self, interaction: dict) -> None:
+        with self._lock:
+            self.interactions.append(interaction)
+
+
+class RecordingSession(requests.Session):
+    """A requests.Session that records every request and response into a Cassette"""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        body = _get_body(args, kwargs)
+        response = super().request(method, url, *args, **kwargs)
+
+        secrets = _get_secrets(self)
+        echoed_secrets = _get_echoed_secrets(secrets)
+        # reads the whole body (even if streamed). It can still be iterated afterwards.
+        text = response.content.decode(response.encoding or "utf-8", errors="replace")
+        self.cassette._add(
+            {
+                "key": _get_key(method, url, body, secrets),
+                "status_code": response.status_code,
+                "url": _scrub_text(response.url, echoed_secrets),
+                "headers": {
+                    k: response.headers[k]
+                    for k in RECORDED_HEADERS
+                    if k in response.headers
+                },
+                "body": _scrub_text(text, echoed_secrets),
+                "elapsed": response.elapsed.total_seconds(),
+            }
+        )
+        return response
+
+
+class ReplaySession(requests.Session):
+    """
+    A requests.Session that returns responses from a Cassette instead of making requests.
+
+    Requests are matched by method, url and body. Matching interactions are returned in the order they were
+        recorded. Once they run out, the last one is returned again.
+    """
+
+    def __init__(self, cassette: Cassette, time_scale: float = 1.0):
+        super().__init__()
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+        # key -> the interactions for it that haven't been replayed yet
+        self._queues = collections.defaultdict(collections.deque)
+        for interaction in cassette.interactions:
+            self._queues[interaction["key"]].append(interaction)
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        body = _get_body(args, kwargs)
+        key = _get_key(method, url, body, _get_secrets(self))
+
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                interaction = self._last[key] = queue.popleft()
+            else:
+                interaction = self._last.get(key)
+
+        if interaction is None:
+            raise CassetteError(f"No recorded interaction for: {method} {url}")
+
+        if self.time_scale:
+            time.sleep(interaction["elapsed"] * self.time_scale)
+
+        logger.debug(f"Replaying: {method} {url}")
+        response = requests.Response()
+        response.status_code = interaction["status_code"]
+        response.url = interaction["url"]
+        response.headers = requests.structures.CaseInsensitiveDict(
+            interaction["headers"]
+        )
+        response.encoding = "utf-8"
+        response._content = interaction["body"].encode("utf-8")
+        response._content_consumed = True
+        response.elapsed = datetime.timedelta(seconds=interaction["elapsed"])
+        return response
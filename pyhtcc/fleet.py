@@ -0,0 +1,373 @@
+"""
+Holds PyHTCCFleet and ShardedFleetPoller, for managing and polling many TCC accounts at once
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+import typing
+
+from .pyhtcc import PyHTCC, RequestBudget, UnauthorizedError, logger
+
+
+class ZoneSnapshot(typing.NamedTuple):
+    """
+    A point-in-time record of a single zone's info, as yielded by PyHTCCFleet.poll()
+    """
+
+    username: str
+    device_id: int
+    name: typing.Optional[str]
+    timestamp: float
+    zone_info: dict
+
+
+class PyHTCCFleet:
+    """
+    Holds a pool of PyHTCC clients (one per account) and polls all of their zones.
+
+    Each account gets its own RequestBudget, so polling never sends more than requests_per_minute requests
+        for any single account. At most max_concurrency accounts are worked on at the same time.
+    """
+
+    def __init__(
+        self,
+        accounts: typing.Iterable[typing.Tuple[str, str]],
+        max_concurrency: int = 8,
+        requests_per_minute: float = 30,
+        login_stagger: float = 1.0,
+        client_factory: typing.Callable[..., PyHTCC] = PyHTCC,
+    ):
+        """
+        Initializer for a PyHTCCFleet object.
+        Takes in an iterable of (username, password) tuples.
+
+        login_stagger is the number of seconds between starting each account's login, so that we don't send
+            a burst of logins all at once.
+        client_factory is called as client_factory(username, password, request_budget=...) to create (and login)
+            each client.
+        """
+        self.accounts = list(accounts)
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.login_stagger = login_stagger
+        self.client_factory = client_factory
+
+        # username -> PyHTCC
+        self.clients = {}
+
+        # username -> the last exception seen for that account (cleared on success)
+        self.errors = {}
+
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="pyhtcc-fleet"
+        )
+
+    def __enter__(self) -> "PyHTCCFleet":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _login(self, username: str, password: str) -> PyHTCC:
+        """creates (and logs in) the client for the given account"""
+        client = self.client_factory(
+            username,
+            password,
+            request_budget=RequestBudget(self.requests_per_minute, 60),
+        )
+        with self._lock:
+            self.clients[username] = client
+            self.errors.pop(username, None)
+        return client
+
+    def login(self) -> None:
+        """
+        Logs in to every account that doesn't already have a client, starting one login every login_stagger seconds.
+        Failures are logged and recorded in self.errors. Those accounts are retried on the next login() or poll().
+        """
+        futures = {}
+        for username, password in self.accounts:
+            if username in self.clients:
+                continue
+
+            if futures and self.login_stagger:
+                time.sleep(self.login_stagger)
+
+            logger.debug(f"Starting login for {username}")
+            futures[self._executor.submit(self._login, username, password)] = username
+
+        for future in concurrent.futures.as_completed(futures):
+            username = futures[future]
+            try:
+                future.result()
+            except Exception as ex:
+                logger.exception(f"Unable to login as {username}")
+                with self._lock:
+                    self.errors[username] = ex
+
+    def _poll_client(self, username: str, client: PyHTCC) -> typing.List[ZoneSnapshot]:
+        """gets snapshots of every zone for the given client. If its session has expired, it logs in again first."""
+        try:
+            zones_info = client.get_zones_info()
+        except UnauthorizedError:
+            logger.debug(f"Session expired for {username}, logging in again")
+            client.authenticate()
+            zones_info = client.get_zones_info()
+
+        now = time.time()
+        with self._lock:
+            self.errors.pop(username, None)
+
+        return [
+            ZoneSnapshot(
+                username=username,
+                device_id=zone_info["DeviceID"],
+                name=zone_info.get("Name"),
+                timestamp=now,
+                zone_info=zone_info,
+            )
+            for zone_info in zones_info
+        ]
+
+    def poll(self) -> typing.Iterator[ZoneSnapshot]:
+        """
+        Polls every zone on every account once. Accounts that aren't logged in yet are logged in first.
+
+        Yields a ZoneSnapshot per zone, in the order that accounts finish (not the order they were given).
+        An account that fails is logged and recorded in self.errors without stopping the others.
+        """
+        self.login()
+
+        with self._lock:
+            clients = list(self.clients.items())
+
+        futures = {
+            self._executor.submit(self._poll_client, username, client): username
+            for username, client in clients
+        }
+        for future in concurrent.futures.as_completed(futures):
+            username = futures[future]
+            try:
+                snapshots = future.result()
+            except Exception as ex:
+                logger.exception(f"Unable to poll zones for {username}")
+                with self._lock:
+                    self.errors[username] = ex
+                continue
+
+            yield from snapshots
+
+    def poll_forever(
+        self,
+        interval: float,
+        stop_event: typing.Optional[threading.Event] = None,
+    ) -> typing.Iterator[ZoneSnapshot]:
+        """
+        Calls poll() every interval seconds (measured from the start of each poll), yielding every ZoneSnapshot.
+        Runs until stop_event is set (if given).
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            start = time.monotonic()
+            yield from self.poll()
+            stop_event.wait(max(0, interval - (time.monotonic() - start)))
+
+    def close(self, logout: bool = True) -> None:
+        """shuts down the worker threads. If logout is True, also logs out of every account"""
+        if logout:
+            with self._lock:
+                clients = list(self.clients.items())
+
+            for username, client in clients:
+                try:
+                    client.logout()
+                except Exception:
+                    logger.exception(f"Unable to logout {username}")
+
+        self._executor.shutdown(wait=True)
+
+
+class ZoneRecord(typing.NamedTuple):
+    """
+    A compact, cheap to pickle, point-in-time record of a single zone, as yielded by ShardedFleetPoller.poll()
+    """
+
+    username: str
+    device_id: int
+    name: typing.Optional[str]
+    timestamp: float
+    disp_temp: typing.Optional[float]
+    disp_units: typing.Optional[str]
+    indoor_humidity: typing.Optional[float]
+    heat_setpoint: typing.Optional[float]
+    cool_setpoint: typing.Optional[float]
+    system_switch_position: typing.Optional[int]
+    equipment_output_status: typing.Optional[int]
+    fan_is_running: typing.Optional[bool]
+    outdoor_temperature: typing.Optional[float]
+
+    @classmethod
+    def from_zone_info(
+        cls, username: str, timestamp: float, zone_info: dict
+    ) -> "ZoneRecord":
+        """creates a ZoneRecord from a zone info dict (as returned by PyHTCC.get_zones_info())"""
+        latest_data = zone_info.get("latestData") or {}
+        ui_data = latest_data.get("uiData") or {}
+        fan_data = latest_data.get("fanData") or {}
+        return cls(
+            username=username,
+            device_id=zone_info["DeviceID"],
+            name=zone_info.get("Name"),
+            timestamp=timestamp,
+            disp_temp=zone_info.get("DispTemp"),
+            disp_units=zone_info.get("DispUnits"),
+            indoor_humidity=zone_info.get("IndoorHumi"),
+            heat_setpoint=ui_data.get("HeatSetpoint"),
+            cool_setpoint=ui_data.get("CoolSetpoint"),
+            system_switch_position=ui_data.get("SystemSwitchPosition"),
+            equipment_output_status=zone_info.get("EquipmentOutputStatus"),
+            fan_is_running=fan_data.get("fanIsRunning"),
+            outdoor_temperature=zone_info.get("OutdoorTemperature"),
+        )
+
+
+# per worker process: username -> PyHTCC, so clients (and their connections) are reused across polls
+_worker_clients = {}
+
+
+def _poll_shard(
+    states: typing.List[dict],
+) -> typing.Tuple[typing.List[ZoneRecord], typing.List[dict], typing.Dict[str, str]]:
+    """
+    Runs in a worker process. Polls every account in the given shard of client states.
+    Returns (records, updated client states, {username: error message} for failed accounts).
+    """
+    records = []
+    new_states = []
+    errors = {}
+    for state in states:
+        username = state["username"]
+        try:
+            client = _worker_clients.get(username)
+            if (
+                client is None
+                or client.password != state["password"]
+                # another worker has logged in again since: use its session instead of ours (likely expired),
+                #   so each worker doesn't login again on its own
+                or (
+                    state.get("cookies")
+                    and state["cookies"] != client.get_state().get("cookies")
+                )
+            ):
+                client = PyHTCC.from_state(state)
+                _worker_clients[username] = client
+
+            try:
+                zones_info = client.get_zones_info()
+            except UnauthorizedError:
+                # the session (maybe from another process) has expired
+                logger.debug(f"Session expired for {username}, logging in again")
+                client.authenticate()
+                zones_info = client.get_zones_info()
+
+            now = time.time()
+            records.extend(
+                ZoneRecord.from_zone_info(username, now, zone_info)
+                for zone_info in zones_info
+            )
+            new_states.append(client.get_state())
+        except Exception as ex:
+            logger.exception(f"Unable to poll zones for {username}")
+            _worker_clients.pop(username, None)
+            errors[username] = f"{type(ex).__name__}: {ex}"
+            new_states.append(state)
+
+    return records, new_states, errors
+
+
+class ShardedFleetPoller:
+    """
+    Polls many accounts by spreading them across a pool of worker processes, so that parsing scales with
+        the number of cores instead of being bound to a single interpreter.
+
+    Each worker is given serializable client state (see PyHTCC.get_state()) and sends back compact ZoneRecords.
+    Logins happen in the workers. The resulting session cookies are sent back so later polls (in any worker)
+        don't need to login again.
+    """
+
+    def __init__(
+        self,
+        accounts: typing.Iterable[typing.Tuple[str, str]],
+        processes: typing.Optional[int] = None,
+        shard_size: int = 16,
+        mp_context: typing.Optional[typing.Any] = None,
+    ):
+        """
+        Initializer for a ShardedFleetPoller object.
+        Takes in an iterable of (username, password) tuples.
+
+        processes is the number of worker processes (defaults to the number of cores).
+        shard_size is the max number of accounts handed to a worker at once.
+        mp_context is the multiprocessing context (or name of a start method) to create the pool with.
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shard_size = shard_size
+
+        if mp_context is None or isinstance(mp_context, str):
+            mp_context = multiprocessing.get_context(mp_context)
+        self._mp_context = mp_context
+
+        # username -> state (see PyHTCC.get_state())
+        self.states = {
+            username: {"username": username, "password": password}
+            for username, password in accounts
+        }
+
+        # username -> the last error message for that account (cleared on success)
+        self.errors = {}
+
+        self._pool = None
+
+    def __enter__(self) -> "ShardedFleetPoller":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _get_shards(self) -> typing.List[typing.List[dict]]:
+        """splits the account states into shards of at most shard_size"""
+        states = list(self.states.values())
+        return [
+            states[i : i + self.shard_size]
+            for i in range(0, len(states), self.shard_size)
+        ]
+
+    def poll(self) -> typing.Iterator[ZoneRecord]:
+        """
+        Polls every zone on every account once, yielding a ZoneRecord per zone as each shard finishes.
+        Failing accounts are recorded in self.errors without stopping the others.
+        """
+        if self._pool is None:
+            self._pool = self._mp_context.Pool(self.processes)
+
+        for records, new_states, errors in self._pool.imap_unordered(
+            _poll_shard, self._get_shards()
+        ):
+            for state in new_states:
+                self.states[state["username"]] = state
+                if state["username"] not in errors:
+                    self.errors.pop(state["username"], None)
+
+            self.errors.update(errors)
+            yield from records
+
+    def close(self) -> None:
+        """stops the worker processes"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,166 @@
+"""
+An httpx-based session, so requests can be made over HTTP/2. Concurrent requests are then multiplexed over a single
+connection instead of each needing its own connection. PyHTCC only makes per-zone requests concurrently if its
+zone_workers is more than 1 (or via pyhtcc.plan / pyhtcc.scheduler), so raise it too:
+
+    pyhtcc = PyHTCC(username, password, session_factory=HttpxSession, zone_workers=8)
+
+This module requires httpx (and h2 for HTTP/2). Install them via: pip install pyhtcc[http2]
+"""
+from __future__ import annotations
+
+import datetime
+import time
+import typing
+
+try:
+    import httpx  # depends (optional)
+except ImportError:  # pragma: no cover
+    httpx = None
+
+import requests  # depends
+import requests.sessions  # depends
+import requests.structures  # depends
+
+from .pyhtcc import logger
+
+
+def _require_httpx() -> None:
+    """raises an ImportError with a helpful message if httpx is unavailable"""
+    if httpx is None:
+        raise ImportError(
+            "httpx is required for pyhtcc.httpx_backend. Install it via: pip install pyhtcc[http2]"
+        )
+
+
+class _StreamedBody:
+    """A file-like wrapper over a streamed httpx.Response, used as the raw body of a requests.Response"""
+
+    def __init__(self, response: "httpx.Response"):
+        self._response = response
+        self._chunks = None
+
+    def read(self, amt: typing.Optional[int] = None) -> bytes:
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes(amt)
+        return next(self._chunks, b"")
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class HttpxSession(requests.Session):
+    """
+    A requests.Session that sends its requests through an httpx.Client (with HTTP/2 by default).
+
+    The session's auth, headers and cookies are used as they would be with requests, and responses are returned as
+        requests.Response objects. httpx errors are raised as the matching requests exceptions.
+    Proxies, verify and cert are configured on the httpx.Client instead (see __init__()).
+    """
+
+    def __init__(self, http2: bool = True, **client_kwargs):
+        """
+        Initializer for a HttpxSession object.
+
+        client_kwargs are passed along to httpx.Client() (like limits or timeout).
+        """
+        _require_httpx()
+        super().__init__()
+        self.client = httpx.Client(http2=http2, **client_kwargs)
+
+    def close(self) -> None:
+        self.client.close()
+        super().close()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params=None,
+        data=None,
+        headers=None,
+        cookies=None,
+        files=None,
+        auth=None,
+        timeout=None,
+        allow_redirects: bool = True,
+        proxies=None,
+        hooks=None,
+        stream=None,
+        verify=None,
+        cert=None,
+        json=None,
+    ) -> requests.Response:
+        # share the cookie jar so cookies set by either side are seen by both
+        self.client.cookies = self.cookies
+        if cookies:
+            self.cookies.update(cookies)
+
+        auth = auth or self.auth
+        request = self.client.build_request(
+            method,
+            url,
+            params=params,
+            data=data,
+            files=files,
+            json=json,
+            headers=dict(
+                requests.sessions.merge_setting(
+                    headers,
+                    self.headers,
+                    dict_class=requests.structures.CaseInsensitiveDict,
+                )
+            ),
+            timeout=self._get_timeout(timeout),
+        )
+
+        start = time.monotonic()
+        try:
+            result = self.client.send(
+                request,
+                auth=auth if auth is not None else httpx.USE_CLIENT_DEFAULT,
+                follow_redirects=allow_redirects,
+                stream=bool(stream),
+            )
+        except httpx.TimeoutException as ex:
+            raise requests.exceptions.Timeout(str(ex)) from ex
+        except httpx.TransportError as ex:
+            raise requests.exceptions.ConnectionError(str(ex)) from ex
+        except httpx.HTTPError as ex:
+            raise requests.exceptions.RequestException(str(ex)) from ex
+
+        logger.debug(f"{method} {url} -> {result.status_code} ({result.http_version})")
+        return self._to_requests_response(
+            result, stream=bool(stream), elapsed=time.monotonic() - start
+        )
+
+    @staticmethod
+    def _get_timeout(timeout) -> typing.Any:
+        """converts a requests timeout (seconds or a (connect, read) tuple) to an httpx one"""
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return timeout
+
+    @staticmethod
+    def _to_requests_response(
+        result: "httpx.Response", stream: bool, elapsed: float
+    ) -> requests.Response:
+        """converts the given httpx.Response to a requests.Response"""
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.reason = result.reason_phrase
+        response.url = str(result.url)
+        response.headers = requests.structures.CaseInsensitiveDict(result.headers)
+        response.encoding = result.charset_encoding
+        response.elapsed = datetime.timedelta(seconds=elapsed)
+
+        if stream:
+            response.raw = _StreamedBody(result)
+        else:
+            response._content = result.content
+            response._content_consumed = True
+
+        return response
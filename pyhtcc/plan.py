@@ -0,0 +1,222 @@
+"""
+Holds the logic for applying a plan (a file of per-zone targets) to many zones at once
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import datetime
+import json
+import os
+import typing
+
+from .pyhtcc import DetailLevel, FanMode, PyHTCC, SystemMode, Zone, logger
+
+# the zone key in a plan whose targets apply to every zone
+ALL_ZONES = "*"
+
+# keys allowed in each zone's targets
+TARGET_KEYS = ("heat", "cool", "hold_until", "fan", "mode")
+
+
+class PlanError(ValueError):
+    """raised if a plan is malformed"""
+
+    pass
+
+
+def load_plan(path: str) -> dict:
+    """
+    Loads a plan from the given .json or .toml file. A plan looks like:
+        {
+            "zones": {
+                "*": {"fan": "auto"},
+                "Upstairs": {"heat": 68, "cool": 76, "mode": "auto"},
+                "123456": {"cool": 74, "hold_until": "18:30"},
+            }
+        }
+
+    Zones are keyed by name (case-insensitive) or device id. Targets under "*" apply to every zone, with more
+        specific targets taking precedence. See get_zone_kwargs() for the allowed targets.
+    """
+    if os.path.splitext(path)[1].lower() == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # pragma: no cover
+            try:
+                import tomli as tomllib  # depends (optional)
+            except ImportError:
+                raise ImportError(
+                    "Reading toml plans needs python 3.11+ or the tomli package"
+                )
+
+        with open(path, "rb") as f:
+            plan = tomllib.load(f)
+    else:
+        with open(path, "r") as f:
+            plan = json.load(f)
+
+    if not isinstance(plan.get("zones"), dict):
+        raise PlanError("A plan must have a 'zones' table/object")
+
+    # validate everything up front so we fail before making any changes
+    for targets in plan["zones"].values():
+        get_zone_kwargs(targets)
+
+    return plan
+
+
+def _parse_enum(enum_type: typing.Type, value: typing.Union[str, int]):
+    """gets the enum member for the given (case-insensitive) name or value"""
+    if isinstance(value, bool):
+        raise PlanError(f"{value} is not a {enum_type.__name__} name or value")
+
+    if isinstance(value, int):
+        try:
+            return enum_type(value)
+        except ValueError:
+            raise PlanError(f"{value} is not a {enum_type.__name__} value") from None
+
+    for member in enum_type:
+        if member.name.lower() == str(value).lower():
+            return member
+
+    raise PlanError(
+        f"{value} is not one of: {', '.join(m.name.lower() for m in enum_type)}"
+    )
+
+
+def get_zone_kwargs(targets: dict) -> dict:
+    """
+    Converts a zone's targets from a plan to kwargs for Zone.build_control_changes():
+        heat: heat setpoint
+        cool: cool setpoint
+        hold_until: "HH:MM" to hold the setpoints until (otherwise they are held permanently). Needs heat or cool.
+        fan: fan mode name (auto, on, circulate, followschedule)
+        mode: system mode name (emheat, heat, off, cool, auto)
+    """
+    unknown_keys = set(targets) - set(TARGET_KEYS)
+    if unknown_keys:
+        raise PlanError(
+            f"Unknown target(s): {sorted(unknown_keys)}. Allowed: {TARGET_KEYS}"
+        )
+
+    kwargs = {}
+    for key in ("heat", "cool"):
+        value = targets.get(key)
+        # bool is an int, but true/false isn't a setpoint
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (int, float))
+        ):
+            raise PlanError(f"{key} must be a number, not {value!r}")
+        kwargs[key] = value
+
+    hold_until = targets.get("hold_until")
+    if hold_until is not None:
+        if kwargs["heat"] is None and kwargs["cool"] is None:
+            raise PlanError("hold_until needs a heat or cool setpoint to hold")
+        if isinstance(hold_until, datetime.time):
+            kwargs["end"] = hold_until
+        else:
+            try:
+                kwargs["end"] = datetime.datetime.strptime(
+                    str(hold_until), "%H:%M"
+                ).time()
+            except ValueError:
+                raise PlanError(f"hold_until must be HH:MM, not {hold_until}")
+
+    if targets.get("fan") is not None:
+        kwargs["fan_mode"] = _parse_enum(FanMode, targets["fan"])
+
+    mode = targets.get("mode")
+    if mode is not None:
+        # the portal's 'Auto' system switch position
+        if str(mode).lower() == "auto":
+            mode = SystemMode.AutoHeat
+        kwargs["system_mode"] = _parse_enum(SystemMode, mode)
+
+    return kwargs
+
+
+def _get_zones_by_key(zones: typing.List[Zone]) -> typing.Dict[str, Zone]:
+    """returns a dict of device id (as a str) and lowercase name -> Zone, for looking up plan zone keys"""
+    zones_by_key = {}
+    for zone in zones:
+        zones_by_key[str(zone.device_id)] = zone
+        zones_by_key[zone.get_name().lower()] = zone
+    return zones_by_key
+
+
+def _resolve_zones(plan: dict, zones: typing.List[Zone]) -> typing.Dict[Zone, dict]:
+    """returns a dict of Zone -> merged targets for every zone the plan changes"""
+    zones_by_key = _get_zones_by_key(zones)
+
+    resolved = {}
+    default_targets = plan["zones"].get(ALL_ZONES)
+    if default_targets:
+        for zone in zones:
+            resolved[zone] = dict(default_targets)
+
+    for key, targets in plan["zones"].items():
+        if key == ALL_ZONES:
+            continue
+
+        zone = zones_by_key.get(str(key).lower())
+        if zone is None:
+            raise PlanError(f"Could not find a zone with the name or device id: {key}")
+
+        resolved[zone] = {**resolved.get(zone, {}), **targets}
+
+    return resolved
+
+
+def submit_zone_changes(
+    changes: typing.Dict[Zone, dict], max_workers: int = 8
+) -> typing.Dict[str, typing.Union[dict, Exception]]:
+    """
+    Submits each zone's changes as a single SubmitControlScreenChanges request, with up to max_workers zones
+        being changed concurrently. Zones without changes are skipped.
+
+    Returns a dict of zone name -> the submitted data, or the exception raised while submitting it.
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(zone.submit_control_changes, data): (zone, data)
+            for zone, data in changes.items()
+            if data
+        }
+        for future in concurrent.futures.as_completed(futures):
+            zone, data = futures[future]
+            try:
+                future.result()
+                results[zone.get_name()] = data
+            except Exception as ex:
+                logger.exception(f"Unable to apply changes to {zone.get_name()}")
+                results[zone.get_name()] = ex
+
+    return results
+
+
+def apply_plan(
+    pyhtcc: PyHTCC,
+    plan: dict,
+    max_workers: int = 8,
+    dry_run: bool = False,
+) -> typing.Dict[str, typing.Union[dict, Exception]]:
+    """
+    Applies the given plan (see load_plan()). Each zone's changes are merged into a single
+        SubmitControlScreenChanges request, and up to max_workers zones are changed concurrently.
+
+    Returns a dict of zone name -> the submitted data, or the exception raised while submitting it.
+    If dry_run is True, nothing is submitted.
+    """
+    resolved = _resolve_zones(plan, pyhtcc.get_all_zones(detail=DetailLevel.Names))
+    changes = {
+        zone: zone.build_control_changes(**get_zone_kwargs(targets))
+        for zone, targets in resolved.items()
+    }
+
+    if dry_run:
+        return {zone.get_name(): data for zone, data in changes.items()}
+
+    return submit_zone_changes(changes, max_workers=max_workers)
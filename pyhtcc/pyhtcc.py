@@ -3,22 +3,103 @@ Holds implementation guts for PyHTCC
 """
 from __future__ import annotations
 
+import array
+import codecs
+import collections
+import contextlib
 import datetime
 import enum
+import fnmatch
 import functools
+import hashlib
+import json
 import os
 import re
+import threading
 import time
 import typing
+import warnings
+import weakref
 
-import requests  # depends
+# Note: requests, csmlog and deprecated are imported on first use rather than here.
+#   This keeps 'import pyhtcc' (and things like 'pyhtcc --help') fast.
 
-# logging setup
-from csmlog import getLogger, setup  # depends
-from deprecated import deprecated  # depends
 
-setup("pyhtcc")
-logger = getLogger(__file__)
+def __getattr__(name: str):
+    """lazily provides the requests module as an attribute of this module"""
+    if name == "requests":
+        import requests  # depends
+
+        return requests
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_logging_setup_lock = threading.Lock()
+_logging_is_setup = False
+
+
+def _setup_logging() -> None:
+    """sets up csmlog for pyhtcc (only once). This touches the filesystem so it is deferred until needed"""
+    global _logging_is_setup
+    with _logging_setup_lock:
+        if not _logging_is_setup:
+            from csmlog import setup  # depends
+
+            setup("pyhtcc")
+            _logging_is_setup = True
+
+
+class _LazyLogger:
+    """
+    Stand-in for a csmlog logger. Logging is only setup when the logger is first used.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._logger = None
+
+    def __getattr__(self, attr: str):
+        if self._logger is None:
+            from csmlog import getLogger  # depends
+
+            _setup_logging()
+            self._logger = getLogger(self._name)
+
+        return getattr(self._logger, attr)
+
+
+logger = _LazyLogger(__file__)
+
+
+def _deprecated(**kwargs) -> typing.Callable:
+    """
+    Equivalent to deprecated.deprecated(**kwargs) for methods, though the deprecated package is only imported
+        the first time the decorated method is called.
+
+    The warning is raised from here (rather than from a deprecated() wrapper) so that it is attributed to the
+        caller, and so shown under the default warning filters.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kw):
+            if wrapper._adapter is None:
+                from deprecated.classic import ClassicAdapter  # depends
+
+                wrapper._adapter = ClassicAdapter(**kwargs)
+
+            warnings.warn(
+                wrapper._adapter.get_deprecated_msg(func, self),
+                category=wrapper._adapter.category,
+                stacklevel=2,
+            )
+            return func(self, *args, **kw)
+
+        wrapper._adapter = None
+        return wrapper
+
+    return decorator
 
 
 class AuthenticationError(ValueError):
@@ -75,6 +156,12 @@ class RedirectDidNotHappenError(EnvironmentError):
     pass
 
 
+class InvalidControlChangeError(ValueError):
+    """raised if a control change is outside of what the device reports it allows (see DeviceLimits)"""
+
+    pass
+
+
 class ZoneNotFoundError(EnvironmentError):
     """raised if the zone could not be found on refresh"""
 
@@ -87,6 +174,141 @@ class NoZonesFoundError(EnvironmentError):
     pass
 
 
+# keys available in each zone's info straight from GetZoneListData (see PyHTCC.get_zone_list_data())
+ZONE_LIST_FIELDS = frozenset(
+    (
+        "DeviceID",
+        "IsLost",
+        "GatewayIsLost",
+        "DispTempAvailable",
+        "DispUnits",
+        "DispTemp",
+        "IndoorHumiAvailable",
+        "IndoorHumi",
+        "GatewayUpgrading",
+        "Alerts",
+        "DemandResponseDatas",
+        "EquipmentOutputStatus",
+        "IsFanRunning",
+        "LocationID",
+    )
+)
+
+# keys each zone's info gets from CheckDataSession
+SESSION_FIELDS = frozenset(
+    ("success", "deviceLive", "communicationLost", "latestData", "alerts")
+)
+
+# keys each zone's info gets from the outdoor weather on the Device/Control page
+WEATHER_FIELDS = frozenset(("OutdoorTemperature", "OutdoorHumidity"))
+
+
+class DetailLevel(enum.IntEnum):
+    """
+    Enum for how much info to get per zone. Each level includes everything from the levels before it.
+    See DETAIL_LEVEL_FIELDS for the fields available at each level.
+    """
+
+    # only GetZoneListData: a single (paged) request for all zones
+    List = 0
+    # + the zone name (a request per zone unless the name is cached)
+    Names = 1
+    # + CheckDataSession (a request per zone)
+    Session = 2
+    # + the outdoor weather (a request per zone)
+    Full = 3
+
+    @classmethod
+    def for_fields(cls, fields: typing.Iterable[str]) -> "DetailLevel":
+        """
+        Returns the lowest DetailLevel that has all of the given (top level) zone info fields.
+        Unknown fields need DetailLevel.Full.
+        """
+        level = cls.List
+        for field in fields:
+            for candidate in cls:
+                if field in DETAIL_LEVEL_FIELDS[candidate]:
+                    break
+            else:
+                candidate = cls.Full
+
+            level = max(level, candidate)
+
+        return cls(level)
+
+
+class DataSource(enum.IntFlag):
+    """
+    Flags for the upstream endpoints that zone info comes from. See DATA_SOURCE_FIELDS for what each one gives.
+    """
+
+    # GetZoneListData (a paged request for every zone in the location)
+    ZoneList = 1
+    # the zone name from the Device/Control page (cached)
+    Name = 2
+    # CheckDataSession
+    Session = 4
+    # the outdoor weather from the Device/Control page
+    Weather = 8
+
+    All = ZoneList | Name | Session | Weather
+
+
+# DataSource -> the (top level) zone info fields it gives
+DATA_SOURCE_FIELDS = {
+    DataSource.ZoneList: ZONE_LIST_FIELDS,
+    DataSource.Name: frozenset(("Name",)),
+    DataSource.Session: SESSION_FIELDS,
+    DataSource.Weather: WEATHER_FIELDS,
+}
+
+
+def _get_data_sources(zone_info: dict) -> DataSource:
+    """returns the DataSource(s) that the given zone info has fields from (DeviceID alone doesn't count)"""
+    sources = DataSource(0)
+    for source, fields in DATA_SOURCE_FIELDS.items():
+        if any(f in zone_info for f in fields if f != "DeviceID"):
+            sources |= source
+    return sources
+
+
+def _is_glob(pattern: str) -> bool:
+    """returns True if the given name has glob (fnmatch) special characters"""
+    return any(c in pattern for c in "*?[")
+
+
+def _reads(sources: DataSource) -> typing.Callable:
+    """
+    Decorator for Zone getters. Declares which DataSource(s) the getter reads (as getter.data_sources), and
+        refreshes only those before each call (see Zone._refresh_for_read()). Anything the getter calls reads
+        the just refreshed info.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            self._refresh_for_read(sources)
+            with self._refresh_suspended():
+                return func(self, *args, **kwargs)
+
+        wrapper.data_sources = sources
+        return wrapper
+
+    return decorator
+
+
+# DetailLevel -> the (top level) zone info fields available at that level
+DETAIL_LEVEL_FIELDS = {
+    DetailLevel.List: ZONE_LIST_FIELDS,
+    DetailLevel.Names: ZONE_LIST_FIELDS | {"Name"},
+    DetailLevel.Session: ZONE_LIST_FIELDS | {"Name"} | SESSION_FIELDS,
+    DetailLevel.Full: ZONE_LIST_FIELDS | {"Name"} | SESSION_FIELDS | WEATHER_FIELDS,
+}
+
+# number of bytes to read at a time when streaming the Device/Control page
+CONTROL_PAGE_CHUNK_SIZE = 8192
+
+
 class SystemMode(enum.IntEnum):
     """
     Enum for which mode the system is currently using
@@ -114,72 +336,1102 @@ class FanMode(enum.IntEnum):
     Unknown = 4
 
 
+class DeviceLimits(typing.NamedTuple):
+    """
+    The setpoint limits and capabilities a device reports via CheckDataSession.
+    Any field can be None if the device didn't report it (then it isn't checked).
+    """
+
+    heat_lower: typing.Optional[float] = None
+    heat_upper: typing.Optional[float] = None
+    cool_lower: typing.Optional[float] = None
+    cool_upper: typing.Optional[float] = None
+    deadband: typing.Optional[float] = None
+    # the device's setpoints when the limits were reported (the deadband is checked against them)
+    heat_setpoint: typing.Optional[float] = None
+    cool_setpoint: typing.Optional[float] = None
+    setpoint_change_allowed: typing.Optional[bool] = None
+    # SystemMode -> whether switching to it is allowed
+    system_modes_allowed: typing.Dict[SystemMode, typing.Optional[bool]] = {}
+    # FanMode -> whether switching to it is allowed
+    fan_modes_allowed: typing.Dict[FanMode, typing.Optional[bool]] = {}
+
+    @classmethod
+    def from_session_data(cls, data: dict) -> "DeviceLimits":
+        """creates a DeviceLimits from CheckDataSession data (or a zone info dict that includes it)"""
+        latest_data = data.get("latestData") or {}
+        ui_data = latest_data.get("uiData") or {}
+        fan_data = latest_data.get("fanData") or {}
+        return cls(
+            heat_lower=ui_data.get("HeatLowerSetptLimit"),
+            heat_upper=ui_data.get("HeatUpperSetptLimit"),
+            cool_lower=ui_data.get("CoolLowerSetptLimit"),
+            cool_upper=ui_data.get("CoolUpperSetptLimit"),
+            deadband=ui_data.get("Deadband"),
+            heat_setpoint=ui_data.get("HeatSetpoint"),
+            cool_setpoint=ui_data.get("CoolSetpoint"),
+            setpoint_change_allowed=ui_data.get("SetpointChangeAllowed"),
+            system_modes_allowed={
+                SystemMode.EMHeat: ui_data.get("SwitchEmergencyHeatAllowed"),
+                SystemMode.Heat: ui_data.get("SwitchHeatAllowed"),
+                SystemMode.Off: ui_data.get("SwitchOffAllowed"),
+                SystemMode.Cool: ui_data.get("SwitchCoolAllowed"),
+                SystemMode.AutoHeat: ui_data.get("SwitchAutoAllowed"),
+                SystemMode.AutoCool: ui_data.get("SwitchAutoAllowed"),
+            },
+            fan_modes_allowed={
+                FanMode.Auto: fan_data.get("fanModeAutoAllowed"),
+                FanMode.On: fan_data.get("fanModeOnAllowed"),
+                FanMode.Circulate: fan_data.get("fanModeCirculateAllowed"),
+                FanMode.FollowSchedule: fan_data.get("fanModeFollowScheduleAllowed"),
+            },
+        )
+
+    @staticmethod
+    def _check_range(
+        name: str, value, lower, upper, clamp: bool
+    ) -> typing.Union[int, float]:
+        """returns value (clamped to [lower, upper] if clamp is True), or raises if it's out of range"""
+        if lower is not None and value < lower:
+            if not clamp:
+                raise InvalidControlChangeError(
+                    f"{name} of {value} is below the device's limit of {lower}"
+                )
+            logger.info(f"Clamping {name} of {value} to {lower}")
+            return lower
+
+        if upper is not None and value > upper:
+            if not clamp:
+                raise InvalidControlChangeError(
+                    f"{name} of {value} is above the device's limit of {upper}"
+                )
+            logger.info(f"Clamping {name} of {value} to {upper}")
+            return upper
+
+        return value
+
+    def check(self, data: dict, clamp: bool = False) -> dict:
+        """
+        Checks the given control changes (as given to PyHTCC.submit_raw_control_changes()) against these limits.
+        Returns the changes, with setpoints clamped to the limits if clamp is True.
+        Raises InvalidControlChangeError for anything that can't be clamped (or any setpoint if clamp is False).
+        """
+        data = dict(data)
+        heat = data.get("HeatSetpoint")
+        cool = data.get("CoolSetpoint")
+
+        if (
+            heat is not None or cool is not None
+        ) and self.setpoint_change_allowed is False:
+            raise InvalidControlChangeError("The device doesn't allow setpoint changes")
+
+        if heat is not None:
+            heat = data["HeatSetpoint"] = self._check_range(
+                "HeatSetpoint", heat, self.heat_lower, self.heat_upper, clamp
+            )
+
+        if cool is not None:
+            cool = data["CoolSetpoint"] = self._check_range(
+                "CoolSetpoint", cool, self.cool_lower, self.cool_upper, clamp
+            )
+
+        system_mode = None
+        system_switch = data.get("SystemSwitch")
+        if system_switch is not None:
+            try:
+                system_mode = SystemMode(system_switch)
+            except ValueError:
+                raise InvalidControlChangeError(
+                    f"{system_switch} is not a valid SystemSwitch"
+                ) from None
+            if self.system_modes_allowed.get(system_mode) is False:
+                raise InvalidControlChangeError(
+                    f"The device doesn't allow the system mode: {system_mode.name}"
+                )
+
+        # the deadband only applies to auto changeover. In other modes the portal moves the other setpoint itself
+        if self.deadband and (
+            (heat is not None and cool is not None)
+            or system_mode in (SystemMode.AutoHeat, SystemMode.AutoCool)
+        ):
+            self._check_deadband(data, clamp)
+
+        fan_mode = data.get("FanMode")
+        if fan_mode is not None:
+            try:
+                mode = FanMode(fan_mode)
+            except ValueError:
+                raise InvalidControlChangeError(
+                    f"{fan_mode} is not a valid FanMode"
+                ) from None
+            if self.fan_modes_allowed.get(mode) is False:
+                raise InvalidControlChangeError(
+                    f"The device doesn't allow the fan mode: {mode.name}"
+                )
+
+        return data
+
+    def _check_deadband(self, data: dict, clamp: bool) -> None:
+        """
+        checks that the given changes' setpoints (with the device's last known setpoint for one not being changed)
+            are at least the deadband apart. If clamp is True, the changed setpoint is moved to make them so.
+        """
+        heat = data.get("HeatSetpoint")
+        cool = data.get("CoolSetpoint")
+        new_heat = heat if heat is not None else self.heat_setpoint
+        new_cool = cool if cool is not None else self.cool_setpoint
+        if new_heat is None or new_cool is None or new_cool - new_heat >= self.deadband:
+            return
+
+        if not clamp:
+            raise InvalidControlChangeError(
+                f"CoolSetpoint ({new_cool}) must be at least {self.deadband} above HeatSetpoint ({new_heat})"
+            )
+
+        if heat is None:
+            cool = new_heat + self.deadband
+            logger.info(f"Clamping CoolSetpoint of {data['CoolSetpoint']} to {cool}")
+            data["CoolSetpoint"] = self._check_range(
+                "CoolSetpoint", cool, self.cool_lower, self.cool_upper, False
+            )
+        else:
+            heat = new_cool - self.deadband
+            logger.info(f"Clamping HeatSetpoint of {data['HeatSetpoint']} to {heat}")
+            data["HeatSetpoint"] = self._check_range(
+                "HeatSetpoint", heat, self.heat_lower, self.heat_upper, False
+            )
+
+
+class BackgroundRefreshStats(typing.NamedTuple):
+    """
+    Metrics for PyHTCC's background refresh (see PyHTCC.start_background_refresh()).
+    """
+
+    # number of successful and failed refreshes
+    refreshes: int = 0
+    failures: int = 0
+    # number of failures since the last successful refresh
+    consecutive_failures: int = 0
+    # time.time() of the last successful refresh, and how many seconds it took
+    last_refresh_time: typing.Optional[float] = None
+    last_refresh_duration: typing.Optional[float] = None
+    # the exception raised by the last refresh (None if it succeeded)
+    last_error: typing.Optional[Exception] = None
+    # number of zones kept warm
+    zones: int = 0
+    # seconds until the next refresh (more than the interval after failures)
+    next_wait: typing.Optional[float] = None
+
+
+class RequestBudget:
+    """
+    A thread-safe token bucket that limits how many requests can be made in a given period.
+    Up to burst requests can be made back to back, then requests are allowed at rate per period.
+    """
+
+    def __init__(
+        self, rate: float, period: float = 60.0, burst: typing.Optional[int] = None
+    ):
+        """
+        Initializer for a RequestBudget object.
+        Allows rate requests every period seconds, with bursts of up to burst requests (defaults to rate).
+        """
+        if rate <= 0 or period <= 0:
+            raise ValueError("rate and period must be positive")
+
+        self.rate = rate
+        self.period = period
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """adds tokens for the time elapsed since the last refill"""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst,
+            self._tokens + (now - self._last_refill) * self.rate / self.period,
+        )
+        self._last_refill = now
+
+    def try_acquire(self) -> bool:
+        """takes a token if one is available right now. Returns True if one was taken"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """blocks until a token is available, then takes it"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) * self.period / self.rate
+
+            logger.debug(f"Request budget exhausted, waiting {wait:.2f} seconds")
+            time.sleep(wait)
+
+
+class TTLCache:
+    """
+    A bounded, thread-safe cache where entries expire after a given time-to-live.
+    Once full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: typing.Optional[float] = None):
+        """
+        Initializer for a TTLCache object.
+        Takes in the maximum number of entries and the number of seconds entries live for (None to never expire).
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """returns the cached value for key, or default if it is missing or has expired"""
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                return default
+
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        """caches value for key, evicting the least recently used entry if full"""
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self) -> typing.List[tuple]:
+        """returns a list of (key, value) for every entry that hasn't expired"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value)
+                for key, (value, expires_at) in self._data.items()
+                if expires_at is None or now < expires_at
+            ]
+
+    def invalidate(self, key=None) -> None:
+        """removes the given key from the cache. If key is None, clears the whole cache"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+class MetadataCache:
+    """
+    An on-disk (json) cache of account metadata that rarely changes: the location ids and each device's name.
+    Entries are keyed by a hash of the account's username, so a single file can hold many accounts.
+    """
+
+    def __init__(
+        self,
+        path: typing.Optional[str] = None,
+        max_age: typing.Optional[float] = 7 * 24 * 60 * 60,
+    ):
+        """
+        Initializer for a MetadataCache object.
+        If path is not given, uses metadata.json in the user's cache directory ($XDG_CACHE_HOME or ~/.cache).
+        Entries older than max_age seconds are ignored (None to never ignore).
+        """
+        if path is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            path = os.path.join(cache_home, "pyhtcc", "metadata.json")
+
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(username: str) -> str:
+        """returns the key for the given account. The username is hashed so it isn't stored in plain text"""
+        return hashlib.sha256(username.lower().encode("utf-8")).hexdigest()
+
+    def _read(self) -> dict:
+        """reads the whole cache file. Returns an empty dict if it doesn't exist or is unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.exception(f"Unable to read metadata cache: {self.path}")
+            return {}
+
+    def load(self, username: str) -> typing.Optional[dict]:
+        """
+        Returns the cached metadata for the given account, or None if there isn't any (or it's too old).
+        The metadata looks like: {
+            "location_id": 123,
+            "location_ids": [123, 456],
+            "device_names": {"<device id>": "<name>"},
+        }
+        """
+        entry = self._read().get(self._get_key(username))
+        if entry is None:
+            return None
+
+        if (
+            self.max_age is not None
+            and time.time() - entry.get("updated", 0) > self.max_age
+        ):
+            logger.debug("Cached metadata is too old to be used")
+            return None
+
+        return entry
+
+    def save(self, username: str, metadata: dict) -> None:
+        """
+        Saves the given metadata for the given account.
+        The file is written to a temporary file then moved into place, so readers never see a partial file.
+        """
+        with self._lock:
+            data = self._read()
+            data[self._get_key(username)] = {**metadata, "updated": time.time()}
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+
+# Matches every "Control.Model.Property.<name>, <value>)" on the Device/Control page, along with the
+#   zone name header, so the whole page can be parsed in a single scan.
+# Matches never span lines, which lets _ControlPageScanner parse the page line-by-line as it streams in.
+_CONTROL_PAGE_REGEX = re.compile(
+    r"Control\.Model\.Property\.(?P<name>\w+),[^\S\n]*(?P<value>[^)\n]*?)[^\S\n]*\)"
+    r'|id=[^\S\n]?"ZoneName"[^\S\n]?>(?P<zone_name>.*) Control<'
+)
+
+
+def _parse_control_model_value(raw: str) -> typing.Union[bool, int, float, str, None]:
+    """converts a raw javascript value from the Control page to the matching python type"""
+    if raw == "true":
+        return True
+    if raw == "false":
+        return False
+    if raw == "null":
+        return None
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        return raw[1:-1]
+
+    try:
+        value = float(raw)
+    except ValueError:
+        return raw
+
+    return int(value) if value.is_integer() else value
+
+
+class _ControlPageScanner:
+    """
+    Incrementally parses the Device/Control page as it is fed chunks of the body.
+    Only complete lines are scanned, so a property split across chunks is still found.
+    """
+
+    def __init__(self, needed: typing.Optional[typing.Iterable[str]] = None):
+        """
+        Initializer for a _ControlPageScanner object.
+        If needed is given, done becomes True as soon as all of those properties have been found.
+        """
+        self.properties = {}
+        self._needed = set(needed) if needed is not None else None
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def done(self) -> bool:
+        """True if every needed property has been found"""
+        return self._needed is not None and self._needed.issubset(self.properties)
+
+    def _scan(self, text: str) -> None:
+        """scans the given text for properties. If a property is found multiple times, the first value is kept"""
+        for match in _CONTROL_PAGE_REGEX.finditer(text):
+            zone_name = match.group("zone_name")
+            if zone_name is not None:
+                self.properties.setdefault("ZoneName", zone_name)
+            else:
+                self.properties.setdefault(
+                    match.group("name"),
+                    _parse_control_model_value(match.group("value")),
+                )
+
+    def feed(self, chunk: typing.Union[str, bytes]) -> None:
+        """feeds the next chunk of the page (str or utf-8 bytes)"""
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+
+        self._buffer += chunk
+        last_newline = self._buffer.rfind("\n")
+        if last_newline != -1:
+            self._scan(self._buffer[: last_newline + 1])
+            self._buffer = self._buffer[last_newline + 1 :]
+
+    def close(self) -> dict:
+        """scans whatever is left over and returns the found properties"""
+        self._scan(self._buffer + self._decoder.decode(b"", final=True))
+        self._buffer = ""
+        return self.properties
+
+
+def _parse_control_page(text: str) -> dict:
+    """
+    Parses the Device/Control page in a single pass.
+    Returns a dict of every Control.Model.Property name to its (typed) value, plus 'ZoneName' if found.
+    If a property is set multiple times, the first value is kept.
+    """
+    scanner = _ControlPageScanner()
+    scanner.feed(text)
+    return scanner.close()
+
+
+class RingBuffer:
+    """
+    A fixed-size, array-backed ring buffer of timestamped numeric readings.
+
+    Appending is O(1) and memory is bounded by the size given at creation, regardless of how many readings
+        have been appended over time. Once full, each append overwrites the oldest reading.
+    """
+
+    def __init__(self, size: int):
+        """
+        Initializer for a RingBuffer object.
+        Takes in the maximum number of readings to keep.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self._values = array.array("d", bytes(8 * size))
+        self._timestamps = array.array("d", bytes(8 * size))
+        self._next = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float, timestamp: typing.Optional[float] = None) -> None:
+        """
+        Appends a reading. If timestamp is not given, time.monotonic() is used.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        if self._count == self.size:
+            self._sum -= self._values[self._next]
+        else:
+            self._count += 1
+
+        self._values[self._next] = value
+        self._timestamps[self._next] = timestamp
+        self._sum += value
+        self._next = (self._next + 1) % self.size
+
+    def clear(self) -> None:
+        """removes all readings"""
+        self._next = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def _indices(self) -> range:
+        """returns the (unwrapped) indices of the readings from oldest to newest"""
+        return range(self._next - self._count, self._next)
+
+    def _readings(
+        self, last: typing.Optional[float] = None
+    ) -> typing.Tuple[list, list]:
+        """
+        Returns (timestamps, values) from oldest to newest.
+        If last is given, only readings within that many seconds of the newest reading are included.
+        """
+        if not self._count:
+            raise ValueError("No readings have been recorded")
+
+        timestamps = [self._timestamps[i] for i in self._indices()]
+        values = [self._values[i] for i in self._indices()]
+        if last is not None:
+            cutoff = timestamps[-1] - last
+            first = 0
+            while timestamps[first] < cutoff:
+                first += 1
+            timestamps = timestamps[first:]
+            values = values[first:]
+
+        return timestamps, values
+
+    def values(self) -> list:
+        """returns the recorded values from oldest to newest"""
+        return [self._values[i] for i in self._indices()]
+
+    def latest(self) -> float:
+        """returns the newest value"""
+        if not self._count:
+            raise ValueError("No readings have been recorded")
+        return self._values[self._next - 1]
+
+    def min(self, last: typing.Optional[float] = None) -> float:
+        """returns the minimum value (optionally within the last given number of seconds)"""
+        return min(self._readings(last)[1])
+
+    def max(self, last: typing.Optional[float] = None) -> float:
+        """returns the maximum value (optionally within the last given number of seconds)"""
+        return max(self._readings(last)[1])
+
+    def mean(self, last: typing.Optional[float] = None) -> float:
+        """
+        returns the mean value (optionally within the last given number of seconds).
+        Over the whole buffer this is O(1) since a running sum is kept.
+        """
+        if last is None:
+            if not self._count:
+                raise ValueError("No readings have been recorded")
+            return self._sum / self._count
+
+        values = self._readings(last)[1]
+        return sum(values) / len(values)
+
+    def slope(self, last: typing.Optional[float] = None) -> float:
+        """
+        returns the least-squares slope of the values in units per second (optionally within the last given
+            number of seconds). Returns 0.0 if there are not at least two readings at different times.
+        """
+        timestamps, values = self._readings(last)
+        n = len(values)
+        mean_t = sum(timestamps) / n
+        mean_v = sum(values) / n
+
+        numerator = 0.0
+        denominator = 0.0
+        for t, v in zip(timestamps, values):
+            numerator += (t - mean_t) * (v - mean_v)
+            denominator += (t - mean_t) ** 2
+
+        if not denominator:
+            return 0.0
+        return numerator / denominator
+
+
 class Zone:
     """
     A Zone often equates to a given thermostat. The Zone object can be used to control the thermostat
         for the given zone.
+
+    There is only ever one Zone object per device id for a given PyHTCC object: creating a Zone for a device
+        that already has one returns that same Zone (with its zone_info updated if a zone info dict is given).
+        So a refresh via any reference to a Zone is seen by all of them.
     """
 
+    # numeric readings kept in Zone.history, mapped to their path within zone_info
+    HISTORY_READINGS = {
+        "DispTemp": ("DispTemp",),
+        "IndoorHumi": ("IndoorHumi",),
+        "EquipmentOutputStatus": ("EquipmentOutputStatus",),
+        "HeatSetpoint": ("latestData", "uiData", "HeatSetpoint"),
+        "CoolSetpoint": ("latestData", "uiData", "CoolSetpoint"),
+        "OutdoorTemperature": ("OutdoorTemperature",),
+        "OutdoorHumidity": ("OutdoorHumidity",),
+    }
+
+    # submitted control change key -> (section of zone_info["latestData"], key) that it changes
+    CONTROL_CHANGE_FIELDS = {
+        "HeatSetpoint": ("uiData", "HeatSetpoint"),
+        "CoolSetpoint": ("uiData", "CoolSetpoint"),
+        "HeatNextPeriod": ("uiData", "HeatNextPeriod"),
+        "CoolNextPeriod": ("uiData", "CoolNextPeriod"),
+        "StatusHeat": ("uiData", "StatusHeat"),
+        "StatusCool": ("uiData", "StatusCool"),
+        "SystemSwitch": ("uiData", "SystemSwitchPosition"),
+        "FanMode": ("fanData", "fanMode"),
+    }
+
+    def __new__(cls, device_id_or_zone_info=None, pyhtcc=None, *args, **kwargs):
+        """returns the existing Zone for this device from pyhtcc's registry (or registers a new one)"""
+        if not isinstance(pyhtcc, PyHTCC):
+            return cls._new_zone()
+
+        if isinstance(device_id_or_zone_info, dict):
+            device_id = device_id_or_zone_info["DeviceID"]
+        else:
+            device_id = device_id_or_zone_info
+
+        with pyhtcc._zones_lock:
+            zone = pyhtcc._zones.get(device_id)
+            if type(zone) is not cls:
+                zone = cls._new_zone()
+                pyhtcc._zones[device_id] = zone
+
+        return zone
+
+    @classmethod
+    def _new_zone(cls) -> "Zone":
+        """creates an uninitialized Zone"""
+        zone = super().__new__(cls)
+        # held by __init__(), so threads creating the same shared Zone at once initialize it one at a time
+        zone._init_lock = threading.Lock()
+        return zone
+
     def __init__(
         self,
         device_id_or_zone_info: typing.Union[int, str],
         pyhtcc: typing.TypeVar("PyHTCC"),
+        history_size: int = 60,
     ):
         """
         Initializer for a Zone object.
         Takes in a device_id or zone info dict object as the first param.
         Also takes in an authenticated instance of an PyHTCC object
-        """
-        if isinstance(device_id_or_zone_info, int):
-            self.device_id = device_id_or_zone_info
-            self.zone_info = {}
-        elif isinstance(device_id_or_zone_info, dict):
-            self.device_id = device_id_or_zone_info["DeviceID"]
-            self.zone_info = device_id_or_zone_info
 
-        self.pyhtcc = pyhtcc
+        Creating a Zone from a device_id makes no requests: the info is loaded on first use (see zone_info).
 
-        if not self.zone_info:
-            # will create/populate self.zone_info
+        history_size is the number of recent readings kept per entry in HISTORY_READINGS. These are
+            recorded in self.history on every refresh_zone_info().
+        """
+        with self._init_lock:
+            if getattr(self, "_initialized", False):
+                # this is the shared Zone for this device: just take any newer info
+                if isinstance(device_id_or_zone_info, dict):
+                    self._zone_info = {
+                        **(self._zone_info or {}),
+                        **device_id_or_zone_info,
+                    }
+                    sources = _get_data_sources(device_id_or_zone_info)
+                    self._mark_refreshed(sources)
+                    self._reconcile_pending_changes(sources)
+                    self._record_history(sources)
+                return
+
+            # per thread: .depth > 0 while refresh_zone_info() should do nothing in that thread (see read())
+            self._refresh_suspend = threading.local()
+
+            # (section, key) in zone_info["latestData"] -> (submitted value, the device's value before it,
+            #   monotonic time a refresh showing that old value no longer keeps it pending)
+            self._pending = {}
+
+            # single DataSource -> monotonic time its info was last gotten (see get_age())
+            self._refreshed_at = {}
+            # the Future of the running background refresh (see _revalidate())
+            self._revalidating = None
+            self._revalidate_lock = threading.Lock()
+            # the exception raised by the last background refresh (None if it succeeded)
+            self.last_refresh_error = None
+
+            self.pyhtcc = pyhtcc
+            self.history = {k: RingBuffer(history_size) for k in self.HISTORY_READINGS}
+
+            if isinstance(device_id_or_zone_info, int):
+                self.device_id = device_id_or_zone_info
+                # loaded on first access of self.zone_info (or first refresh)
+                self._zone_info = None
+            elif isinstance(device_id_or_zone_info, dict):
+                self.device_id = device_id_or_zone_info["DeviceID"]
+                self._zone_info = device_id_or_zone_info
+                self._mark_refreshed(_get_data_sources(device_id_or_zone_info))
+                self._record_history()
+
+            self._initialized = True
+
+    @property
+    def zone_info(self) -> dict:
+        """
+        the info for this zone. If this Zone was created from a device id, this info (for only this device)
+            is loaded the first time it is accessed.
+        """
+        if self._zone_info is None:
             self.refresh_zone_info()
+        return self._zone_info
+
+    @zone_info.setter
+    def zone_info(self, zone_info: dict) -> None:
+        self._zone_info = zone_info
+
+    @property
+    def loaded(self) -> bool:
+        """True if zone_info has been loaded (see zone_info)"""
+        return self._zone_info is not None
+
+    def _record_history(self, sources: DataSource = DataSource.All) -> None:
+        """appends the current numeric readings (that come from the given sources) from zone_info to self.history"""
+        now = time.monotonic()
+        for key, path in self.HISTORY_READINGS.items():
+            if not any(
+                path[0] in fields
+                for source, fields in DATA_SOURCE_FIELDS.items()
+                if source & sources
+            ):
+                continue
+
+            value = self.zone_info
+            for part in path:
+                if not isinstance(value, dict):
+                    value = None
+                    break
+                value = value.get(part)
+
+            if isinstance(value, (int, float)):
+                self.history[key].append(value, now)
+
+    def refresh_zone_info(self, sources: DataSource = DataSource.All) -> None:
+        """
+        refreshes the zone_info attribute (and records the new readings in self.history).
+        Only the requests for the given DataSource(s) are made, and only for this device.
+        If zone_info hasn't been loaded yet, all sources are gotten.
+        """
+        if self._refresh_is_suspended() and self._zone_info is not None:
+            return
+
+        self._refresh(sources)
+
+    def _refresh(self, sources: DataSource) -> None:
+        """does the work of refresh_zone_info(), even within _refresh_suspended()"""
+        current = self._zone_info
+        if current is None:
+            current = {}
+            sources = DataSource.All
+
+        zone_info = self.pyhtcc.get_zone_info(
+            self.device_id, sources, current.get("LocationID")
+        )
+        logger.debug(f"Refreshed zone info for {self.device_id} from {sources!r}")
+        self._zone_info = {**current, **zone_info}
+        self._mark_refreshed(sources)
+        self._reconcile_pending_changes(sources)
+        self._record_history(sources)
+
+    def _mark_refreshed(self, sources: DataSource) -> None:
+        """notes that the info from the given DataSource(s) was just gotten"""
+        now = time.monotonic()
+        for source in DATA_SOURCE_FIELDS:
+            if source & sources:
+                self._refreshed_at[source] = now
+
+    def get_age(self, sources: DataSource = DataSource.All) -> float:
+        """
+        returns the number of seconds since the info from the given DataSource(s) was gotten. If there are multiple,
+            this is the age of the oldest. Returns infinity if one of them hasn't been gotten yet.
+        """
+        now = time.monotonic()
+        return max(
+            (
+                now - self._refreshed_at.get(source, -float("inf"))
+                for source in DATA_SOURCE_FIELDS
+                if source & sources
+            ),
+            default=0.0,
+        )
+
+    def _refresh_for_read(self, sources: DataSource) -> None:
+        """
+        called before getters read the given DataSource(s). Normally this is just refresh_zone_info().
+
+        If PyHTCC's stale_while_revalidate is set, info younger than that many seconds is read as is. Older info is
+            also read as is while it is refreshed in the background (see _revalidate()). If PyHTCC's background
+            refresh is running, info is always read as is. In both cases, info is only refreshed before reading if
+            it hasn't been gotten yet or is older than PyHTCC's max_staleness.
+        """
+        if self._refresh_is_suspended() and self._zone_info is not None:
+            return
+
+        fresh_for = getattr(self.pyhtcc, "stale_while_revalidate", None)
+        warm = getattr(self.pyhtcc, "background_refreshing", False)
+        if self._zone_info is None or (fresh_for is None and not warm):
+            self.refresh_zone_info(sources)
+            return
+
+        age = self.get_age(sources)
+        max_staleness = self.pyhtcc.max_staleness
+        if age == float("inf") or (max_staleness is not None and age > max_staleness):
+            logger.debug(
+                f"Info for {self.device_id} is too old to read ({age}s). Refreshing first"
+            )
+            self.refresh_zone_info(sources)
+            return
+
+        if warm or age <= fresh_for:
+            # the background refresh (if running) keeps it up to date
+            return
 
-    def refresh_zone_info(self) -> None:
-        """refreshes the zone_info attribute"""
-        all_zones_info = self.pyhtcc.get_zones_info()
-        for z in all_zones_info:
-            if z["DeviceID"] == self.device_id:
-                logger.debug("Refreshed zone info for {self.device_id}")
-                self.zone_info = z
+        self._revalidate(sources)
+
+    def _revalidate(self, sources: DataSource) -> None:
+        """
+        refreshes the given DataSource(s) in the background, unless a background refresh is already running.
+        Errors are logged and saved as self.last_refresh_error.
+        """
+
+        def _refresh_in_background():
+            try:
+                self._refresh(sources)
+                self.last_refresh_error = None
+            except Exception as ex:
+                logger.warning(
+                    f"Unable to refresh {self.device_id} in the background: {ex!r}"
+                )
+                self.last_refresh_error = ex
+
+        with self._revalidate_lock:
+            if self._revalidating is not None and not self._revalidating.done():
                 return
 
-        raise ZoneNotFoundError(f"Missing device: {self.device_id}")
+            logger.debug(f"Refreshing {self.device_id} from {sources!r} in background")
+            self._revalidating = self.pyhtcc._get_background_executor().submit(
+                _refresh_in_background
+            )
+
+    def _set_latest_data(
+        self, changes: typing.Dict[typing.Tuple[str, str], typing.Any]
+    ) -> None:
+        """sets the given (section, key) -> value in zone_info["latestData"] without changing the dicts in place"""
+        latest = dict(self._zone_info.get("latestData") or {})
+        for (section, key), value in changes.items():
+            latest[section] = {**(latest.get(section) or {}), key: value}
+
+        self._zone_info = {**self._zone_info, "latestData": latest}
+
+    def _apply_pending_changes(self, data: dict, timeout: float) -> None:
+        """
+        applies the given (successfully submitted) control changes to zone_info, marking them as pending until
+            the next CheckDataSession refresh. Does nothing if zone_info hasn't been loaded.
+        For timeout seconds, a refresh still showing the value from before the change is taken as the portal not
+            having caught up yet, so the change stays pending.
+        """
+        if self._zone_info is None:
+            return
+
+        latest = self._zone_info.get("latestData") or {}
+        expires = time.monotonic() + timeout
+        changes = {}
+        for key, value in data.items():
+            # None means no change
+            if value is None or key not in self.CONTROL_CHANGE_FIELDS:
+                continue
+
+            field = self.CONTROL_CHANGE_FIELDS[key]
+            section, name = field
+            if field in self._pending:
+                # the device's value is still the one from before the first pending change
+                previous = self._pending[field][1]
+            else:
+                previous = (latest.get(section) or {}).get(name)
+            changes[field] = value
+            self._pending[field] = (value, previous, expires)
+
+        if changes:
+            logger.debug(f"Optimistically applied {changes} to {self.device_id}")
+            self._set_latest_data(changes)
+
+    def _reconcile_pending_changes(self, sources: DataSource) -> None:
+        """
+        called after zone_info changes with new info from the given DataSource(s). The new info confirms or
+            corrects pending changes, so they stop being pending. Only if it still shows the value from before a
+            change (and that change's grace period hasn't passed) is the change kept pending and applied again.
+        Only new CheckDataSession info can confirm them, so this does nothing unless DataSource.Session is given.
+        """
+        if not self._pending or self._zone_info is None:
+            return
+
+        if not sources & DataSource.Session:
+            return
+
+        latest = self._zone_info.get("latestData") or {}
+        now = time.monotonic()
+        changes = {}
+        for (section, key), (value, previous, expires) in list(self._pending.items()):
+            current = (latest.get(section) or {}).get(key)
+            if current != value and current == previous and now < expires:
+                # the portal hasn't caught up with the change yet
+                changes[(section, key)] = value
+            else:
+                del self._pending[(section, key)]
+
+        if changes:
+            self._set_latest_data(changes)
+
+    @property
+    def pending_changes(self) -> typing.Dict[str, typing.Any]:
+        """
+        dotted path in zone_info (like 'latestData.uiData.HeatSetpoint') -> value for every optimistically
+            applied change that a refresh hasn't confirmed yet. See PyHTCC's optimistic_updates.
+        """
+        return {
+            f"latestData.{section}.{key}": value
+            for (section, key), (value, _, _) in self._pending.items()
+        }
+
+    @contextlib.contextmanager
+    def _refresh_suspended(self) -> typing.Iterator[None]:
+        """
+        within this context, refresh_zone_info() does nothing so getters read the current zone_info.
+        This only applies to the current thread: getters called from other threads still refresh.
+        """
+        self._refresh_suspend.depth = getattr(self._refresh_suspend, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self._refresh_suspend.depth -= 1
+
+    def _refresh_is_suspended(self) -> bool:
+        """True if refresh_zone_info() does nothing in the current thread (see _refresh_suspended())"""
+        return getattr(self._refresh_suspend, "depth", 0) > 0
+
+    def read(self, *getters: typing.Union[str, typing.Callable]) -> tuple:
+        """
+        Calls all of the given getters (names or Zone methods, like 'get_fan_mode' or Zone.get_heat_setpoint_raw)
+            after a single refresh_zone_info() of just the DataSource(s) they need. Returns a tuple of their results.
+        """
+        funcs = [
+            getattr(type(self), g) if isinstance(g, str) else getattr(g, "__func__", g)
+            for g in getters
+        ]
+        sources = DataSource(0)
+        for func in funcs:
+            sources |= getattr(func, "data_sources", DataSource(0))
+
+        if sources:
+            self._refresh_for_read(sources)
+
+        with self._refresh_suspended():
+            return tuple(func(self) for func in funcs)
+
+    def wait_until(
+        self,
+        predicate: typing.Callable[["Zone"], bool],
+        timeout: float = 60,
+        sources: DataSource = DataSource.Session,
+        initial_interval: float = 1.0,
+        max_interval: float = 15.0,
+        backoff: float = 1.5,
+    ) -> bool:
+        """
+        Refreshes (only the given sources for only this device) until predicate(self) returns True or timeout
+            seconds pass. Returns True if the predicate held, False on timeout.
+
+        The predicate reads the just refreshed info: getters called within it don't refresh again.
+        The time between refreshes starts at initial_interval and is multiplied by backoff (up to max_interval).
+        """
+        deadline = time.monotonic() + timeout
+        interval = initial_interval
+        while True:
+            self.refresh_zone_info(sources)
+            with self._refresh_suspended():
+                if predicate(self):
+                    return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.debug(f"Timed out waiting on {self.device_id}")
+                return False
+
+            time.sleep(min(interval, remaining))
+            interval = min(interval * backoff, max_interval)
+
+    def wait_for_control_changes(
+        self, data: dict, timeout: float = 60, **kwargs
+    ) -> bool:
+        """
+        Waits (see wait_until()) until the device reports all of the given control changes (as given to
+            submit_control_changes()). Optimistic values that are still pending don't count.
+        Returns True once they have taken effect, False on timeout.
+        """
+        expected = {
+            self.CONTROL_CHANGE_FIELDS[key]: value
+            for key, value in data.items()
+            if value is not None and key in self.CONTROL_CHANGE_FIELDS
+        }
+
+        def _applied(zone: "Zone") -> bool:
+            latest = zone.zone_info.get("latestData") or {}
+            return all(
+                field not in zone._pending
+                and (latest.get(field[0]) or {}).get(field[1]) == value
+                for field, value in expected.items()
+            )
+
+        return self.wait_until(_applied, timeout=timeout, **kwargs)
+
+    @property
+    def detail(self) -> DetailLevel:
+        """the DetailLevel of the current zone_info"""
+        if "OutdoorTemperature" in self.zone_info:
+            return DetailLevel.Full
+        if "latestData" in self.zone_info:
+            return DetailLevel.Session
+        if "Name" in self.zone_info:
+            return DetailLevel.Names
+        return DetailLevel.List
+
+    @property
+    def available_fields(self) -> frozenset:
+        """the (top level) zone_info fields that are available at the current detail level"""
+        return DETAIL_LEVEL_FIELDS[self.detail]
 
     def get_name(self) -> str:
-        """gets the name corresponding with this Zone"""
+        """
+        gets the name corresponding with this Zone.
+        If zone_info doesn't have the name (see DetailLevel), it is gotten from the (cached) name lookup.
+        """
+        if "Name" not in self.zone_info:
+            self.zone_info["Name"] = self.pyhtcc._get_name_for_device_id(self.device_id)
         return self.zone_info["Name"]
 
     def _get_with_unit(self, raw) -> str:
         """takes the raw and adds a degree sign and a unit"""
-        disp_unit = self.zone_info["DispUnits"]
+        disp_unit = self.zone_info.get("DispUnits")
+        if disp_unit is None:
+            # if we only have CheckDataSession info
+            disp_unit = self.zone_info["latestData"]["uiData"]["DisplayUnits"]
         return f"{raw}°{disp_unit}"
 
+    @_reads(DataSource.Session)
     def get_system_mode(self) -> SystemMode:
         """
         refreshes the cached zone information then returns the current system mode
         """
-        self.refresh_zone_info()
         return SystemMode(
             self.zone_info["latestData"]["uiData"]["SystemSwitchPosition"]
         )
 
+    @_reads(DataSource.Session)
     def is_equipment_output_on(self) -> bool:
         """
         Refreshes the cached zone information then Returns true if the EquipmentOutputStatus
         is non 0. This typically meansthe system is heating/cooling.
         """
-        self.refresh_zone_info()
         return bool(self.zone_info["latestData"]["uiData"]["EquipmentOutputStatus"])
 
+    @_reads(DataSource.Session)
     def is_calling_for_heat(self) -> int:
         """
         Refreshes the cached zone information and checks if the system mode is heating
@@ -190,6 +1442,7 @@ class Zone:
             and self.is_equipment_output_on()
         )
 
+    @_reads(DataSource.Session)
     def is_calling_for_cool(self) -> int:
         """
         Refreshes the cached zone information and checks if the system mode is cooling
@@ -199,78 +1452,84 @@ class Zone:
             and self.is_equipment_output_on()
         )
 
+    @_reads(DataSource.ZoneList)
     def get_current_temperature_raw(self) -> int:
         """gets the current temperature via refreshing the cached zone information"""
-        self.refresh_zone_info()
         if self.zone_info["DispTempAvailable"]:
             return int(self.zone_info["DispTemp"])
 
         raise KeyError("Temperature is unavailable")
 
+    @_reads(DataSource.ZoneList)
     def get_current_temperature(self) -> str:
         """calls get_current_temperature_raw() then adds on a degree sign and the display unit"""
         raw = self.get_current_temperature_raw()
         return self._get_with_unit(raw)
 
+    @_reads(DataSource.Session)
     def get_fan_mode(self) -> FanMode:
         """
         refreshes the cached zone information then returns the current FanMode
         """
-        self.refresh_zone_info()
         return FanMode(self.zone_info["latestData"]["fanData"]["fanMode"])
 
+    @_reads(DataSource.Session)
     def is_fan_running(self) -> bool:
         """
         refreshes the cached zone information then returns True if the fan is running
         """
-        self.refresh_zone_info()
         return bool(self.zone_info["latestData"]["fanData"]["fanIsRunning"])
 
+    @_reads(DataSource.Session)
     def get_heat_setpoint_raw(self) -> int:
         """refreshes the cached zone information then returns the heat setpoint"""
-        self.refresh_zone_info()
         return int(self.zone_info["latestData"]["uiData"]["HeatSetpoint"])
 
+    @_reads(DataSource.Session)
     def get_cool_setpoint_raw(self) -> int:
         """refreshes the cached zone information then returns the cool setpoint"""
-        self.refresh_zone_info()
         return int(self.zone_info["latestData"]["uiData"]["CoolSetpoint"])
 
+    @_reads(DataSource.Session)
     def get_heat_setpoint(self) -> str:
         """calls get_heat_setpoint_raw() then adds on a degree sign and the display unit"""
         raw = self.get_heat_setpoint_raw()
         return self._get_with_unit(raw)
 
+    @_reads(DataSource.Session)
     def get_cool_setpoint(self) -> str:
         """calls get_cool_setpoint_raw() then adds on a degree sign and the display unit"""
         raw = self.get_cool_setpoint_raw()
         return self._get_with_unit(raw)
 
+    @_reads(DataSource.Weather)
     def get_outdoor_temperature_raw(self) -> int:
         """refreshes the cached zone information then returns the outdoor temperature raw value"""
-        self.refresh_zone_info()
         return self.zone_info["OutdoorTemperature"]
 
+    @_reads(DataSource.Weather)
     def get_outdoor_temperature(self) -> str:
         """calls get_outdoor_temperature_raw() then returns it with a degree sign and the display unit"""
         raw = self.get_outdoor_temperature_raw()
         return self._get_with_unit(raw)
 
+    @_reads(DataSource.Session)
     def get_indoor_temperature_raw(self) -> int:
         """refreshes the cached zone information then returns the indoor temperature raw value"""
-        self.refresh_zone_info()
         return self.zone_info["latestData"]["uiData"]["DispTemperature"]
 
+    @_reads(DataSource.Session)
     def get_indoor_temperature(self) -> str:
         """calls get_indoor_temperature_raw() then returns it with a degree sign and the Display unit"""
         raw = self.get_indoor_temperature_raw()
         return self._get_with_unit(raw)
 
+    @_reads(DataSource.Session)
     def get_indoor_humidity_raw(self) -> int:
         """refreshes the cached zone information then returns the indoor humidity raw value"""
-        self.refresh_zone_info()
         return self.zone_info["latestData"]["uiData"]["IndoorHumidity"]
 
+    @_reads(DataSource.Session)
     def get_indoor_humidity(self) -> str:
         """calls get_indoor_humidity_raw() then returns it with a % display unit"""
         raw = self.get_indoor_humidity_raw()
@@ -283,7 +1542,53 @@ class Zone:
         """
         return self.pyhtcc.submit_raw_control_changes(self.device_id, data)
 
-    @deprecated(
+    def build_control_changes(
+        self,
+        heat: typing.Optional[int] = None,
+        cool: typing.Optional[int] = None,
+        end: typing.Union[datetime.timedelta, datetime.time, None] = None,
+        fan_mode: typing.Optional[FanMode] = None,
+        system_mode: typing.Optional[SystemMode] = None,
+    ) -> dict:
+        """
+        Builds the data for a single submit_control_changes() call that makes all of the given changes at once.
+
+        heat/cool are new setpoints. If an end is given (see set_temp_heat_setpoint()), they are temporary holds
+            until then. Otherwise they are permanent holds.
+        If system_mode isn't given: setting only heat turns the system to 'Heat' and setting only cool turns it
+            to 'Cool' (like set_permanent_heat_setpoint()/set_permanent_cool_setpoint()).
+        """
+        data = {}
+        if heat is not None or cool is not None:
+            status = 2 if end is None else 1
+            data["StatusHeat"] = status
+            data["StatusCool"] = status
+
+            if heat is not None:
+                data["HeatSetpoint"] = heat
+                if end is not None:
+                    data["HeatNextPeriod"] = self._coerce_temp_end_to_setpoint(end)
+
+            if cool is not None:
+                data["CoolSetpoint"] = cool
+                if end is not None:
+                    data["CoolNextPeriod"] = self._coerce_temp_end_to_setpoint(end)
+
+        if system_mode is None:
+            if heat is not None and cool is None:
+                system_mode = SystemMode.Heat
+            elif cool is not None and heat is None:
+                system_mode = SystemMode.Cool
+
+        if system_mode is not None:
+            data["SystemSwitch"] = int(system_mode)
+
+        if fan_mode is not None:
+            data["FanMode"] = int(fan_mode)
+
+        return data
+
+    @_deprecated(
         version="0.1.11",
         reason="Use the correctly spelt: set_permanent_cool_setpoint() instead. set_permananent_cool_setpoint() will be removed in a future release.",
     )
@@ -301,7 +1606,7 @@ class Zone:
             {"CoolSetpoint": temp, "StatusHeat": 2, "StatusCool": 2, "SystemSwitch": 3}
         )
 
-    @deprecated(
+    @_deprecated(
         version="0.1.11",
         reason="Use the correctly spelt: set_permanent_heat_setpoint() instead. set_permananent_heat_setpoint() will be removed in a future release.",
     )
@@ -465,17 +1770,159 @@ class PyHTCC:
     Class that represents a Python object to control a Honeywell Total Connect Comfort thermostat system
     """
 
-    def __init__(self, username: str, password: str):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        device_names: typing.Optional[typing.Dict[int, str]] = None,
+        name_cache_ttl: typing.Optional[float] = 3600,
+        name_cache_size: int = 256,
+        metadata_cache: typing.Optional[MetadataCache] = None,
+        request_budget: typing.Optional[RequestBudget] = None,
+        login: bool = True,
+        optimistic_updates: bool = False,
+        pending_timeout: float = 10.0,
+        validate_limits: bool = True,
+        clamp_setpoints: bool = False,
+        session_factory: typing.Optional[typing.Callable[[], typing.Any]] = None,
+        stale_while_revalidate: typing.Optional[float] = None,
+        max_staleness: typing.Optional[float] = 300.0,
+        zone_workers: int = 1,
+    ):
         """
         Initializer for the PyHTCC object. Will save username and password, then call authenticate().
+        If login is False, authenticate() is not called. It (or from_state()) must be used before making requests.
+
+        Zone names are scraped from the portal and cached per PyHTCC object:
+            device_names can be used to seed the cache with an already known device id -> name mapping.
+            name_cache_ttl is the number of seconds a cached name is used before it is looked up again
+                (None to never expire).
+            name_cache_size is the maximum number of names to cache.
+
+        If a MetadataCache is given as metadata_cache, names (and the location id) are loaded from it on startup,
+            and it is updated whenever get_zones_info() sees metadata that differs from what was cached.
+
+        If a RequestBudget is given as request_budget, every request to the portal (including logging in) waits
+            for the budget to allow it.
+
+        If optimistic_updates is True, successfully submitted control changes are applied right away to the
+            device's Zone (if one exists). Those fields are pending (see Zone.pending_changes) until the next
+            CheckDataSession refresh confirms or corrects them. Since the portal takes a moment to catch up, for
+            pending_timeout seconds a refresh still showing the old value keeps the change pending.
+
+        Each device's setpoint limits and capabilities (see DeviceLimits) are cached whenever its CheckDataSession
+            data is fetched. If validate_limits is True, control changes are checked against them before being
+            submitted: InvalidControlChangeError is raised instead of making a request that would fail. If
+            clamp_setpoints is also True, out of range setpoints are clamped to the limits instead.
+
+        session_factory is called (with no arguments) to create each session instead of requests.session().
+            It must return something that works like a requests.Session (see pyhtcc.cassette for examples).
+
+        If stale_while_revalidate is given, Zone getters don't wait on the portal: they read the info a Zone already
+            has (see Zone.get_age()). Once that info is older than stale_while_revalidate seconds, reading it also
+            starts a refresh of it in the background (at most one at a time per Zone). Failed background refreshes
+            are logged (see Zone.last_refresh_error) and the old info keeps being read, until it is older than
+            max_staleness seconds (None for no limit). Then getters refresh before reading, raising on failure.
+            max_staleness also applies while the background refresh runs (see start_background_refresh()).
+
+        zone_workers is the max number of zones (per location) whose per-zone requests are made at the same time
+            when getting every zone's info (like get_zones_info()). Raising it is most useful with a session that
+            multiplexes requests over one connection (see pyhtcc.httpx_backend).
         """
         self.username = username
         self.password = password
         self._locationId = None
+        self._locationIds = None
         self.session = None
+        self.request_budget = request_budget
+        self.optimistic_updates = optimistic_updates
+        self.pending_timeout = pending_timeout
+        self.validate_limits = validate_limits
+        self.clamp_setpoints = clamp_setpoints
+        self.session_factory = session_factory
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_staleness = max_staleness
+        self.zone_workers = zone_workers
+
+        # see start_background_refresh()
+        self._background_refresh_thread = None
+        self._background_refresh_stop = threading.Event()
+        self._background_refresh_stats = BackgroundRefreshStats()
+        # strong references to the Zones kept warm, so they stay in self._zones
+        self._warm_zones = []
+
+        # created on first use by _get_background_executor()
+        self._background_executor = None
+        self._background_executor_lock = threading.Lock()
+
+        # device id -> DeviceLimits, from the last CheckDataSession for that device
+        self._device_limits = {}
+
+        self._device_names = TTLCache(maxsize=name_cache_size, ttl=name_cache_ttl)
+
+        # device id -> the one Zone object for that device (while something else holds a reference to it)
+        self._zones = weakref.WeakValueDictionary()
+        self._zones_lock = threading.Lock()
+        if device_names:
+            self.seed_device_names(device_names)
+
+        self.metadata_cache = metadata_cache
+        self._cached_metadata = None
+        if self.metadata_cache is not None:
+            self._cached_metadata = self.metadata_cache.load(username)
+            if self._cached_metadata:
+                logger.debug("Using cached metadata")
+                self._locationId = self._cached_metadata.get("location_id")
+                self._locationIds = self._cached_metadata.get("location_ids")
+                self.seed_device_names(self._cached_metadata.get("device_names") or {})
 
         # self.session will be created in authenticate()
-        self.authenticate()
+        if login:
+            self.authenticate()
+
+    def get_state(self) -> dict:
+        """
+        Returns a picklable/json-able dict of this client's state: credentials, session cookies, location ids and
+            cached device names. Pass it to PyHTCC.from_state() (for example in another process) to get an
+            equivalent logged in client without logging in again.
+
+        Note that the returned dict contains the password.
+        """
+        return {
+            "username": self.username,
+            "password": self.password,
+            "cookies": self.session.cookies.get_dict() if self.session else None,
+            "location_id": self._locationId,
+            "location_ids": self._locationIds,
+            "device_names": dict(self._device_names.items()),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, **kwargs) -> "PyHTCC":
+        """
+        Creates a PyHTCC object from the result of get_state(). Other kwargs are passed to the initializer.
+        If the state has session cookies, they are reused instead of logging in. Otherwise, this logs in.
+        """
+        pyhtcc = cls(
+            state["username"],
+            state["password"],
+            device_names={
+                int(device_id): name
+                for device_id, name in (state.get("device_names") or {}).items()
+            },
+            login=False,
+            **kwargs,
+        )
+
+        if state.get("cookies") and state.get("location_id") is not None:
+            pyhtcc._create_session()
+            pyhtcc.session.cookies.update(state["cookies"])
+            pyhtcc._locationId = state["location_id"]
+            pyhtcc._locationIds = state.get("location_ids")
+        else:
+            pyhtcc.authenticate()
+
+        return pyhtcc
 
     def authenticate(self) -> None:
         """
@@ -501,6 +1948,22 @@ class PyHTCC:
 
         raise AuthenticationError("Unable to authenticate. Ran out of tries")
 
+    def _get_background_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """returns the (lazily created) executor for background refreshes"""
+        import concurrent.futures
+
+        with self._background_executor_lock:
+            if self._background_executor is None:
+                self._background_executor = concurrent.futures.ThreadPoolExecutor(
+                    thread_name_prefix="pyhtcc-refresh"
+                )
+            return self._background_executor
+
+    def _wait_for_request_budget(self) -> None:
+        """blocks until our request budget (if we have one) allows another request"""
+        if self.request_budget is not None:
+            self.request_budget.acquire()
+
     def _ensure_session(func) -> None:
         """
         Will raise if we do not have a session to work with
@@ -516,14 +1979,14 @@ class PyHTCC:
 
         return decorator
 
-    def _do_authenticate(self) -> None:
-        """
-        Attempts to perform the actual authentication.
-        Will set: self.session and self._locationId
+    def _create_session(self) -> None:
+        """creates a new (not yet logged in) self.session"""
+        if self.session_factory is not None:
+            self.session = self.session_factory()
+        else:
+            import requests  # depends
 
-        Can raise various exceptions. Users are expected to use authenticate() instead of this method.
-        """
-        self.session = requests.session()
+            self.session = requests.session()
 
         # See https://github.com/psf/requests/issues/4564 for why we encode user/pass to bytes
         self.session.auth = (
@@ -531,8 +1994,18 @@ class PyHTCC:
             self.password.encode("utf-8"),
         )
 
+    def _do_authenticate(self) -> None:
+        """
+        Attempts to perform the actual authentication.
+        Will set: self.session and self._locationId
+
+        Can raise various exceptions. Users are expected to use authenticate() instead of this method.
+        """
+        self._create_session()
+
         logger.debug(f"Attempting authentication for {self.username}")
 
+        self._wait_for_request_budget()
         result = self.session.post(
             "https://mytotalconnectcomfort.com/portal",
             {
@@ -579,6 +2052,7 @@ class PyHTCC:
         Note that after calling this function, you must call authenticate() to login and get a new session.
         """
         logger.debug(f"Attempting to logout user: {self.username}")
+        self._wait_for_request_budget()
         result = self.session.get(
             "https://mytotalconnectcomfort.com/portal/Account/LogOff"
         )
@@ -590,6 +2064,60 @@ class PyHTCC:
         logger.debug(f"Successfully logged out: {self.username}")
         self.session = None
 
+    def get_cached_metadata(self) -> typing.Optional[dict]:
+        """
+        Returns the metadata loaded from (or last saved to) the metadata cache, or None if there is none.
+        See MetadataCache.load() for the format.
+        """
+        return self._cached_metadata
+
+    def _update_metadata_cache(self, zones: list) -> None:
+        """saves metadata from the given zones info to the metadata cache (if we have one and it changed)"""
+        if self.metadata_cache is None:
+            return
+
+        metadata = {
+            "location_id": self._locationId,
+            "location_ids": self._locationIds,
+            "device_names": {
+                str(zone["DeviceID"]): zone["Name"] for zone in zones if "Name" in zone
+            },
+        }
+
+        cached = self._cached_metadata or {}
+        if {k: cached.get(k) for k in metadata} != metadata:
+            logger.debug("Metadata changed, updating the metadata cache")
+            try:
+                self.metadata_cache.save(self.username, metadata)
+            except OSError:
+                logger.exception("Unable to save the metadata cache")
+            self._cached_metadata = metadata
+
+    def seed_device_names(self, device_names: typing.Dict[int, str]) -> None:
+        """
+        Adds the given device id -> name mapping to the name cache, so those names need not be scraped from the portal.
+        """
+        for device_id, name in device_names.items():
+            self._device_names.set(int(device_id), name)
+
+    def invalidate_device_name(self, device_id: typing.Optional[int] = None) -> None:
+        """
+        Removes the cached name for the given device id (or all cached names if not given).
+        The next lookup will get the name from the portal. Useful if a thermostat was renamed.
+        """
+        self._device_names.invalidate(device_id)
+
+    def _get_name_index(self) -> typing.Dict[str, typing.List[int]]:
+        """
+        returns a lowercase name -> [device ids] index of the name cache. It is built from the unexpired names on
+            each call, so expired (possibly renamed) names are never matched.
+        """
+        name_index = {}
+        for device_id, name in self._device_names.items():
+            name_index.setdefault(name.lower(), []).append(device_id)
+
+        return name_index
+
     def _set_location_id_from_result(self, result):
         """
         Attempts to find the location id first from the url then if that fails, in the result's text content
@@ -600,25 +2128,73 @@ class PyHTCC:
             logger.debug(
                 "Unable to grab location id via url... checking content instead"
             )
-            self._locationId = int(re.findall(r"locationId=(\d+)", result.text)[0])
+            location_ids = re.findall(r"locationId=(\d+)", result.text)
+            if not location_ids and self._cached_metadata:
+                logger.debug(
+                    "Unable to grab location id via content... using cached id"
+                )
+                location_ids = [self._cached_metadata["location_id"]]
+            self._locationId = int(location_ids[0])
 
         logger.debug(f"location id is {self._locationId}")
 
-    @functools.lru_cache(maxsize=None)
     @_ensure_session
+    def _get_control_page_properties(
+        self, device_id: int, needed: typing.Optional[typing.Iterable[str]] = None
+    ) -> dict:
+        """
+        Private API to fetch the Device/Control page for the given device and parse it in a single pass.
+        See _parse_control_page() for the format of the returned dict.
+
+        The page is streamed. If needed is given, we stop reading (and release the connection) as soon as
+            all of those properties have been found. Otherwise the whole page is read.
+        """
+        import requests  # depends
+
+        self._wait_for_request_budget()
+        result = self.session.get(
+            f"https://mytotalconnectcomfort.com/portal/Device/Control/{device_id}?page=1",
+            stream=True,
+        )
+        try:
+            result.raise_for_status()
+
+            scanner = _ControlPageScanner(needed)
+            try:
+                for chunk in result.iter_content(
+                    CONTROL_PAGE_CHUNK_SIZE, decode_unicode=True
+                ):
+                    scanner.feed(chunk)
+                    if scanner.done:
+                        logger.debug(
+                            f"Found {needed} for {device_id}. Not reading the rest of the control page"
+                        )
+                        break
+
+                return scanner.close()
+            except requests.exceptions.RequestException:
+                raise
+            except:
+                logger.exception("Unable to parse the control page.")
+                return {}
+        finally:
+            result.close()
+
     def _get_name_for_device_id(self, device_id: int) -> str:
         """
         Will ask via the api for the name corresponding with the device id.
         Note that this actually greps the html for the name.
         Note that this will only perform an HTTP request if we don't already have this device_id's name cached
         """
-        # grab the name from the portal
-        result = self.session.get(
-            f"https://mytotalconnectcomfort.com/portal/Device/Control/{device_id}?page=1"
-        )
-        result.raise_for_status()
+        name = self._device_names.get(device_id)
+        if name is not None:
+            return name
 
-        name = re.findall(r'id=\s?"ZoneName"\s?>(.*) Control<', result.text)[0]
+        # grab the name from the portal
+        name = self._get_control_page_properties(device_id, needed=("ZoneName",))[
+            "ZoneName"
+        ]
+        self._device_names.set(device_id, name)
         logger.debug(f"Called portal to say {device_id} -> {name}")
         return name
 
@@ -627,34 +2203,26 @@ class PyHTCC:
         """
         Private API to find the outdoor information on one of the logged in pages
         """
-        result = self.session.get(
-            f"https://mytotalconnectcomfort.com/portal/Device/Control/{device_id}?page=1"
+        properties = self._get_control_page_properties(
+            device_id, needed=("outdoorTemp", "outdoorHumidity")
         )
-        result.raise_for_status()
 
-        text_data = result.text
-        try:
-            outdoor_temp = int(
-                float(
-                    text_data.split("Control.Model.Property.outdoorTemp,")[1]
-                    .split(")", 1)[0]
-                    .strip()
-                )
-            )
-        except:
-            logger.exception("Unable to find the outdoor temperature.")
+        outdoor_temp = properties.get("outdoorTemp")
+        if isinstance(outdoor_temp, (int, float)) and not isinstance(
+            outdoor_temp, bool
+        ):
+            outdoor_temp = int(outdoor_temp)
+        else:
+            logger.error("Unable to find the outdoor temperature.")
             outdoor_temp = None
 
-        try:
-            outdoor_humidity = int(
-                float(
-                    text_data.split("Control.Model.Property.outdoorHumidity,")[1]
-                    .split(")", 1)[0]
-                    .strip()
-                )
-            )
-        except:
-            logger.exception("Unable to find the outdoor humidity.")
+        outdoor_humidity = properties.get("outdoorHumidity")
+        if isinstance(outdoor_humidity, (int, float)) and not isinstance(
+            outdoor_humidity, bool
+        ):
+            outdoor_humidity = int(outdoor_humidity)
+        else:
+            logger.error("Unable to find the outdoor humidity.")
             outdoor_humidity = None
 
         return {
@@ -662,22 +2230,60 @@ class PyHTCC:
             "OutdoorHumidity": outdoor_humidity,
         }
 
-    def _post_zone_list_data(self, page_num: int) -> typing.Optional[dict]:
+    def _post_location_list_data(self) -> typing.Optional[list]:
+        """
+        Private function to call the GetLocationListData api. On success returns the json data.
+        This is a list of dicts, one per location on the account, each having (at least) a LocationID.
+        """
+        try:
+            return self._request_json(
+                "POST",
+                "https://mytotalconnectcomfort.com/portal/Location/GetLocationListData?page=1&filter=",
+            )
+        except UnexpectedError:
+            logger.exception("Unable to get the location list")
+            return None
+
+    def _post_zone_list_data(
+        self, page_num: int, location_id: typing.Optional[int] = None
+    ) -> typing.Optional[dict]:
         """
         Private function to call the GetZoneListData api. On success returns the json data.
+        If location_id is not given, uses the location id we got when logging in.
 
         Internally this function will catch UnexpectedError as that is expected when we read beyond the last page.
 
         See tests for sample output.
         """
+        if location_id is None:
+            location_id = self._locationId
+
         try:
             return self._request_json(
                 "POST",
-                f"https://mytotalconnectcomfort.com/portal/Device/GetZoneListData?locationId={self._locationId}&page={page_num}",
+                f"https://mytotalconnectcomfort.com/portal/Device/GetZoneListData?locationId={location_id}&page={page_num}",
             )
         except UnexpectedError:
             return None
 
+    def _get_session_data(self, device_id: int) -> dict:
+        """calls _get_check_data_session() and caches the device's limits (see get_device_limits()) from it"""
+        data = self._get_check_data_session(device_id)
+        self._device_limits[device_id] = DeviceLimits.from_session_data(data)
+        return data
+
+    def get_device_limits(self, device_id: int, refresh: bool = False) -> DeviceLimits:
+        """
+        Returns the DeviceLimits for the given device. They are cached from the last CheckDataSession for the
+            device. One is only requested if nothing is cached or refresh is True.
+        """
+        limits = self._device_limits.get(device_id)
+        if limits is None or refresh:
+            self._get_session_data(device_id)
+            limits = self._device_limits[device_id]
+
+        return limits
+
     def _get_check_data_session(self, device_id: int) -> dict:
         """
         Private function to call the CheckDataSession api. On success returns the json data.
@@ -698,6 +2304,9 @@ class PyHTCC:
 
         Will attempt to sanity check the response and raise appropriate exceptions if something appears wrong.
         """
+        import requests  # depends
+
+        self._wait_for_request_budget()
         result = self.session.request(
             method,
             url,
@@ -729,62 +2338,368 @@ class PyHTCC:
 
         return result_json
 
-    def get_zones_info(self) -> list:
+    def get_location_ids(self, refresh: bool = False) -> typing.List[int]:
         """
-        Returns a list of dicts corresponding with each one corresponding to a particular zone.
+        Returns the ids of all locations (buildings) on the account. The location we got when logging in is first.
+        This is looked up once then cached. Pass refresh=True to look it up again.
+        """
+        if (
+            refresh
+            or self._locationIds is None
+            or self._locationId not in self._locationIds
+        ):
+            location_ids = [self._locationId]
+            for location in self._post_location_list_data() or []:
+                location_id = int(location["LocationID"])
+                if location_id not in location_ids:
+                    location_ids.append(location_id)
+
+            logger.debug(f"location ids are {location_ids}")
+            self._locationIds = location_ids
+
+        return self._locationIds
+
+    def _iter_zone_list_for_location(self, location_id: int) -> typing.Iterator[dict]:
+        """
+        Yields the GetZoneListData rows (see ZONE_LIST_FIELDS) for every zone in the given location.
+        Each row also gets a LocationID key. Pages are only requested as they are needed.
         """
-        zones = []
         for page_num in range(1, 6):
             logger.debug(
-                f"Attempting to get zones for location id, page: {self._locationId}, {page_num}"
+                f"Attempting to get zones for location id, page: {location_id}, {page_num}"
             )
-            data = self._post_zone_list_data(page_num)
-            if page_num == 1 and not data:
-                raise NoZonesFoundError("No zones were found from GetZoneListData")
-            elif not data:
-                # first empty page means we're done
-                logger.debug(f"page {page_num} is empty")
-                break
+            data = self._post_zone_list_data(page_num, location_id)
 
             # once we go to an empty page, we're done. Luckily it returns empty json instead of erroring
             if not data:
                 logger.debug(f"page {page_num} is empty")
                 break
 
-            zones.extend(data)
+            for zone in data:
+                yield {**zone, "LocationID": location_id}
 
-        # add name (and additional info) to zone info
-        for idx, zone in enumerate(zones):
-            device_id = zone["DeviceID"]
-            name = self._get_name_for_device_id(device_id)
-            zone["Name"] = name
+    def _get_zone_list_for_location(self, location_id: int) -> list:
+        """
+        Returns the GetZoneListData rows (see ZONE_LIST_FIELDS) for every zone in the given location.
+        Each row also gets a LocationID key.
+        """
+        return list(self._iter_zone_list_for_location(location_id))
 
-            device_id = zone["DeviceID"]
-            more_data = self._get_check_data_session(device_id)
+    def get_zone_info(
+        self,
+        device_id: int,
+        sources: DataSource = DataSource.All,
+        location_id: typing.Optional[int] = None,
+    ) -> dict:
+        """
+        Returns the zone info for a single device, with only the fields from the given DataSource(s).
+        Only the requests for those sources are made, and only for this device.
 
-            zones[idx] = {
-                **zone,
-                **more_data,
-                **self._get_outdoor_weather_info_for_zone(device_id),
-            }
+        If location_id is given, only that location's GetZoneListData is searched for the device.
+        Raises ZoneNotFoundError if DataSource.ZoneList is requested and the device isn't in it.
+        """
+        zone = {"DeviceID": device_id}
+
+        if sources & DataSource.ZoneList:
+            location_ids = (
+                [location_id] if location_id is not None else self.get_location_ids()
+            )
+            for location_id in location_ids:
+                row = next(
+                    (
+                        z
+                        for z in self._iter_zone_list_for_location(location_id)
+                        if z["DeviceID"] == device_id
+                    ),
+                    None,
+                )
+                if row is not None:
+                    zone.update(row)
+                    break
+            else:
+                raise ZoneNotFoundError(f"Missing device: {device_id}")
+
+        if sources & DataSource.Name:
+            zone["Name"] = self._get_name_for_device_id(device_id)
 
+        if sources & DataSource.Session:
+            zone.update(self._get_session_data(device_id))
+
+        if sources & DataSource.Weather:
+            zone.update(self._get_outdoor_weather_info_for_zone(device_id))
+
+        return zone
+
+    def _enrich_zone_info(
+        self, zone: dict, detail: DetailLevel = DetailLevel.Full
+    ) -> dict:
+        """
+        Takes a GetZoneListData row and returns the zone info for it at the given DetailLevel: adds the name,
+            the CheckDataSession data and the outdoor weather info as needed. This makes the per-zone requests.
+        """
+        zone = dict(zone)
+        device_id = zone["DeviceID"]
+
+        if detail >= DetailLevel.Names:
+            zone["Name"] = self._get_name_for_device_id(device_id)
+
+        if detail >= DetailLevel.Session:
+            zone.update(self._get_session_data(device_id))
+
+        if detail >= DetailLevel.Full:
+            zone.update(self._get_outdoor_weather_info_for_zone(device_id))
+
+        return zone
+
+    def _get_zones_info_for_location(
+        self, location_id: int, detail: DetailLevel = DetailLevel.Full
+    ) -> list:
+        """
+        Returns a list of zone info dicts for the given location. See get_zones_info().
+        """
+        return list(
+            self._iter_enriched_zones_info(
+                self._get_zone_list_for_location(location_id), detail
+            )
+        )
+
+    def _iter_enriched_zones_info(
+        self, zones: list, detail: DetailLevel
+    ) -> typing.Iterator[dict]:
+        """
+        Yields _enrich_zone_info() for each of the given GetZoneListData rows, in order.
+        Up to zone_workers zones are enriched at the same time.
+        """
+        if self.zone_workers <= 1 or len(zones) <= 1 or detail == DetailLevel.List:
+            for zone in zones:
+                yield self._enrich_zone_info(zone, detail)
+            return
+
+        import concurrent.futures
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.zone_workers, len(zones)),
+            thread_name_prefix="pyhtcc-zone",
+        ) as executor:
+            yield from executor.map(
+                functools.partial(self._enrich_zone_info, detail=detail), zones
+            )
+
+    def _for_each_location(self, func: typing.Callable[[int], list]) -> list:
+        """
+        Calls func(location_id) for every location and returns the concatenated results.
+        If there are multiple locations, they are done concurrently.
+        """
+        location_ids = self.get_location_ids()
+        if len(location_ids) == 1:
+            return func(location_ids[0])
+
+        import concurrent.futures
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(location_ids)
+        ) as executor:
+            return [
+                item
+                for location_items in executor.map(func, location_ids)
+                for item in location_items
+            ]
+
+    def get_zone_list_data(self) -> list:
+        """
+        Returns a list of dicts, one per zone, with only the data that GetZoneListData gives (see ZONE_LIST_FIELDS).
+        This is much cheaper than get_zones_info() since no per-zone requests are made.
+        Same as get_zones_info(detail=DetailLevel.List).
+        """
+        return self.get_zones_info(detail=DetailLevel.List)
+
+    def iter_zones_info(
+        self, detail: DetailLevel = DetailLevel.Full
+    ) -> typing.Iterator[dict]:
+        """
+        Like get_zones_info() but yields each zone's info as soon as it is ready, instead of waiting for all zones.
+        """
+        zones = self._for_each_location(self._get_zone_list_for_location)
+        if not zones:
+            raise NoZonesFoundError("No zones were found from GetZoneListData")
+
+        yield from self._iter_enriched_zones_info(zones, detail)
+
+    def get_zones_info(self, detail: DetailLevel = DetailLevel.Full) -> list:
+        """
+        Returns a list of dicts corresponding with each one corresponding to a particular zone.
+        Zones from every location on the account are included. Each has a LocationID key.
+
+        detail is the DetailLevel to get for each zone. Anything below DetailLevel.Full skips some of the
+            per-zone requests (see DETAIL_LEVEL_FIELDS for what each level includes).
+        If there are multiple locations, they are fetched concurrently. Within a location, up to zone_workers
+            zones are fetched concurrently (see __init__()).
+        """
+        zones = self._for_each_location(
+            functools.partial(self._get_zones_info_for_location, detail=detail)
+        )
+
+        if not zones:
+            raise NoZonesFoundError("No zones were found from GetZoneListData")
+
+        if detail >= DetailLevel.Names:
+            self._update_metadata_cache(zones)
         return zones
 
-    def get_all_zones(self) -> list:
+    def get_known_zones(self) -> typing.List[Zone]:
+        """returns every Zone object that currently exists for this PyHTCC object. Makes no requests"""
+        with self._zones_lock:
+            return list(self._zones.values())
+
+    def get_all_zones(self, detail: DetailLevel = DetailLevel.Full) -> list:
         """
         Returns a list of Zone objects, corresponding with an object per zone on the account.
+        detail is the DetailLevel to get for each zone (see get_zones_info()).
         """
-        return [Zone(a, self) for a in self.get_zones_info()]
+        return [Zone(a, self) for a in self.get_zones_info(detail=detail)]
 
-    def get_zone_by_name(self, name) -> Zone:
+    @property
+    def background_refreshing(self) -> bool:
+        """True if the background refresh is running (see start_background_refresh())"""
+        return self._background_refresh_thread is not None
+
+    def start_background_refresh(
+        self,
+        interval: float = 60.0,
+        detail: DetailLevel = DetailLevel.Full,
+        backoff: float = 2.0,
+        max_interval: typing.Optional[float] = None,
+    ) -> None:
+        """
+        Starts a daemon thread that calls get_all_zones(detail) every interval seconds (starting now), keeping every
+            zone's info warm. Does nothing if it is already running.
+
+        While it runs, Zone getters read the info a Zone already has instead of making requests, as long as the info
+            they need has been gotten and isn't older than max_staleness (see __init__()).
+            So interval should be less than max_staleness.
+
+        After a failed refresh, the next one is after interval * (backoff ** consecutive failures) seconds
+            (up to max_interval, which defaults to 10 times interval).
+        See get_background_refresh_stats() for metrics.
+        """
+        if self._background_refresh_thread is not None:
+            return
+
+        if max_interval is None:
+            max_interval = interval * 10
+
+        self._background_refresh_stop.clear()
+        self._background_refresh_thread = threading.Thread(
+            target=self._background_refresh,
+            args=(interval, detail, backoff, max_interval),
+            name="pyhtcc-background-refresh",
+            daemon=True,
+        )
+        self._background_refresh_thread.start()
+
+    def stop_background_refresh(self) -> None:
+        """stops the background refresh thread (if started). Zone getters make requests again."""
+        self._background_refresh_stop.set()
+        if self._background_refresh_thread is not None:
+            self._background_refresh_thread.join()
+            self._background_refresh_thread = None
+        self._warm_zones = []
+
+    def get_background_refresh_stats(self) -> BackgroundRefreshStats:
+        """returns the current BackgroundRefreshStats"""
+        return self._background_refresh_stats
+
+    def _background_refresh(
+        self,
+        interval: float,
+        detail: DetailLevel,
+        backoff: float,
+        max_interval: float,
+    ) -> None:
+        """the body of the background refresh thread"""
+        wait = 0.0
+        while not self._background_refresh_stop.wait(wait):
+            stats = self._background_refresh_stats
+            start = time.monotonic()
+            try:
+                self._warm_zones = self.get_all_zones(detail=detail)
+            except Exception as ex:
+                consecutive_failures = stats.consecutive_failures + 1
+                wait = min(interval * (backoff**consecutive_failures), max_interval)
+                logger.warning(
+                    f"Background refresh failed ({consecutive_failures} in a row). Retrying in {wait}s: {ex!r}"
+                )
+                stats = stats._replace(
+                    failures=stats.failures + 1,
+                    consecutive_failures=consecutive_failures,
+                    last_error=ex,
+                    next_wait=wait,
+                )
+            else:
+                wait = interval
+                stats = stats._replace(
+                    refreshes=stats.refreshes + 1,
+                    consecutive_failures=0,
+                    last_refresh_time=time.time(),
+                    last_refresh_duration=time.monotonic() - start,
+                    last_error=None,
+                    zones=len(self._warm_zones),
+                    next_wait=wait,
+                )
+
+            self._background_refresh_stats = stats
+
+    def get_zones_by_name(self, pattern: str) -> typing.List[Zone]:
         """
-        Will grab a Zone object for the given device name (not device id)
+        Returns a list of Zone objects for every zone whose name matches the given (case-insensitive) name or
+            glob pattern (like 'upstairs*').
+
+        An exact name match always wins: the pattern is only used as a glob if no zone has exactly that name
+            (so names with glob characters, like 'Kids Room [2]', can still be matched).
+
+        An exact name is resolved to device ids via the name cache when possible. Otherwise only the zone list and
+            (uncached) names are requested. Either way, full info is only gotten for the matching zones.
         """
+        pattern_lower = pattern.lower()
+
+        zones = []
+        for device_id in self._get_name_index().get(pattern_lower, []):
+            try:
+                zone_info = self.get_zone_info(device_id)
+            except ZoneNotFoundError:
+                logger.debug(f"Cached device {device_id} no longer exists")
+                continue
+
+            # the cached name may have expired while fetching, and the new one may differ
+            if zone_info["Name"].lower() != pattern_lower:
+                logger.debug(f"Device {device_id} was renamed to {zone_info['Name']}")
+                zones = []
+                break
+            zones.append(Zone(zone_info, self))
+
+        if zones:
+            return zones
 
-        zone_info = self.get_zones_info()
-        for a in zone_info:
-            if a["Name"] == name:
-                return Zone(a, self)
+        # the name cache may not know every zone: get every zone's name
+        zones_info = self.get_zones_info(detail=DetailLevel.Names)
+        matches = [z for z in zones_info if z["Name"].lower() == pattern_lower]
+        if not matches and _is_glob(pattern):
+            matches = [
+                z
+                for z in zones_info
+                if fnmatch.fnmatchcase(z["Name"].lower(), pattern_lower)
+            ]
+
+        return [Zone(self._enrich_zone_info(zone), self) for zone in matches]
+
+    def get_zone_by_name(self, name) -> Zone:
+        """
+        Will grab a Zone object for the given device name (not device id).
+        The name is case-insensitive and can be a glob pattern (the first match is returned). See get_zones_by_name().
+        """
+        zones = self.get_zones_by_name(name)
+        if zones:
+            return zones[0]
 
         raise NameError(f"Could not find a zone with the given name: {name}")
 
@@ -814,6 +2729,10 @@ class PyHTCC:
                 )
             data[k] = v
 
+        limits = self._device_limits.get(device_id)
+        if self.validate_limits and limits is not None:
+            data = limits.check(data, clamp=self.clamp_setpoints)
+
         logger.debug(f"Posting data to SubmitControlScreenChange: {data}")
 
         json_data = self._request_json(
@@ -825,6 +2744,30 @@ class PyHTCC:
         if json_data["success"] != 1:
             raise ValueError(f"Success was not returned (success!=1): {json_data}")
 
+        if limits is not None:
+            # keep the cached setpoints current, for checking the deadband of later changes
+            self._device_limits[device_id] = limits._replace(
+                heat_setpoint=(
+                    limits.heat_setpoint
+                    if data["HeatSetpoint"] is None
+                    else data["HeatSetpoint"]
+                ),
+                cool_setpoint=(
+                    limits.cool_setpoint
+                    if data["CoolSetpoint"] is None
+                    else data["CoolSetpoint"]
+                ),
+            )
+
+        if self.optimistic_updates:
+            with self._zones_lock:
+                zone = self._zones.get(device_id)
+
+            if zone is not None:
+                zone._apply_pending_changes(
+                    {k: data[k] for k in other_data}, self.pending_timeout
+                )
+
 
 if __name__ == "__main__":
     email = os.environ.get("PYHTCC_EMAIL")
@@ -0,0 +1,329 @@
+"""
+Holds SetpointScheduler, for running daily per-zone setpoint schedules locally
+"""
+from __future__ import annotations
+
+import datetime
+import enum
+import heapq
+import itertools
+import threading
+import typing
+
+from .plan import (
+    ALL_ZONES,
+    PlanError,
+    _get_zones_by_key,
+    get_zone_kwargs,
+    submit_zone_changes,
+)
+from .pyhtcc import DetailLevel, PyHTCC, Zone, logger
+
+
+class CatchUp(enum.Enum):
+    """
+    Enum for what a SetpointScheduler does with transitions that were missed (more than misfire_grace seconds
+        late), like when starting up or after the process was suspended
+    """
+
+    # drop them
+    Skip = "skip"
+    # apply only the most recent missed transition for each zone
+    Latest = "latest"
+
+
+def _parse_time(value: typing.Union[str, datetime.time]) -> datetime.time:
+    """gets a datetime.time from the given datetime.time or HH:MM string"""
+    if isinstance(value, datetime.time):
+        return value
+
+    try:
+        return datetime.datetime.strptime(str(value), "%H:%M").time()
+    except ValueError:
+        raise PlanError(f"Schedule times must be HH:MM, not {value}")
+
+
+class SetpointScheduler:
+    """
+    Runs daily schedules of targets per zone, like:
+        {
+            "*": {"06:00": {"fan": "auto"}},
+            "Upstairs": {"06:00": {"heat": 68}, "22:00": {"heat": 62}},
+            "123456": {"08:30": {"cool": 78}, "17:00": {"cool": 74}},
+        }
+
+    Zones are keyed by name (case-insensitive) or device id, with "*" applying to every zone (as in a plan,
+        see pyhtcc.plan.load_plan()). Targets are the same as a plan's (see pyhtcc.plan.get_zone_kwargs()).
+
+    Upcoming transitions are kept in a heap. All transitions due at the same time are dispatched together:
+        each zone's targets are merged into a single SubmitControlScreenChanges request, and up to max_workers
+        zones are changed concurrently.
+    """
+
+    def __init__(
+        self,
+        pyhtcc: PyHTCC,
+        schedules: typing.Dict[
+            typing.Union[str, int],
+            typing.Dict[typing.Union[str, datetime.time], dict],
+        ],
+        max_workers: int = 8,
+        catch_up: CatchUp = CatchUp.Latest,
+        misfire_grace: float = 60.0,
+    ):
+        """
+        Initializer for a SetpointScheduler object.
+
+        catch_up is what to do with transitions that are more than misfire_grace seconds late. With
+            CatchUp.Latest, the first run_pending() (or start()) also applies each zone's most recent
+            transition, so zones start out in their scheduled state.
+        """
+        self.pyhtcc = pyhtcc
+        self.max_workers = max_workers
+        self.catch_up = catch_up
+        self.misfire_grace = misfire_grace
+
+        # zone key -> [(time, targets)] sorted by time
+        self.schedules = {}
+        for zone_key, schedule in schedules.items():
+            transitions = []
+            for when, targets in schedule.items():
+                # validate everything up front so we fail before making any changes
+                get_zone_kwargs(targets)
+                transitions.append((_parse_time(when), targets))
+
+            self.schedules[str(zone_key)] = sorted(transitions, key=lambda t: t[0])
+
+        # zone name -> the submitted data (or exception) from the most recent dispatch to that zone
+        self.results = {}
+
+        # (when, sequence number, zone key, transition index, whether to schedule the next occurrence)
+        self._heap = []
+        self._counter = itertools.count()
+        self._seeded = False
+        self._zones = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "SetpointScheduler":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _push(
+        self,
+        when: datetime.datetime,
+        zone_key: str,
+        idx: int,
+        reschedule: bool = True,
+    ) -> None:
+        heapq.heappush(
+            self._heap, (when, next(self._counter), zone_key, idx, reschedule)
+        )
+
+    def _push_next(self, zone_key: str, idx: int, after: datetime.datetime) -> None:
+        """pushes the next occurrence (after the given datetime) of the given transition"""
+        when = datetime.datetime.combine(after.date(), self.schedules[zone_key][idx][0])
+        if when <= after:
+            when += datetime.timedelta(days=1)
+        self._push(when, zone_key, idx)
+
+    def _get_most_recent(
+        self, zone_key: str, now: datetime.datetime
+    ) -> typing.Tuple[datetime.datetime, int]:
+        """returns (when, transition index) of the given zone's most recent transition that isn't after now"""
+        transitions = self.schedules[zone_key]
+        idx = max(
+            (i for i, (t, _) in enumerate(transitions) if t <= now.time()),
+            default=len(transitions) - 1,
+        )
+        when = datetime.datetime.combine(now.date(), transitions[idx][0])
+        if when > now:
+            when -= datetime.timedelta(days=1)
+        return when, idx
+
+    def _seed(self, now: datetime.datetime) -> None:
+        """fills the heap with the next occurrence of every transition (and the most recent ones for catch up)"""
+        for zone_key, transitions in self.schedules.items():
+            for idx in range(len(transitions)):
+                self._push_next(zone_key, idx, now)
+
+            if self.catch_up is CatchUp.Latest and transitions:
+                when, idx = self._get_most_recent(zone_key, now)
+                # its next occurrence was just pushed
+                self._push(when, zone_key, idx, reschedule=False)
+
+        self._seeded = True
+
+    def _get_zones(self, refresh: bool = False) -> typing.List[Zone]:
+        """gets the zones to resolve schedule keys against. They are only gotten again if refresh is True."""
+        if self._zones is None or refresh:
+            self._zones = self.pyhtcc.get_all_zones(detail=DetailLevel.Names)
+        return self._zones
+
+    def _get_unknown_zone_keys(
+        self, zone_keys: typing.Iterable[str]
+    ) -> typing.Tuple[typing.List[Zone], typing.Dict[str, Zone], typing.List[str]]:
+        """
+        returns (zones, zones by key, the given zone keys that don't match a zone). If any don't match, the zones
+            are gotten again first (in case one was added or renamed).
+        """
+        zones = self._get_zones()
+        zones_by_key = _get_zones_by_key(zones)
+        zone_keys = [k for k in zone_keys if k != ALL_ZONES]
+        if any(k.lower() not in zones_by_key for k in zone_keys):
+            logger.debug("Unknown zone key(s) in schedules. Getting zones again")
+            zones = self._get_zones(refresh=True)
+            zones_by_key = _get_zones_by_key(zones)
+
+        return (
+            zones,
+            zones_by_key,
+            [k for k in zone_keys if k.lower() not in zones_by_key],
+        )
+
+    def check_zones(self) -> None:
+        """raises PlanError if any of the schedules' zone keys doesn't match a zone"""
+        _, _, unknown = self._get_unknown_zone_keys(self.schedules)
+        if unknown:
+            raise PlanError(
+                f"Could not find zones with the names or device ids: {unknown}"
+            )
+
+    def _resolve(
+        self, due: typing.Dict[str, dict]
+    ) -> typing.Tuple[typing.Dict[Zone, dict], typing.Dict[str, Exception]]:
+        """
+        returns (Zone -> merged targets, zone key -> error) for the given zone key -> targets.
+        Each zone key is resolved on its own, so one that doesn't match a zone doesn't stop the others.
+        """
+        try:
+            zones, zones_by_key, unknown = self._get_unknown_zone_keys(due)
+        except Exception as ex:
+            logger.exception("Unable to get zones")
+            return {}, {zone_key: ex for zone_key in due}
+
+        errors = {
+            zone_key: PlanError(
+                f"Could not find a zone with the name or device id: {zone_key}"
+            )
+            for zone_key in unknown
+        }
+        for zone_key, ex in errors.items():
+            logger.error(f"Skipping transition for {zone_key}: {ex}")
+
+        resolved = {}
+        if due.get(ALL_ZONES):
+            for zone in zones:
+                resolved[zone] = dict(due[ALL_ZONES])
+
+        for zone_key, targets in due.items():
+            zone = zones_by_key.get(zone_key.lower())
+            if zone_key == ALL_ZONES or zone is None:
+                continue
+            resolved[zone] = {**resolved.get(zone, {}), **targets}
+
+        return resolved, errors
+
+    def get_next_run_time(self) -> typing.Optional[datetime.datetime]:
+        """returns when the next transition is due (None if there are no transitions or nothing is seeded yet)"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(
+        self, now: typing.Optional[datetime.datetime] = None
+    ) -> typing.Dict[str, typing.Union[dict, Exception]]:
+        """
+        Dispatches every transition that is due as of now (defaults to the current local time).
+        Returns a dict of zone name -> the submitted data, or the exception raised while submitting it.
+            Zone keys that don't match a zone map to a PlanError instead (the other zones are still changed).
+        """
+        now = now or datetime.datetime.now()
+
+        with self._lock:
+            if not self._seeded:
+                self._seed(now)
+
+            # zone key -> merged targets
+            due = {}
+            missed = set()
+            while self._heap and self._heap[0][0] <= now:
+                when, _, zone_key, idx, reschedule = heapq.heappop(self._heap)
+                targets = self.schedules[zone_key][idx][1]
+
+                if (now - when).total_seconds() > self.misfire_grace:
+                    if self.catch_up is CatchUp.Latest:
+                        missed.add(zone_key)
+                    else:
+                        logger.debug(
+                            f"Skipping missed transition at {when} for {zone_key}"
+                        )
+                else:
+                    due[zone_key] = {**due.get(zone_key, {}), **targets}
+
+                if reschedule:
+                    self._push_next(zone_key, idx, now)
+
+            # later occurrences than the ones in the heap may have been missed too
+            for zone_key in missed:
+                _, idx = self._get_most_recent(zone_key, now)
+                targets = self.schedules[zone_key][idx][1]
+                due[zone_key] = {**targets, **due.get(zone_key, {})}
+
+        if not due:
+            return {}
+
+        logger.debug(f"Dispatching transitions for: {sorted(due)}")
+        resolved, results = self._resolve(due)
+        changes = {}
+        for zone, targets in resolved.items():
+            try:
+                changes[zone] = zone.build_control_changes(**get_zone_kwargs(targets))
+            except Exception as ex:
+                logger.exception(f"Unable to build changes for {zone.get_name()}")
+                results[zone.get_name()] = ex
+        results.update(submit_zone_changes(changes, max_workers=self.max_workers))
+        self.results.update(results)
+        return results
+
+    def _run(self) -> None:
+        """the body of the scheduler thread"""
+        while not self._stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("Unable to run pending transitions")
+
+            next_run_time = self.get_next_run_time()
+            wait = 60.0
+            if next_run_time is not None:
+                wait = (next_run_time - datetime.datetime.now()).total_seconds()
+
+            # wake up at least every minute in case the clock jumps
+            self._stop_event.wait(min(max(wait, 0), 60.0))
+
+    def start(self) -> None:
+        """
+        starts running transitions (as they are due) in a daemon thread.
+        Raises PlanError first if any of the schedules' zone keys doesn't match a zone (see check_zones()).
+        """
+        if self._thread is not None:
+            return
+
+        self.check_zones()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pyhtcc-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """stops the scheduler thread (if started)"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -41,5 +41,6 @@ setup(
     # requests 2.27.0 changed the exception raised when .json() fails.
     # See https://github.com/psf/requests/pull/5856
     install_requires=["csmlog", "requests>=2.27", "deprecated"],
+    extras_require={"analytics": ["numpy"], "http2": ["httpx[http2]"]},
     entry_points={"console_scripts": ["pyhtcc = pyhtcc.__main__:main"]},
 )
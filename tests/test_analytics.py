@@ -0,0 +1,108 @@
+"""
+includes all tests for pyhtcc.analytics
+"""
+import pathlib
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from pyhtcc import SystemMode
+from pyhtcc.analytics import RecordedHistory
+
+
+def _make_history(**kwargs):
+    # zone 1 heats for 2 of 3 minutes (one cycle), zone 2 cools for the whole time with the fan on
+    return RecordedHistory(
+        device_ids=[2, 1, 1, 1, 1, 2, 2],
+        timestamps=[0, 0, 60, 120, 180, 60, 120],
+        equipment_output_status=[1, 0, 1, 1, 0, 1, 1],
+        system_switch_position=[
+            SystemMode.Cool,
+            SystemMode.Heat,
+            SystemMode.Heat,
+            SystemMode.Heat,
+            SystemMode.Heat,
+            SystemMode.Cool,
+            SystemMode.Cool,
+        ],
+        fan_is_running=[True, False, True, True, False, True, True],
+        temperature=[76, 68, 68, 69, 70, 75, 74],
+        heat_setpoint=[70, 70, 70, 70, 70, 70, 70],
+        cool_setpoint=[74, 74, 74, 74, 74, 74, 74],
+        **kwargs,
+    )
+
+
+def test_summarize_whole_history():
+    summary = _make_history().summarize()
+
+    assert list(summary.device_ids) == [1, 2]
+    assert list(summary.duration) == [180, 120]
+    assert list(summary.heat_runtime) == [120, 0]
+    assert list(summary.cool_runtime) == [0, 120]
+    assert list(summary.fan_runtime) == [120, 120]
+    assert list(summary.heat_duty_cycle) == [pytest.approx(2 / 3), 0]
+    assert list(summary.cycles) == [1, 0]
+    assert summary.cycles_per_hour[0] == pytest.approx(20)
+
+    # zone 1 is 2, 2, 1 degrees off for 60s each
+    assert summary.tracking_error[0] == pytest.approx(5 / 3)
+    # zone 2 is 2, 1 degrees off for 60s each
+    assert summary.tracking_error[1] == pytest.approx(1.5)
+
+
+def test_summarize_windows():
+    summary = _make_history().summarize(window=120)
+
+    assert list(summary.device_ids) == [1, 1, 2, 2]
+    assert list(summary.window_starts) == [0, 120, 0, 120]
+    assert list(summary.heat_runtime) == [60, 60, 0, 0]
+    assert list(summary.cool_runtime) == [0, 0, 120, 0]
+
+
+def test_summarize_start_end():
+    summary = _make_history().summarize(start=60, end=120)
+
+    assert list(summary.device_ids) == [1, 2]
+    assert list(summary.heat_runtime) == [60, 0]
+    assert list(summary.cool_runtime) == [0, 60]
+
+
+def test_max_sample_gap():
+    summary = _make_history(max_sample_gap=30).summarize()
+    assert list(summary.heat_runtime) == [60, 0]
+
+
+def test_from_zone_infos():
+    def _zone_info(device_id, eos):
+        return {
+            "DeviceID": device_id,
+            "latestData": {
+                "uiData": {
+                    "EquipmentOutputStatus": eos,
+                    "SystemSwitchPosition": SystemMode.Heat,
+                    "DispTemperature": 68,
+                    "HeatSetpoint": 70,
+                    "CoolSetpoint": 75,
+                },
+                "fanData": {"fanIsRunning": bool(eos)},
+            },
+        }
+
+    history = RecordedHistory.from_zone_infos(
+        [(0, _zone_info(5, 1)), (300, _zone_info(5, 0)), (600, _zone_info(5, 1))]
+    )
+    assert len(history) == 3
+
+    summary = history.summarize()
+    assert list(summary.heat_runtime) == [300]
+    assert list(summary.fan_runtime) == [300]
+    assert list(summary.cycles) == [1]
+
+
+def test_mismatched_lengths_raise():
+    with pytest.raises(ValueError):
+        RecordedHistory([1, 2], [0], [0, 0], [1, 1], [False, False])
@@ -0,0 +1,178 @@
+"""
+includes all tests for pyhtcc.cassette
+"""
+import datetime
+import json
+import pathlib
+import sys
+import unittest.mock
+
+import pytest
+import requests
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from pyhtcc import PyHTCC
+from pyhtcc.cassette import Cassette, CassetteError
+
+USERNAME = "someone@example.com"
+PASSWORD = "hunter2!"
+
+ZONE_LIST = [
+    {
+        "DeviceID": 123456,
+        "DispTempAvailable": True,
+        "DispUnits": "F",
+        "DispTemp": 73,
+        "IndoorHumi": 38,
+        "EquipmentOutputStatus": 0,
+    }
+]
+CHECK_DATA_SESSION = {
+    "success": True,
+    "latestData": {
+        "uiData": {"HeatSetpoint": 70, "CoolSetpoint": 75, "DisplayUnits": "F"},
+        "fanData": {"fanMode": 0, "fanIsRunning": False},
+    },
+}
+CONTROL_PAGE = (
+    '<h1 id="ZoneName">Upstairs Control</h1>\n'
+    "Control.Model.Property.outdoorTemp, 55);\n"
+    "Control.Model.Property.outdoorHumidity, 40);\n"
+)
+
+
+def _response(url, body, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.encoding = "utf-8"
+    response._content = (body if isinstance(body, str) else json.dumps(body)).encode()
+    response.elapsed = datetime.timedelta(seconds=0.25)
+    return response
+
+
+def _fake_portal(session, method, url, *args, **kwargs):
+    """a fake mytotalconnectcomfort.com"""
+    if url.endswith("/portal"):
+        username, password = (
+            v.decode() if isinstance(v, bytes) else v for v in session.auth
+        )
+        assert kwargs["data"] == {"UserName": username, "Password": password}
+        return _response(
+            "https://mytotalconnectcomfort.com/portal/12345/Zones",
+            f"<span>Welcome {username}.</span>",
+        )
+    if "GetLocationListData" in url:
+        return _response(url, [{"LocationID": 12345}])
+    if "GetZoneListData" in url:
+        return _response(url, ZONE_LIST if url.endswith("page=1") else [])
+    if "CheckDataSession" in url:
+        return _response(url, CHECK_DATA_SESSION)
+    if "Device/Control" in url:
+        return _response(url, CONTROL_PAGE)
+    if "SubmitControlScreenChanges" in url:
+        return _response(url, {"success": 1})
+
+    raise AssertionError(f"Unexpected request: {method} {url}")
+
+
+def _record(path, username, password):
+    cassette = Cassette(str(path))
+    with unittest.mock.patch.object(
+        requests.Session, "request", autospec=True, side_effect=_fake_portal
+    ):
+        pyhtcc = PyHTCC(username, password, session_factory=cassette.record_session)
+        zones = pyhtcc.get_all_zones()
+        zones[0].set_permanent_heat_setpoint(68)
+
+    cassette.save()
+    return path
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return _record(tmp_path / "tcc.json", USERNAME, PASSWORD)
+
+
+def test_recording_scrubs_credentials(cassette_path):
+    text = cassette_path.read_text()
+    assert USERNAME not in text
+    assert PASSWORD not in text
+    assert "<USERNAME>" in text
+    assert "<PASSWORD>" in text
+
+    interactions = json.loads(text)["interactions"]
+    assert len(interactions) == 8
+    assert all(i["elapsed"] == 0.25 for i in interactions)
+
+
+def test_recording_only_scrubs_whole_credentials(tmp_path):
+    # short credentials that are also parts of ids and paths
+    path = _record(tmp_path / "tcc.json", "stairs", "1234")
+    interactions = json.loads(path.read_text())["interactions"]
+
+    login = json.loads(interactions[0]["key"])
+    assert login[2] == {"UserName": "<USERNAME>", "Password": "<PASSWORD>"}
+    assert interactions[0]["url"] == (
+        "https://mytotalconnectcomfort.com/portal/12345/Zones"
+    )
+    assert interactions[0]["body"] == "<span>Welcome <USERNAME>.</span>"
+
+    # ids, location paths and the zone name page weren't changed
+    text = path.read_text()
+    assert "123456" in text
+    assert "Upstairs Control" in text
+    assert "<PASSWORD>" not in "".join(i["body"] for i in interactions)
+
+    cassette = Cassette.load(str(path))
+    with unittest.mock.patch.object(
+        requests.Session, "request", autospec=True
+    ) as mock_request:
+        pyhtcc = PyHTCC(
+            "user",
+            "pass",
+            session_factory=lambda: cassette.replay_session(time_scale=0),
+        )
+        zone = pyhtcc.get_all_zones()[0]
+        zone.set_permanent_heat_setpoint(68)
+
+    mock_request.assert_not_called()
+    assert pyhtcc._locationId == 12345
+    assert zone.device_id == 123456
+
+
+def test_replay(cassette_path):
+    cassette = Cassette.load(str(cassette_path))
+
+    with unittest.mock.patch.object(
+        requests.Session, "request", autospec=True
+    ) as mock_request:
+        pyhtcc = PyHTCC(
+            "user",
+            "pass",
+            session_factory=lambda: cassette.replay_session(time_scale=0),
+        )
+        zones = pyhtcc.get_all_zones()
+        zones[0].set_permanent_heat_setpoint(68)
+
+        # responses are replayed again once they run out
+        assert zones[0].get_heat_setpoint_raw() == 70
+
+    mock_request.assert_not_called()
+    assert pyhtcc._locationId == 12345
+    assert zones[0].get_name() == "Upstairs"
+    assert zones[0].zone_info["OutdoorTemperature"] == 55
+
+    with pytest.raises(CassetteError):
+        pyhtcc.submit_raw_control_changes(123456, {"CoolSetpoint": 80})
+
+
+def test_replay_timing(cassette_path):
+    session = Cassette.load(str(cassette_path)).replay_session(time_scale=2)
+    with unittest.mock.patch("time.sleep") as mock_sleep:
+        response = session.get(
+            "https://mytotalconnectcomfort.com/portal/Device/CheckDataSession/123456"
+        )
+
+    assert response.json() == CHECK_DATA_SESSION
+    mock_sleep.assert_called_once_with(0.5)
@@ -0,0 +1,283 @@
+"""
+includes all tests for PyHTCCFleet
+"""
+import pathlib
+import sys
+import threading
+import unittest.mock
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+import pyhtcc.fleet
+from pyhtcc import RequestBudget, UnauthorizedError, UnexpectedError
+from pyhtcc.fleet import PyHTCCFleet, ShardedFleetPoller, ZoneRecord, ZoneSnapshot
+
+
+class FakeClient:
+    """stands in for PyHTCC"""
+
+    def __init__(self, username, password, request_budget=None):
+        if password == "bad":
+            raise ValueError("bad password")
+
+        self.username = username
+        self.request_budget = request_budget
+        self.logged_out = False
+        self.fail = False
+        self.expired = False
+        self.logins = 1
+
+    def authenticate(self):
+        self.logins += 1
+        self.expired = False
+
+    def get_zones_info(self):
+        if self.fail:
+            raise UnexpectedError("nope")
+        if self.expired:
+            raise UnauthorizedError("session expired")
+
+        return [
+            {"DeviceID": hash(self.username) % 1000, "Name": f"{self.username}-1"},
+            {"DeviceID": hash(self.username) % 1000 + 1, "Name": f"{self.username}-2"},
+        ]
+
+    def logout(self):
+        self.logged_out = True
+
+
+@pytest.fixture
+def fleet():
+    with unittest.mock.patch("pyhtcc.fleet.time.sleep"):
+        fleet = PyHTCCFleet(
+            [("a", "pw"), ("b", "pw"), ("c", "bad")],
+            max_concurrency=2,
+            requests_per_minute=10,
+            client_factory=FakeClient,
+        )
+        yield fleet
+        fleet.close()
+
+
+def test_login_staggers_and_records_errors(fleet):
+    with unittest.mock.patch("pyhtcc.fleet.time.sleep") as mock_sleep:
+        fleet.login()
+
+    # one sleep between each login start
+    assert mock_sleep.call_count == 2
+    assert sorted(fleet.clients) == ["a", "b"]
+    assert isinstance(fleet.errors["c"], ValueError)
+
+    # each account has its own budget
+    assert fleet.clients["a"].request_budget is not fleet.clients["b"].request_budget
+    assert fleet.clients["a"].request_budget.rate == 10
+
+
+def test_poll_yields_snapshots_for_every_account(fleet):
+    snapshots = list(fleet.poll())
+    assert all(isinstance(s, ZoneSnapshot) for s in snapshots)
+    assert sorted(s.name for s in snapshots) == ["a-1", "a-2", "b-1", "b-2"]
+
+    # a failing account doesn't stop the others
+    fleet.clients["a"].fail = True
+    snapshots = list(fleet.poll())
+    assert sorted(s.name for s in snapshots) == ["b-1", "b-2"]
+    assert isinstance(fleet.errors["a"], UnexpectedError)
+
+    fleet.clients["a"].fail = False
+    list(fleet.poll())
+    assert "a" not in fleet.errors
+
+
+def test_poll_logs_in_again_when_the_session_expires(fleet):
+    list(fleet.poll())
+    client = fleet.clients["a"]
+    client.expired = True
+
+    snapshots = list(fleet.poll())
+    assert sorted(s.name for s in snapshots) == ["a-1", "a-2", "b-1", "b-2"]
+    assert client.logins == 2
+    assert "a" not in fleet.errors
+
+
+def test_poll_forever_stops(fleet):
+    stop_event = threading.Event()
+    for count, _ in enumerate(fleet.poll_forever(0, stop_event), start=1):
+        if count == 8:
+            stop_event.set()
+
+    assert count == 8
+
+
+def test_close_logs_out(fleet):
+    fleet.login()
+    clients = list(fleet.clients.values())
+    fleet.close()
+    assert all(c.logged_out for c in clients)
+
+
+def test_request_budget():
+    with unittest.mock.patch("pyhtcc.pyhtcc.time.monotonic", return_value=0):
+        budget = RequestBudget(rate=2, period=1)
+        assert budget.try_acquire()
+        assert budget.try_acquire()
+        assert not budget.try_acquire()
+
+    # half a second later we've earned one more
+    with unittest.mock.patch("pyhtcc.pyhtcc.time.monotonic", return_value=0.5):
+        assert budget.try_acquire()
+        assert not budget.try_acquire()
+
+    with unittest.mock.patch(
+        "pyhtcc.pyhtcc.time.monotonic", side_effect=[0.5, 1.0]
+    ), unittest.mock.patch("pyhtcc.pyhtcc.time.sleep") as mock_sleep:
+        budget.acquire()
+        mock_sleep.assert_called_once_with(0.5)
+
+
+class FakeStateClient:
+    """stands in for PyHTCC in worker processes"""
+
+    created = 0
+    logins = 0
+    # sessions the portal no longer accepts
+    expired_cookies = []
+
+    def __init__(self, state):
+        FakeStateClient.created += 1
+        self.username = state["username"]
+        self.password = state["password"]
+        self.cookies = state.get("cookies")
+        self.expired = state.get("expired", False)
+
+    @classmethod
+    def from_state(cls, state):
+        if state["password"] == "bad":
+            raise ValueError("bad password")
+        return cls(state)
+
+    def authenticate(self):
+        FakeStateClient.logins += 1
+        self.expired = False
+        self.cookies = {"session": "new"}
+
+    def get_zones_info(self):
+        if self.expired or self.cookies in self.expired_cookies:
+            raise UnauthorizedError("expired")
+
+        return [
+            {
+                "DeviceID": 1,
+                "Name": f"{self.username}-1",
+                "DispTemp": 70,
+                "latestData": {"uiData": {"HeatSetpoint": 68}, "fanData": {}},
+            }
+        ]
+
+    def get_state(self):
+        return {
+            "username": self.username,
+            "password": self.password,
+            "cookies": self.cookies,
+        }
+
+
+class FakeMultiprocessingContext:
+    """runs the 'pool' in process"""
+
+    def Pool(self, processes):
+        pool = unittest.mock.Mock()
+        pool.imap_unordered = map
+        return pool
+
+
+@pytest.fixture
+def fake_state_client():
+    FakeStateClient.created = 0
+    FakeStateClient.logins = 0
+    FakeStateClient.expired_cookies = []
+    pyhtcc.fleet._worker_clients.clear()
+    with unittest.mock.patch("pyhtcc.fleet.PyHTCC", FakeStateClient):
+        yield
+    pyhtcc.fleet._worker_clients.clear()
+
+
+def test_poll_shard(fake_state_client):
+    records, states, errors = pyhtcc.fleet._poll_shard(
+        [
+            {"username": "a", "password": "pw", "cookies": {"session": "old"}},
+            {"username": "b", "password": "pw", "expired": True},
+            {"username": "c", "password": "bad"},
+        ]
+    )
+
+    assert [(r.username, r.name, r.disp_temp, r.heat_setpoint) for r in records] == [
+        ("a", "a-1", 70, 68),
+        ("b", "b-1", 70, 68),
+    ]
+    assert all(isinstance(r, ZoneRecord) for r in records)
+
+    # b logged in again, c failed and kept its old state
+    assert [s.get("cookies") for s in states] == [
+        {"session": "old"},
+        {"session": "new"},
+        None,
+    ]
+    assert list(errors) == ["c"]
+
+    # clients are reused by the worker
+    pyhtcc.fleet._poll_shard([{"username": "a", "password": "pw"}])
+    assert FakeStateClient.created == 2
+
+
+def test_poll_shard_uses_sessions_from_other_workers(fake_state_client):
+    workers = [{}, {}]
+
+    def _poll_in_worker(worker, state):
+        with unittest.mock.patch.object(
+            pyhtcc.fleet, "_worker_clients", workers[worker]
+        ):
+            records, states, errors = pyhtcc.fleet._poll_shard([state])
+        assert not errors
+        return states[0]
+
+    state = _poll_in_worker(
+        0, {"username": "a", "password": "pw", "cookies": {"session": "old"}}
+    )
+
+    # the session expires and the next poll (in the other worker) logs in again
+    FakeStateClient.expired_cookies = [{"session": "old"}]
+    state = _poll_in_worker(1, state)
+    assert state["cookies"] == {"session": "new"}
+    assert FakeStateClient.logins == 1
+
+    # the first worker picks up that session instead of logging in again itself
+    state = _poll_in_worker(0, state)
+    assert state["cookies"] == {"session": "new"}
+    assert FakeStateClient.logins == 1
+
+    # while the session is unchanged, the worker's client is reused
+    created = FakeStateClient.created
+    _poll_in_worker(0, state)
+    assert FakeStateClient.created == created
+
+
+def test_sharded_fleet_poller(fake_state_client):
+    poller = ShardedFleetPoller(
+        [("a", "pw"), ("b", "pw"), ("c", "bad")],
+        processes=2,
+        shard_size=2,
+        mp_context=FakeMultiprocessingContext(),
+    )
+    assert [len(shard) for shard in poller._get_shards()] == [2, 1]
+
+    with poller:
+        records = list(poller.poll())
+
+    assert sorted(r.name for r in records) == ["a-1", "b-1"]
+    assert list(poller.errors) == ["c"]
+
+    # states coming back from the workers are kept for the next poll
+    assert poller.states["a"]["cookies"] is None
+    assert poller.states["a"]["username"] == "a"
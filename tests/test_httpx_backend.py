@@ -0,0 +1,85 @@
+"""
+includes all tests for pyhtcc.httpx_backend
+"""
+import pathlib
+import sys
+
+import pytest
+import requests
+
+httpx = pytest.importorskip("httpx")
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from pyhtcc import PyHTCC
+from pyhtcc.httpx_backend import HttpxSession
+
+CHECK_DATA_SESSION = {
+    "success": True,
+    "latestData": {"uiData": {"HeatSetpoint": 70, "DisplayUnits": "F"}},
+}
+
+
+def _handler(request):
+    """a fake mytotalconnectcomfort.com"""
+    path = request.url.path
+    if path == "/portal" and request.method == "POST":
+        assert request.headers["Authorization"].startswith("Basic ")
+        assert b"UserName=user" in request.content
+        return httpx.Response(
+            302,
+            headers={
+                "Location": "/portal/12345/Zones",
+                "Set-Cookie": "session=abc; Path=/",
+            },
+        )
+    if path == "/portal/12345/Zones":
+        return httpx.Response(200, text="<span>Welcome</span>")
+    if path.startswith("/portal/Device/CheckDataSession/"):
+        assert request.headers["X-Requested-With"] == "XMLHttpRequest"
+        assert request.headers["Cookie"] == "session=abc"
+        return httpx.Response(200, json=CHECK_DATA_SESSION)
+    if path.startswith("/portal/Device/Control/"):
+        return httpx.Response(
+            200,
+            text='<h1 id="ZoneName">Upstairs Control</h1>\n'
+            + "x" * 10000
+            + "\nControl.Model.Property.outdoorTemp, 55);\n",
+        )
+    if path == "/fail":
+        raise httpx.ConnectError("nope", request=request)
+
+    return httpx.Response(404, text="not found")
+
+
+@pytest.fixture
+def pyhtcc():
+    return PyHTCC(
+        "user",
+        "pass",
+        session_factory=lambda: HttpxSession(transport=httpx.MockTransport(_handler)),
+    )
+
+
+def test_login_follows_redirects_and_keeps_cookies(pyhtcc):
+    assert isinstance(pyhtcc.session, HttpxSession)
+    assert pyhtcc._locationId == 12345
+    assert pyhtcc.session.cookies.get_dict() == {"session": "abc"}
+    assert pyhtcc._get_check_data_session(123456) == CHECK_DATA_SESSION
+
+
+def test_streamed_responses(pyhtcc):
+    assert pyhtcc._get_name_for_device_id(123456) == "Upstairs"
+    assert pyhtcc._get_outdoor_weather_info_for_zone(123456)["OutdoorTemperature"] == 55
+
+
+def test_errors_are_requests_exceptions(pyhtcc):
+    response = pyhtcc.session.get("https://mytotalconnectcomfort.com/missing")
+    assert response.status_code == 404
+    with pytest.raises(requests.exceptions.HTTPError):
+        response.raise_for_status()
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pyhtcc.session.get("https://mytotalconnectcomfort.com/fail")
+
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        response.json()
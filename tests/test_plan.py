@@ -0,0 +1,144 @@
+"""
+includes all tests for pyhtcc.plan
+"""
+import datetime
+import json
+import pathlib
+import sys
+import unittest.mock
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from pyhtcc import DetailLevel, FanMode, SystemMode, Zone
+from pyhtcc.plan import PlanError, apply_plan, get_zone_kwargs, load_plan
+
+
+@pytest.fixture
+def pyhtcc():
+    pyhtcc = unittest.mock.Mock()
+    pyhtcc.get_all_zones.return_value = [
+        Zone({"DeviceID": 1, "Name": "Upstairs"}, pyhtcc),
+        Zone({"DeviceID": 2, "Name": "Downstairs"}, pyhtcc),
+        Zone({"DeviceID": 3, "Name": "Basement"}, pyhtcc),
+    ]
+    return pyhtcc
+
+
+def test_load_plan_json(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({"zones": {"Upstairs": {"heat": 68}}}))
+    assert load_plan(str(path)) == {"zones": {"Upstairs": {"heat": 68}}}
+
+
+def test_load_plan_toml(tmp_path):
+    pytest.importorskip("tomllib")
+    path = tmp_path / "plan.toml"
+    path.write_text('[zones."*"]\nfan = "auto"\n\n[zones.Upstairs]\nheat = 68\n')
+    assert load_plan(str(path)) == {
+        "zones": {"*": {"fan": "auto"}, "Upstairs": {"heat": 68}}
+    }
+
+
+def test_load_plan_validates(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({"zones": {"Upstairs": {"hot": 68}}}))
+    with pytest.raises(PlanError):
+        load_plan(str(path))
+
+    path.write_text(json.dumps({"Upstairs": {"heat": 68}}))
+    with pytest.raises(PlanError):
+        load_plan(str(path))
+
+
+def test_get_zone_kwargs():
+    assert get_zone_kwargs(
+        {
+            "heat": 68,
+            "cool": 76,
+            "hold_until": "18:30",
+            "fan": "Circulate",
+            "mode": "auto",
+        }
+    ) == {
+        "heat": 68,
+        "cool": 76,
+        "end": datetime.time(18, 30),
+        "fan_mode": FanMode.Circulate,
+        "system_mode": SystemMode.AutoHeat,
+    }
+
+    with pytest.raises(PlanError):
+        get_zone_kwargs({"heat": 68, "hold_until": "6pm"})
+
+    with pytest.raises(PlanError):
+        get_zone_kwargs({"fan": "sideways"})
+
+
+@pytest.mark.parametrize(
+    "targets",
+    [
+        {"heat": "warm"},
+        {"cool": True},
+        {"mode": True},
+        {"fan": False},
+        {"mode": 42},
+        # nothing to hold
+        {"hold_until": "10:00"},
+        {"hold_until": "10:00", "fan": "on"},
+    ],
+)
+def test_get_zone_kwargs_rejects_bad_targets(targets):
+    with pytest.raises(PlanError):
+        get_zone_kwargs(targets)
+
+
+def test_apply_plan(pyhtcc):
+    plan = {
+        "zones": {
+            "*": {"fan": "auto"},
+            "upstairs": {"heat": 68},
+            "2": {"cool": 74, "fan": "on"},
+        }
+    }
+    results = apply_plan(pyhtcc, plan, max_workers=2)
+
+    assert results == {
+        "Upstairs": {
+            "FanMode": 0,
+            "HeatSetpoint": 68,
+            "StatusHeat": 2,
+            "StatusCool": 2,
+            "SystemSwitch": 1,
+        },
+        "Downstairs": {
+            "FanMode": 1,
+            "CoolSetpoint": 74,
+            "StatusHeat": 2,
+            "StatusCool": 2,
+            "SystemSwitch": 3,
+        },
+        "Basement": {"FanMode": 0},
+    }
+
+    # zones are only listed by name, then one request per zone
+    pyhtcc.get_all_zones.assert_called_once_with(detail=DetailLevel.Names)
+    assert pyhtcc.submit_raw_control_changes.call_count == 3
+    pyhtcc.submit_raw_control_changes.assert_any_call(1, results["Upstairs"])
+
+
+def test_apply_plan_reports_failures(pyhtcc):
+    pyhtcc.submit_raw_control_changes.side_effect = ValueError("nope")
+    results = apply_plan(pyhtcc, {"zones": {"Basement": {"heat": 60}}})
+    assert isinstance(results["Basement"], ValueError)
+
+
+def test_apply_plan_dry_run(pyhtcc):
+    results = apply_plan(pyhtcc, {"zones": {"Basement": {"heat": 60}}}, dry_run=True)
+    assert results["Basement"]["HeatSetpoint"] == 60
+    pyhtcc.submit_raw_control_changes.assert_not_called()
+
+
+def test_apply_plan_unknown_zone(pyhtcc):
+    with pytest.raises(PlanError):
+        apply_plan(pyhtcc, {"zones": {"Attic": {"heat": 60}}})
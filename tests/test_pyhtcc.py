@@ -2,27 +2,43 @@
 includes all tests for PyHTCC
 """
 import datetime
+import gc
+import io
 import json
+import os
 import pathlib
+import subprocess
 import sys
+import threading
+import time
 import unittest.mock
+import weakref
 
 import pytest
 import requests
 
 sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+import pyhtcc
 from pyhtcc import (
+    DETAIL_LEVEL_FIELDS,
     AuthenticationError,
+    DataSource,
+    DetailLevel,
+    DeviceLimits,
     FanMode,
+    InvalidControlChangeError,
     LoginCredentialsInvalidError,
     LoginUnexpectedError,
     LogoutFailureError,
+    MetadataCache,
     NoSessionError,
     NoZonesFoundError,
     PyHTCC,
     RedirectDidNotHappenError,
+    RingBuffer,
     SystemMode,
     TooManyAttemptsError,
+    TTLCache,
     UnauthorizedError,
     UnexpectedError,
     Zone,
@@ -54,6 +70,107 @@ class FakeResult:
         return self._json_data
 
 
+# modules that should only be imported once they are actually needed
+LAZY_DEPENDENCIES = ("requests", "csmlog", "deprecated")
+
+# slow to import standard library modules that 'import pyhtcc' shouldn't pull in
+LAZY_STDLIB_MODULES = ("logging", "concurrent.futures", "multiprocessing")
+
+
+def _get_import_times(*args) -> dict:
+    """runs python -X importtime with the given args. Returns a dict of module name -> cumulative microseconds"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(pathlib.Path(__file__).parent.parent)
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        env=env,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    import_times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                import_times[module.strip()] = int(cumulative)
+
+    return import_times
+
+
+def test_import_is_fast():
+    import_times = _get_import_times("-c", "import pyhtcc")
+
+    for module in LAZY_DEPENDENCIES + LAZY_STDLIB_MODULES:
+        assert module not in import_times
+
+    # generous budget to avoid flakiness. Eagerly importing requests and csmlog alone takes longer than this.
+    assert import_times["pyhtcc"] < 100_000
+
+
+def test_cli_help_does_not_import_dependencies():
+    import_times = _get_import_times("-m", "pyhtcc", "--help")
+    assert "pyhtcc.pyhtcc" in import_times
+
+    for module in LAZY_DEPENDENCIES:
+        assert module not in import_times
+
+
+def test_ring_buffer():
+    buf = RingBuffer(3)
+    assert len(buf) == 0
+    with pytest.raises(ValueError):
+        buf.latest()
+
+    for t, v in enumerate([1, 2, 3, 4, 5]):
+        buf.append(v, timestamp=t * 10)
+
+    # only the newest 3 are kept
+    assert len(buf) == 3
+    assert buf.values() == [3, 4, 5]
+    assert buf.latest() == 5
+    assert buf.min() == 3
+    assert buf.max() == 5
+    assert buf.mean() == 4
+    assert buf.slope() == pytest.approx(0.1)
+
+    # only readings within 10 seconds of the newest
+    assert buf.min(last=10) == 4
+    assert buf.mean(last=10) == 4.5
+
+    buf.append(5, timestamp=50)
+    assert buf.values() == [4, 5, 5]
+    assert buf.mean() == pytest.approx(14 / 3)
+
+    buf.clear()
+    assert len(buf) == 0
+
+
+def test_ttl_cache():
+    cache = TTLCache(maxsize=2, ttl=10)
+    with unittest.mock.patch("pyhtcc.pyhtcc.time.monotonic", return_value=100):
+        cache.set(1, "a")
+        cache.set(2, "b")
+        # touch 1 so 2 is the least recently used
+        assert cache.get(1) == "a"
+        cache.set(3, "c")
+
+        assert 2 not in cache
+        assert len(cache) == 2
+
+    with unittest.mock.patch("pyhtcc.pyhtcc.time.monotonic", return_value=110):
+        assert cache.get(1) is None
+        assert cache.get(3, "expired") == "expired"
+
+    cache.set(4, "d")
+    cache.invalidate(4)
+    assert 4 not in cache
+
+    cache.set(5, "e")
+    cache.invalidate()
+    assert len(cache) == 0
+
+
 class TestPyHTCC:
     @pytest.fixture(scope="function", autouse=True)
     def setup(self):
@@ -70,7 +187,7 @@ class TestPyHTCC:
             self.pyhtcc = PyHTCC("user", "pass")
             assert self.pyhtcc._locationId == 12345
 
-            def _handle_post_zone_list_data(page_num: int):
+            def _handle_post_zone_list_data(page_num: int, location_id: int = None):
                 if page_num == 1:
                     return SAMPLE_POST_ZONE_DATA
                 else:
@@ -81,6 +198,7 @@ class TestPyHTCC:
                 return SAMPLE_GET_DATA_SESSION
 
             # patch methods with mock data
+            self.pyhtcc._post_location_list_data = lambda: [{"LocationID": 12345}]
             self.pyhtcc._post_zone_list_data = _handle_post_zone_list_data
             self.pyhtcc._get_check_data_session = _handle_get_check_data_session
             yield
@@ -90,7 +208,20 @@ class TestPyHTCC:
         self.mock_session.post.return_value = self.next_requests_result
         self.mock_session.request.return_value = self.next_requests_result
 
-    def mock_get_result(self, result):
+    def mock_get_result(self, result, chunk_size=None):
+        if isinstance(getattr(result, "text", None), str):
+            # streamed responses are read via iter_content()
+            text = result.text
+
+            def iter_content(size=1, decode_unicode=False):
+                size = chunk_size or size
+                for i in range(0, len(text), size):
+                    iter_content.chunks_read += 1
+                    yield text[i : i + size]
+
+            iter_content.chunks_read = 0
+            result.iter_content = iter_content
+
         self.next_requests_result = result
         self.mock_session.get.return_value = self.next_requests_result
         self.mock_session.request.return_value = self.next_requests_result
@@ -140,6 +271,346 @@ class TestPyHTCC:
             assert mock_request_json.call_args[1]["data"]["CoolNextPeriod"] == 23
             assert mock_request_json.call_args[1]["data"]["SystemSwitch"] == 5
 
+    def test_optimistic_updates(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ):
+            # off by default
+            zone.set_permanent_heat_setpoint(65)
+            assert zone.zone_info["latestData"]["uiData"]["HeatSetpoint"] == 70
+            assert zone.pending_changes == {}
+
+            self.pyhtcc.optimistic_updates = True
+            zone.set_permanent_heat_setpoint(65)
+
+        with unittest.mock.patch.object(zone, "refresh_zone_info"):
+            assert zone.get_heat_setpoint_raw() == 65
+            assert zone.get_system_mode() == SystemMode.Heat
+        assert zone.pending_changes == {
+            "latestData.uiData.HeatSetpoint": 65,
+            "latestData.uiData.StatusHeat": 2,
+            "latestData.uiData.StatusCool": 2,
+            "latestData.uiData.SystemSwitchPosition": SystemMode.Heat,
+        }
+        # the shared sample data wasn't changed
+        assert SAMPLE_GET_DATA_SESSION["latestData"]["uiData"]["HeatSetpoint"] == 70
+
+        # the device hasn't caught up yet: keep the pending values
+        assert zone.get_heat_setpoint_raw() == 65
+        # StatusHeat/StatusCool match what the device has, so are confirmed
+        assert "latestData.uiData.StatusHeat" not in zone.pending_changes
+
+        # the device reports the change: confirmed
+        session = json.loads(json.dumps(SAMPLE_GET_DATA_SESSION))
+        session["latestData"]["uiData"]["HeatSetpoint"] = 65
+        session["latestData"]["uiData"]["SystemSwitchPosition"] = SystemMode.Heat
+        self.pyhtcc._get_check_data_session = lambda device_id: session
+        assert zone.get_heat_setpoint_raw() == 65
+        assert zone.pending_changes == {}
+
+        # a change that is never confirmed is corrected by a refresh after the timeout
+        self.pyhtcc.pending_timeout = 0
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ):
+            zone.set_permanent_cool_setpoint(80)
+        assert zone.zone_info["latestData"]["uiData"]["CoolSetpoint"] == 80
+        assert zone.get_cool_setpoint_raw() == 75
+        assert zone.pending_changes == {}
+
+    def test_optimistic_updates_are_only_confirmed_by_session_data(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+        self.pyhtcc.optimistic_updates = True
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ):
+            zone.set_permanent_heat_setpoint(65)
+
+        # a refresh without CheckDataSession can't confirm the pending write
+        assert zone.get_current_temperature_raw() == 73
+        assert zone.pending_changes["latestData.uiData.HeatSetpoint"] == 65
+
+        # so the device's old value doesn't replace it
+        assert zone.get_heat_setpoint_raw() == 65
+        assert zone.pending_changes["latestData.uiData.HeatSetpoint"] == 65
+
+    def test_optimistic_updates_are_corrected_by_a_refresh(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+        self.pyhtcc.optimistic_updates = True
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ):
+            zone.submit_control_changes(
+                {"HeatSetpoint": 65, "SystemSwitch": SystemMode.Heat}
+            )
+        assert zone.pending_changes["latestData.uiData.HeatSetpoint"] == 65
+
+        # the portal changed what was sent (and so did someone at the thermostat)
+        session = json.loads(json.dumps(SAMPLE_GET_DATA_SESSION))
+        session["latestData"]["uiData"]["HeatSetpoint"] = 66
+        session["latestData"]["uiData"]["SystemSwitchPosition"] = SystemMode.Off
+        self.pyhtcc._get_check_data_session = lambda device_id: session
+
+        # the first refresh wins right away, even within the grace period
+        assert zone.get_heat_setpoint_raw() == 66
+        assert zone.get_system_mode() == SystemMode.Off
+        assert zone.pending_changes == {}
+
+    def test_wait_until(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+
+        sessions = [json.loads(json.dumps(SAMPLE_GET_DATA_SESSION)) for _ in range(3)]
+        sessions[2]["latestData"]["uiData"]["HeatSetpoint"] = 65
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(side_effect=sessions)
+        self.pyhtcc._post_zone_list_data = unittest.mock.Mock()
+
+        with unittest.mock.patch("time.sleep") as mock_sleep:
+            assert zone.wait_until(
+                lambda z: z.get_heat_setpoint_raw() == 65, initial_interval=1
+            )
+
+        # only this device's CheckDataSession was polled, with backoff between polls
+        assert (
+            self.pyhtcc._get_check_data_session.call_args_list
+            == [unittest.mock.call(123456)] * 3
+        )
+        self.pyhtcc._post_zone_list_data.assert_not_called()
+        assert [c[0][0] for c in mock_sleep.call_args_list] == [1, 1.5]
+
+        self.pyhtcc._get_check_data_session = lambda device_id: sessions[2]
+        assert zone.wait_for_control_changes({"HeatSetpoint": 65, "CoolSetpoint": None})
+        assert not zone.wait_for_control_changes(
+            {"HeatSetpoint": 66}, timeout=0.02, initial_interval=0.01
+        )
+
+        # a pending optimistic value doesn't count as applied
+        zone._apply_pending_changes({"HeatSetpoint": 66}, 60)
+        assert not zone.wait_for_control_changes({"HeatSetpoint": 66}, timeout=0)
+
+    def test_stale_while_revalidate(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+        self.pyhtcc.stale_while_revalidate = 10
+        self.pyhtcc.max_staleness = 60
+
+        def _age(seconds):
+            zone._refreshed_at = {
+                k: time.monotonic() - seconds for k in zone._refreshed_at
+            }
+
+        session = json.loads(json.dumps(SAMPLE_GET_DATA_SESSION))
+        session["latestData"]["uiData"]["HeatSetpoint"] = 65
+        release = threading.Event()
+
+        def _slow_check_data_session(device_id):
+            release.wait(5)
+            return session
+
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            side_effect=_slow_check_data_session
+        )
+
+        # fresh enough: no refresh
+        assert zone.get_age(DataSource.Session) < 10
+        assert zone.get_heat_setpoint_raw() == 70
+        self.pyhtcc._get_check_data_session.assert_not_called()
+
+        # stale: the old value is read right away while a single refresh runs in the background
+        _age(30)
+        assert zone.get_heat_setpoint_raw() == 70
+        assert zone.read("get_heat_setpoint_raw", "get_cool_setpoint_raw") == (70, 75)
+        release.set()
+        zone._revalidating.result()
+        self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+        assert zone.get_age(DataSource.Session) < 10
+        assert zone.get_heat_setpoint_raw() == 65
+        assert zone.last_refresh_error is None
+
+        # failed refreshes degrade to the stale value
+        self.pyhtcc._get_check_data_session.side_effect = UnexpectedError("down")
+        _age(30)
+        assert zone.get_heat_setpoint_raw() == 65
+        zone._revalidating.result()
+        assert isinstance(zone.last_refresh_error, UnexpectedError)
+        assert zone.get_age(DataSource.Session) >= 30
+
+        # ... but only up to max_staleness
+        _age(100)
+        with pytest.raises(UnexpectedError):
+            zone.get_heat_setpoint_raw()
+
+    def test_background_refresh(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        def _wait_for(predicate):
+            deadline = time.monotonic() + 5
+            while not predicate() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert predicate()
+
+        self.pyhtcc.start_background_refresh(
+            interval=0.01, backoff=2, max_interval=0.04
+        )
+        try:
+            assert self.pyhtcc.background_refreshing
+            _wait_for(lambda: self.pyhtcc.get_background_refresh_stats().refreshes)
+            stats = self.pyhtcc.get_background_refresh_stats()
+            assert stats.zones == 2
+            assert stats.last_error is None
+
+            # getters read the warm state
+            zone = Zone(123456, self.pyhtcc)
+            assert zone.loaded
+            with unittest.mock.patch.object(zone, "refresh_zone_info") as mock_refresh:
+                assert zone.get_heat_setpoint_raw() == 70
+                assert zone.get_current_temperature_raw() == 73
+                assert zone.get_outdoor_temperature_raw() == 19
+            mock_refresh.assert_not_called()
+
+            # failures back off and are counted
+            self.pyhtcc._post_zone_list_data = unittest.mock.Mock(
+                side_effect=UnexpectedError("down")
+            )
+            _wait_for(
+                lambda: self.pyhtcc.get_background_refresh_stats().consecutive_failures
+                >= 3
+            )
+            stats = self.pyhtcc.get_background_refresh_stats()
+            assert isinstance(stats.last_error, UnexpectedError)
+            assert stats.failures >= stats.consecutive_failures
+            assert stats.next_wait == 0.04
+        finally:
+            self.pyhtcc.stop_background_refresh()
+
+        assert not self.pyhtcc.background_refreshing
+
+    def test_device_limits_are_checked_before_submitting(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+
+        limits = self.pyhtcc.get_device_limits(123456)
+        assert (limits.heat_lower, limits.heat_upper) == (40, 90)
+        assert limits.system_modes_allowed[SystemMode.AutoHeat] is False
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ) as mock_request_json:
+            with pytest.raises(InvalidControlChangeError):
+                zone.set_permanent_heat_setpoint(95)
+            with pytest.raises(InvalidControlChangeError):
+                zone.set_permanent_cool_setpoint(45)
+            with pytest.raises(InvalidControlChangeError):
+                zone.submit_control_changes({"SystemSwitch": SystemMode.AutoCool})
+            with pytest.raises(InvalidControlChangeError):
+                zone.submit_control_changes({"FanMode": FanMode.FollowSchedule})
+
+            # no requests were made for bad writes
+            mock_request_json.assert_not_called()
+
+            zone.set_permanent_heat_setpoint(72)
+            assert mock_request_json.call_args[1]["data"]["HeatSetpoint"] == 72
+
+            self.pyhtcc.clamp_setpoints = True
+            zone.set_permanent_heat_setpoint(95)
+            assert mock_request_json.call_args[1]["data"]["HeatSetpoint"] == 90
+
+            self.pyhtcc.validate_limits = False
+            zone.set_permanent_heat_setpoint(95)
+            assert mock_request_json.call_args[1]["data"]["HeatSetpoint"] == 95
+
+    def test_device_limits_deadband(self):
+        limits = DeviceLimits(deadband=3, setpoint_change_allowed=True)
+        assert limits.check({"HeatSetpoint": 68, "CoolSetpoint": 71})
+        with pytest.raises(InvalidControlChangeError):
+            limits.check({"HeatSetpoint": 68, "CoolSetpoint": 70})
+
+        with pytest.raises(InvalidControlChangeError):
+            DeviceLimits(setpoint_change_allowed=False).check({"HeatSetpoint": 68})
+
+        # outside of auto, a single setpoint isn't held to the deadband (the portal moves the other one)
+        limits = limits._replace(heat_setpoint=68, cool_setpoint=72)
+        assert limits.check({"HeatSetpoint": 70, "SystemSwitch": SystemMode.Heat})
+        assert limits.check({"CoolSetpoint": 70})
+
+        # in auto, it is checked against the device's current other setpoint
+        assert limits.check({"HeatSetpoint": 69, "SystemSwitch": SystemMode.AutoHeat})
+        with pytest.raises(InvalidControlChangeError):
+            limits.check({"HeatSetpoint": 70, "SystemSwitch": SystemMode.AutoHeat})
+        with pytest.raises(InvalidControlChangeError):
+            limits.check({"CoolSetpoint": 70, "SystemSwitch": SystemMode.AutoCool})
+
+        # clamping moves the changed setpoint instead
+        assert (
+            limits.check(
+                {"HeatSetpoint": 70, "SystemSwitch": SystemMode.AutoHeat}, clamp=True
+            )["HeatSetpoint"]
+            == 69
+        )
+        assert (
+            limits.check(
+                {"CoolSetpoint": 70, "SystemSwitch": SystemMode.AutoCool}, clamp=True
+            )["CoolSetpoint"]
+            == 71
+        )
+        assert limits.check({"HeatSetpoint": 68, "CoolSetpoint": 70}, clamp=True) == {
+            "HeatSetpoint": 67,
+            "CoolSetpoint": 70,
+        }
+
+        # unknown modes aren't bare ValueErrors
+        with pytest.raises(InvalidControlChangeError):
+            DeviceLimits().check({"SystemSwitch": 42})
+        with pytest.raises(InvalidControlChangeError):
+            DeviceLimits().check({"FanMode": 42})
+
+        # nothing reported means nothing is checked
+        assert DeviceLimits().check({"HeatSetpoint": 500, "SystemSwitch": 4})
+
+    def test_device_limits_deadband_with_setters(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+        self.pyhtcc._device_limits[123456] = self.pyhtcc.get_device_limits(
+            123456
+        )._replace(deadband=3, system_modes_allowed={})
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "_request_json", return_value={"success": 1}
+        ) as mock_request_json:
+            # the cooling setpoint is 75, but setting heat switches to Heat (so no deadband)
+            zone.set_permanent_heat_setpoint(73)
+            assert mock_request_json.call_args[1]["data"]["HeatSetpoint"] == 73
+
+            with pytest.raises(InvalidControlChangeError):
+                zone.submit_control_changes(
+                    zone.build_control_changes(heat=73, system_mode=SystemMode.AutoHeat)
+                )
+
+            zone.set_permanent_cool_setpoint(80)
+            # checked against the just submitted cooling setpoint
+            zone.submit_control_changes(
+                zone.build_control_changes(heat=77, system_mode=SystemMode.AutoHeat)
+            )
+            assert mock_request_json.call_count == 3
+
     def test_getting_outdoor_weather_for_zone(self):
         result = unittest.mock.Mock()
         # put data in that is part of the actual response that we care about
@@ -198,6 +669,63 @@ class TestPyHTCC:
             "OutdoorHumidity": None,
         }
 
+    def test_get_control_page_properties(self):
+        result = unittest.mock.Mock()
+        result.text = """
+            <h1 id="ZoneName">UPSTAIRS Control</h1>
+        Control.Model.set(Control.Model.Property.isInVacationHoldMode, false);
+        Control.Model.set(Control.Model.Property.outdoorHumidity, 47.5000);
+        Control.Model.set(Control.Model.Property.outdoorTemp, 74);
+        Control.Model.set(Control.Model.Property.dispUnits, 'F');
+        Control.Model.set(Control.Model.Property.coolUpLimit, null);
+        Control.Model.set(Control.Model.Property.outdoorTemp, 12);"""
+        self.mock_get_result(result)
+
+        assert self.pyhtcc._get_control_page_properties(0) == {
+            "ZoneName": "UPSTAIRS",
+            "isInVacationHoldMode": False,
+            "outdoorHumidity": 47.5,
+            # first value wins
+            "outdoorTemp": 74,
+            "dispUnits": "F",
+            "coolUpLimit": None,
+        }
+
+    def test_get_control_page_properties_stops_reading_once_found(self):
+        result = unittest.mock.Mock()
+        result.text = """
+            <h1 id="ZoneName">UPSTAIRS Control</h1>
+        Control.Model.set(Control.Model.Property.outdoorHumidity, 47);
+        Control.Model.set(Control.Model.Property.outdoorTemp, 74);
+        """ + (
+            "<div>filler</div>\n" * 1000
+        )
+        self.mock_get_result(result, chunk_size=16)
+
+        assert self.pyhtcc._get_control_page_properties(
+            0, needed=("outdoorTemp", "outdoorHumidity")
+        ) == {
+            "ZoneName": "UPSTAIRS",
+            "outdoorHumidity": 47,
+            "outdoorTemp": 74,
+        }
+
+        # we stopped well before the end of the page and released the connection
+        assert result.iter_content.chunks_read < 20
+        result.close.assert_called_once_with()
+        assert self.mock_session.get.call_args[1]["stream"] is True
+
+    def test_control_page_scanner_handles_split_bytes(self):
+        scanner = pyhtcc.pyhtcc._ControlPageScanner(needed=("outdoorTemp",))
+        data = "°\nControl.Model.set(Control.Model.Property.outdoorTemp, 74);\n".encode(
+            "utf-8"
+        )
+        for i in range(len(data)):
+            scanner.feed(data[i : i + 1])
+
+        assert scanner.done
+        assert scanner.close() == {"outdoorTemp": 74}
+
     def test_get_name_for_device_id(self):
         result = unittest.mock.Mock()
         result.text = """<div class="TitleAndAlerts">
@@ -221,6 +749,104 @@ class TestPyHTCC:
         with pytest.raises(AttributeError):
             assert self.pyhtcc._get_name_for_device_id(1) == "DOWNSTAIRS"
 
+    def test_device_name_cache_seeding_and_invalidation(self):
+        self.pyhtcc.seed_device_names({"5": "SEEDED"})
+        # no request is needed for a seeded name
+        self.mock_get_result(None)
+        assert self.pyhtcc._get_name_for_device_id(5) == "SEEDED"
+
+        result = unittest.mock.Mock()
+        result.text = '<h1 id="ZoneName">RENAMED Control</h1>'
+        self.mock_get_result(result)
+
+        self.pyhtcc.invalidate_device_name(5)
+        assert self.pyhtcc._get_name_for_device_id(5) == "RENAMED"
+
+    def test_device_name_cache_does_not_keep_client_alive(self):
+        result = unittest.mock.Mock()
+        result.text = '<h1 id="ZoneName">DOWNSTAIRS Control</h1>'
+        self.mock_get_result(result)
+        assert self.pyhtcc._get_name_for_device_id(0) == "DOWNSTAIRS"
+
+        ref = weakref.ref(self.pyhtcc)
+        self.pyhtcc = None
+        gc.collect()
+        assert ref() is None
+
+    def test_metadata_cache(self, tmp_path):
+        cache = MetadataCache(str(tmp_path / "sub" / "metadata.json"))
+        assert cache.load("user") is None
+
+        self.pyhtcc.metadata_cache = cache
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc.get_zones_info()
+
+        metadata = cache.load("USER")
+        assert metadata["location_id"] == 12345
+        assert metadata["device_names"] == {"123456": "A", "1234567": "B"}
+        # username isn't stored in plain text
+        assert "user" not in (tmp_path / "sub" / "metadata.json").read_text()
+
+        # a new client starts with the names from the cache
+        new_pyhtcc = PyHTCC("user", "pass", metadata_cache=cache)
+        assert new_pyhtcc.get_cached_metadata()["location_id"] == 12345
+        self.mock_get_result(None)
+        assert new_pyhtcc._get_name_for_device_id(1234567) == "B"
+
+        # unchanged metadata does not rewrite the file
+        with unittest.mock.patch.object(cache, "save") as mock_save:
+            new_pyhtcc._update_metadata_cache(
+                [
+                    {"DeviceID": 123456, "Name": "A", "DispUnits": "F"},
+                    {"DeviceID": 1234567, "Name": "B", "DispUnits": "F"},
+                ]
+            )
+            mock_save.assert_not_called()
+
+    def test_metadata_cache_max_age(self, tmp_path):
+        cache = MetadataCache(str(tmp_path / "metadata.json"), max_age=10)
+        cache.save("user", {"location_id": 1, "device_names": {}})
+        assert cache.load("user")["location_id"] == 1
+
+        with unittest.mock.patch(
+            "pyhtcc.pyhtcc.time.time", return_value=time.time() + 11
+        ):
+            assert cache.load("user") is None
+
+    def test_get_state_and_from_state(self):
+        self.mock_session.cookies.get_dict.return_value = {"session": "abc"}
+        self.pyhtcc.seed_device_names({1: "A"})
+        self.pyhtcc._locationIds = [12345, 777]
+
+        state = self.pyhtcc.get_state()
+        assert state == {
+            "username": "user",
+            "password": "pass",
+            "cookies": {"session": "abc"},
+            "location_id": 12345,
+            "location_ids": [12345, 777],
+            "device_names": {1: "A"},
+        }
+
+        # survives a round trip through json
+        state = json.loads(json.dumps(state))
+
+        self.mock_session.post.reset_mock()
+        new_pyhtcc = PyHTCC.from_state(state)
+
+        # no login was needed
+        self.mock_session.post.assert_not_called()
+        self.mock_session.cookies.update.assert_called_once_with({"session": "abc"})
+        assert new_pyhtcc._locationId == 12345
+        assert new_pyhtcc.get_location_ids() == [12345, 777]
+        assert new_pyhtcc._get_name_for_device_id(1) == "A"
+
+        # without cookies, we login
+        state["cookies"] = None
+        PyHTCC.from_state(state)
+        self.mock_session.post.assert_called_once()
+
     def test_authentication_can_fail_eventually(self):
         def _raise():
             _raise.count += 1
@@ -290,7 +916,176 @@ class TestPyHTCC:
         with pytest.raises(NoZonesFoundError):
             self.pyhtcc.get_zones_info()
 
-        self.pyhtcc._post_zone_list_data.assert_called_once_with(1)
+        self.pyhtcc._post_zone_list_data.assert_called_once_with(1, 12345)
+
+    def test_get_location_ids(self):
+        self.pyhtcc._post_location_list_data = unittest.mock.Mock(
+            return_value=[{"LocationID": 777}, {"LocationID": 12345}]
+        )
+        assert self.pyhtcc.get_location_ids() == [12345, 777]
+
+        # cached
+        assert self.pyhtcc.get_location_ids() == [12345, 777]
+        self.pyhtcc._post_location_list_data.assert_called_once_with()
+
+        # falls back to the login location if the list is unavailable
+        self.pyhtcc._post_location_list_data.return_value = None
+        assert self.pyhtcc.get_location_ids(refresh=True) == [12345]
+
+    def test_get_zones_info_multiple_locations(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._post_location_list_data = lambda: [
+            {"LocationID": 12345},
+            {"LocationID": 777},
+            {"LocationID": 888},
+        ]
+
+        def _handle_post_zone_list_data(page_num, location_id=None):
+            if page_num != 1:
+                return None
+            return {
+                12345: SAMPLE_POST_ZONE_DATA[:1],
+                777: SAMPLE_POST_ZONE_DATA[1:],
+                # no zones in this location
+                888: None,
+            }[location_id]
+
+        self.pyhtcc._post_zone_list_data = _handle_post_zone_list_data
+
+        zones = self.pyhtcc.get_zones_info()
+        assert [(z["DeviceID"], z["LocationID"]) for z in zones] == [
+            (1234567, 12345),
+            (123456, 777),
+        ]
+
+    def test_get_zone_list_data_makes_no_per_zone_requests(self):
+        self.pyhtcc._get_name_for_device_id = unittest.mock.Mock()
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock()
+
+        zones = self.pyhtcc.get_zone_list_data()
+        assert [(z["DeviceID"], z["LocationID"]) for z in zones] == [
+            (1234567, 12345),
+            (123456, 12345),
+        ]
+        assert all(set(z) <= pyhtcc.pyhtcc.ZONE_LIST_FIELDS for z in zones)
+
+        self.pyhtcc._get_name_for_device_id.assert_not_called()
+        self.pyhtcc._get_check_data_session.assert_not_called()
+
+    def test_iter_zones_info(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        zones = self.pyhtcc.iter_zones_info()
+        assert not isinstance(zones, list)
+
+        first = next(zones)
+        assert first["Name"] == "B"
+        assert self.pyhtcc._get_check_data_session.call_count == 1
+
+        assert [z["Name"] for z in zones] == ["A"]
+
+    def test_zone_workers(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+
+        # both zones' CheckDataSession requests must be in flight at the same time to get through
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _get_check_data_session(device_id):
+            barrier.wait()
+            return SAMPLE_GET_DATA_SESSION
+
+        self.pyhtcc._get_check_data_session = _get_check_data_session
+        self.pyhtcc.zone_workers = 4
+
+        # still in zone list order
+        assert [z["Name"] for z in self.pyhtcc.get_zones_info()] == ["B", "A"]
+        assert [z["Name"] for z in self.pyhtcc.iter_zones_info()] == ["B", "A"]
+
+    def test_cli_write_zone_infos(self):
+        from pyhtcc.__main__ import _write_zone_infos
+
+        zone_infos = [
+            {
+                "DeviceID": 1,
+                "Name": "A",
+                "latestData": {"uiData": {"HeatSetpoint": 68}},
+            },
+            {"DeviceID": 2, "Name": "B", "latestData": {}},
+        ]
+        fields = ["Name", "latestData.uiData.HeatSetpoint"]
+
+        out = io.StringIO()
+        _write_zone_infos(zone_infos, "ndjson", fields, out)
+        assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+            {"Name": "A", "latestData.uiData.HeatSetpoint": 68},
+            {"Name": "B", "latestData.uiData.HeatSetpoint": None},
+        ]
+
+        out = io.StringIO()
+        _write_zone_infos(zone_infos, "json", None, out)
+        assert json.loads(out.getvalue()) == zone_infos
+
+        out = io.StringIO()
+        _write_zone_infos(iter(zone_infos), "csv", fields, out)
+        assert out.getvalue().splitlines() == [
+            "Name,latestData.uiData.HeatSetpoint",
+            "A,68",
+            "B,",
+        ]
+
+    def test_detail_levels(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._get_name_for_device_id = unittest.mock.Mock(return_value="A")
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        zones = self.pyhtcc.get_all_zones(detail=DetailLevel.List)
+        assert [z.detail for z in zones] == [DetailLevel.List] * 2
+        assert "latestData" not in zones[0].available_fields
+        self.pyhtcc._get_name_for_device_id.assert_not_called()
+
+        # the name can still be gotten on demand
+        assert zones[0].get_name() == "A"
+        assert zones[0].detail == DetailLevel.Names
+
+        zones = self.pyhtcc.get_zones_info(detail=DetailLevel.Session)
+        assert "latestData" in zones[0]
+        assert "OutdoorTemperature" not in zones[0]
+        assert self.pyhtcc._get_check_data_session.call_count == 2
+
+        zone = self.pyhtcc.get_all_zones()[0]
+        assert zone.detail == DetailLevel.Full
+        assert zone.available_fields == DETAIL_LEVEL_FIELDS[DetailLevel.Full]
+
+        assert DetailLevel.for_fields(["DeviceID", "DispTemp"]) == DetailLevel.List
+        assert DetailLevel.for_fields(["DispTemp", "Name"]) == DetailLevel.Names
+        assert DetailLevel.for_fields(["latestData"]) == DetailLevel.Session
+        assert DetailLevel.for_fields(["NotAField"]) == DetailLevel.Full
+
+        from pyhtcc.__main__ import _get_detail_for_fields, _get_output_fields
+
+        assert _get_detail_for_fields(["DispTemp", "Name"]) == DetailLevel.Names
+        assert _get_detail_for_fields(["latestData.uiData.HeatSetpoint"]) == (
+            DetailLevel.Session
+        )
+        assert _get_detail_for_fields(None) == DetailLevel.Full
+
+        # csv only writes its default fields, which don't need the Control page
+        assert _get_detail_for_fields(_get_output_fields("csv", None)) == (
+            DetailLevel.Session
+        )
+        assert _get_output_fields("csv", ["Name"]) == ["Name"]
+        for fmt in ("pprint", "json", "ndjson"):
+            assert _get_detail_for_fields(_get_output_fields(fmt, None)) == (
+                DetailLevel.Full
+            )
 
     def test_get_zone_by_name_and_others(self):
         self.mock_zone_name_cache()
@@ -312,6 +1107,186 @@ class TestPyHTCC:
         with pytest.raises(ZoneNotFoundError):
             zone.refresh_zone_info()
 
+    def test_get_zone_by_name_uses_name_index(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc.seed_device_names({123456: "Upstairs", 1234567: "Downstairs"})
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        zone = self.pyhtcc.get_zone_by_name("UPSTAIRS")
+        assert zone.device_id == 123456
+        assert zone.get_name() == "Upstairs"
+        # only the matching zone's info was fetched
+        self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+
+        zones = self.pyhtcc.get_zones_by_name("*stairs")
+        assert sorted(z.device_id for z in zones) == [123456, 1234567]
+        assert self.pyhtcc.get_zones_by_name("basement*") == []
+        with pytest.raises(NameError):
+            self.pyhtcc.get_zone_by_name("Basement")
+
+        # renames are picked up once the cached name is invalidated
+        self.pyhtcc.invalidate_device_name()
+        self.mock_zone_name_cache()
+        assert self.pyhtcc._get_name_index() == {}
+        assert self.pyhtcc.get_zone_by_name("a").device_id == 123456
+        with pytest.raises(NameError):
+            self.pyhtcc.get_zone_by_name("upstairs")
+
+    def test_get_zone_by_name_with_expired_names(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._device_names.ttl = 10
+        self.pyhtcc.seed_device_names({123456: "Upstairs", 1234567: "Downstairs"})
+        self.mock_zone_name_cache()
+
+        with unittest.mock.patch.object(
+            self.pyhtcc,
+            "_iter_zone_list_for_location",
+            wraps=self.pyhtcc._iter_zone_list_for_location,
+        ) as mock_zone_list:
+            # expired names aren't matched (both zones were renamed since)
+            with unittest.mock.patch(
+                "pyhtcc.pyhtcc.time.monotonic", return_value=time.monotonic() + 11
+            ):
+                assert self.pyhtcc._get_name_index() == {}
+                with pytest.raises(NameError):
+                    self.pyhtcc.get_zone_by_name("Upstairs")
+
+            # a full lookup enriches the rows it already has instead of paging the zone list again
+            zone = self.pyhtcc.get_zone_by_name("b")
+            assert zone.device_id == 1234567
+            assert zone.get_name() == "B"
+            assert mock_zone_list.call_count == 2
+
+    def test_get_zone_by_name_with_renamed_zone(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc.seed_device_names({123456: "Upstairs"})
+        self.mock_zone_name_cache()
+        # the cached name expires while the zone is being fetched
+        self.pyhtcc.get_zone_info = unittest.mock.Mock(
+            return_value={"DeviceID": 123456, "Name": "A"}
+        )
+
+        with pytest.raises(NameError):
+            self.pyhtcc.get_zone_by_name("Upstairs")
+
+    def test_get_zone_by_name_with_glob_characters(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc._get_name_for_device_id = lambda device_id: {
+            123456: "Kids Room [2]",
+            1234567: "Kids Room 2",
+        }[device_id]
+
+        # an exact name wins over the glob meaning of its characters
+        assert self.pyhtcc.get_zone_by_name("kids room [2]").device_id == 123456
+        zones = self.pyhtcc.get_zones_by_name("Kids Room [2]")
+        assert [z.device_id for z in zones] == [123456]
+
+        # from the name cache too
+        self.pyhtcc.seed_device_names({123456: "Kids Room [2]", 1234567: "Kids Room 2"})
+        assert self.pyhtcc._get_name_index()["kids room [2]"] == [123456]
+        assert self.pyhtcc.get_zone_by_name("Kids Room [2]").device_id == 123456
+
+        # without an exact match, it is a glob
+        zones = self.pyhtcc.get_zones_by_name("kids room [0-9]")
+        assert [z.device_id for z in zones] == [1234567]
+
+    def test_zones_are_shared_per_device(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+
+        zones = self.pyhtcc.get_all_zones()
+        zone = self.pyhtcc.get_zone_by_name("A")
+        assert zone is zones[1]
+        assert Zone(123456, self.pyhtcc) is zone
+        assert Zone({"DeviceID": 123456, "DispTemp": 80}, self.pyhtcc) is zone
+        assert zone.zone_info["DispTemp"] == 80
+        assert zone.zone_info["Name"] == "A"
+
+        # a refresh via one reference is seen by all of them
+        zone.refresh_zone_info(DataSource.ZoneList)
+        assert zones[1].zone_info["DispTemp"] == 73
+
+        assert len(self.pyhtcc.get_known_zones()) == 2
+
+        # only readings from the new info are recorded again
+        heat_setpoints = len(zone.history["HeatSetpoint"])
+        outdoor_temps = len(zone.history["OutdoorTemperature"])
+        disp_temps = len(zone.history["DispTemp"])
+        self.pyhtcc.get_all_zones(detail=DetailLevel.Names)
+        Zone({"DeviceID": 123456, "Name": "A"}, self.pyhtcc)
+        assert len(zone.history["HeatSetpoint"]) == heat_setpoints
+        assert len(zone.history["OutdoorTemperature"]) == outdoor_temps
+        assert len(zone.history["DispTemp"]) > disp_temps
+
+        del zones, zone
+        gc.collect()
+        assert self.pyhtcc.get_known_zones() == []
+
+    def test_shared_zone_is_initialized_once(self):
+        entered = threading.Event()
+        release = threading.Event()
+        record_history = Zone._record_history
+
+        def _slow_record_history(zone, *args, **kwargs):
+            if not entered.is_set():
+                entered.set()
+                release.wait(1)
+            return record_history(zone, *args, **kwargs)
+
+        zones = []
+        with unittest.mock.patch.object(Zone, "_record_history", _slow_record_history):
+            first = threading.Thread(
+                target=lambda: zones.append(
+                    Zone({"DeviceID": 999, "Name": "C"}, self.pyhtcc)
+                )
+            )
+            first.start()
+            assert entered.wait(1)
+
+            # created while the first thread is still initializing the same Zone
+            second = threading.Thread(
+                target=lambda: zones.append(
+                    Zone({"DeviceID": 999, "DispTemp": 80}, self.pyhtcc)
+                )
+            )
+            second.start()
+            second.join(0.1)
+            release.set()
+            first.join()
+            second.join()
+
+        assert zones[0] is zones[1]
+        # neither thread's info was thrown away
+        assert zones[0].zone_info == {"DeviceID": 999, "Name": "C", "DispTemp": 80}
+        assert len(zones[0].history["DispTemp"]) == 1
+
+    def test_zone_from_device_id_is_lazy(self):
+        self.mock_outdoor_weather(19, 56)
+        self.pyhtcc.seed_device_names({123456: "A"})
+        self.pyhtcc._post_zone_list_data = unittest.mock.Mock(
+            return_value=SAMPLE_POST_ZONE_DATA
+        )
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        zones = [Zone(device_id, self.pyhtcc) for device_id in range(1000, 1500)]
+        zone = Zone(123456, self.pyhtcc)
+        assert not zone.loaded
+        assert zone.device_id == 123456
+        self.pyhtcc._post_zone_list_data.assert_not_called()
+
+        # the first access loads everything for only this device
+        assert zone.zone_info["DispTemp"] == 73
+        assert zone.loaded
+        assert zone.detail == DetailLevel.Full
+        self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+
+        with pytest.raises(ZoneNotFoundError):
+            zones[0].get_fan_mode()
+
     def test_get_all_zones(self):
         self.mock_zone_name_cache()
         self.mock_outdoor_weather(19, 56)
@@ -321,6 +1296,21 @@ class TestPyHTCC:
         for i in zones:
             assert isinstance(i, Zone)
 
+    def test_zone_history(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+
+        zone = self.pyhtcc.get_zone_by_name("A")
+        assert zone.history["DispTemp"].values() == [73]
+
+        zone.get_current_temperature_raw()
+        zone.get_cool_setpoint_raw()
+        # only readings from the refreshed data source are recorded
+        assert zone.history["DispTemp"].values() == [73, 73]
+        assert zone.history["CoolSetpoint"].values() == [75, 75]
+        assert zone.history["OutdoorTemperature"].mean() == 19
+        assert zone.history["DispTemp"].slope() == 0
+
     def test_zone_object(self):
         self.mock_zone_name_cache()
         self.mock_outdoor_weather(19, 56)
@@ -360,6 +1350,96 @@ class TestPyHTCC:
         assert zone.get_fan_mode() == FanMode.Auto
         assert zone.is_fan_running() is True
 
+    def test_zone_getters_only_fetch_what_they_need(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+
+        self.pyhtcc._post_zone_list_data = unittest.mock.Mock(
+            return_value=SAMPLE_POST_ZONE_DATA
+        )
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+        self.pyhtcc._get_outdoor_weather_info_for_zone = unittest.mock.Mock(
+            return_value={"OutdoorTemperature": 20, "OutdoorHumidity": 50}
+        )
+
+        assert zone.get_current_temperature_raw() == 73
+        # the device is on the first page, so no other pages are requested
+        self.pyhtcc._post_zone_list_data.assert_called_once_with(1, 12345)
+        self.pyhtcc._get_check_data_session.assert_not_called()
+        self.pyhtcc._get_outdoor_weather_info_for_zone.assert_not_called()
+
+        assert zone.get_fan_mode() == FanMode.Auto
+        assert zone.get_outdoor_temperature_raw() == 20
+        self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+        self.pyhtcc._get_outdoor_weather_info_for_zone.assert_called_once()
+        assert self.pyhtcc._post_zone_list_data.call_count == 1
+
+        # is_calling_for_cool() uses 2 other getters, but only refreshes once
+        assert zone.is_calling_for_cool() is True
+        assert self.pyhtcc._get_check_data_session.call_count == 2
+
+    def test_zone_read_batches_refreshes(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+
+        with unittest.mock.patch.object(
+            self.pyhtcc, "get_zone_info", wraps=self.pyhtcc.get_zone_info
+        ) as get_zone_info:
+            assert zone.read(
+                "get_fan_mode", Zone.get_heat_setpoint_raw, zone.get_current_temperature
+            ) == (FanMode.Auto, 70, "73°F")
+
+        get_zone_info.assert_called_once_with(
+            123456, DataSource.ZoneList | DataSource.Session, 12345
+        )
+
+        assert Zone.get_fan_mode.data_sources == DataSource.Session
+        assert Zone.get_current_temperature_raw.data_sources == DataSource.ZoneList
+
+    def test_suspended_refreshes_are_per_thread(self):
+        self.mock_zone_name_cache()
+        self.mock_outdoor_weather(19, 56)
+        zone = self.pyhtcc.get_zone_by_name("A")
+        self.pyhtcc._get_check_data_session = unittest.mock.Mock(
+            return_value=SAMPLE_GET_DATA_SESSION
+        )
+
+        in_predicate = threading.Event()
+        release = threading.Event()
+
+        def _predicate(z):
+            in_predicate.set()
+            release.wait(5)
+            return True
+
+        waiter = threading.Thread(target=zone.wait_until, args=(_predicate,))
+        waiter.start()
+        try:
+            assert in_predicate.wait(5)
+            self.pyhtcc._get_check_data_session.reset_mock()
+
+            # another thread's getter still refreshes while the first one is suspended
+            reader = threading.Thread(target=zone.get_fan_mode)
+            reader.start()
+            reader.join(5)
+            self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+        finally:
+            release.set()
+            waiter.join(5)
+
+        # the suspension ended with the predicate
+        self.pyhtcc._get_check_data_session.reset_mock()
+        zone.get_fan_mode()
+        self.pyhtcc._get_check_data_session.assert_called_once_with(123456)
+
+    def test_get_zone_info_missing_device(self):
+        with pytest.raises(ZoneNotFoundError):
+            self.pyhtcc.get_zone_info(999, DataSource.ZoneList)
+
     def test_setting_location_id_via_url(self):
         result = unittest.mock.MagicMock()
         result.url = "https://www.mytotalconnectcomfort.com/portal/90210/Zones"
@@ -388,11 +1468,17 @@ class TestPyHTCC:
 
         zone.set_permanent_cool_setpoint.assert_called_once_with(1)
 
-        with pytest.deprecated_call():
+        with pytest.deprecated_call() as record:
             assert zone.set_permananent_heat_setpoint(2) == "heat"
 
         zone.set_permanent_heat_setpoint.assert_called_once_with(2)
 
+        # attributed to the caller, so it is shown under the default warning filters
+        assert len(record) == 1
+        assert record[0].filename == __file__
+        assert "set_permananent_heat_setpoint" in str(record[0].message)
+        assert "Deprecated since version 0.1.11" in str(record[0].message)
+
     def test_coerce_temp_end_to_setpoint(self):
         self.mock_zone_name_cache()
 
@@ -448,6 +1534,31 @@ class TestPyHTCC:
         with pytest.raises(ValueError):
             zone._coerce_temp_end_to_setpoint("lol")
 
+    def test_build_control_changes(self):
+        self.mock_zone_name_cache()
+
+        zone = self.pyhtcc.get_zone_by_name("A")
+        zone._coerce_temp_end_to_setpoint = unittest.mock.Mock(return_value="next")
+
+        assert zone.build_control_changes() == {}
+        assert zone.build_control_changes(heat=68, cool=76, end="end") == {
+            "HeatSetpoint": 68,
+            "CoolSetpoint": 76,
+            "StatusHeat": 1,
+            "StatusCool": 1,
+            "HeatNextPeriod": "next",
+            "CoolNextPeriod": "next",
+        }
+        assert zone.build_control_changes(
+            cool=76, system_mode=SystemMode.Off, fan_mode=FanMode.On
+        ) == {
+            "CoolSetpoint": 76,
+            "StatusHeat": 2,
+            "StatusCool": 2,
+            "SystemSwitch": 2,
+            "FanMode": 1,
+        }
+
     def test_end_hold(self):
         self.mock_zone_name_cache()
 
@@ -513,6 +1624,14 @@ class TestPyHTCC:
             },
         )
 
+    def test_request_json_waits_for_request_budget(self):
+        self.pyhtcc.request_budget = unittest.mock.Mock()
+        self.pyhtcc.session.request = unittest.mock.Mock(
+            return_value=FakeResult(dict(result="good"))
+        )
+        self.pyhtcc._request_json("GET", "url")
+        self.pyhtcc.request_budget.acquire.assert_called_once_with()
+
     def test_request_json_not_json(self):
         self.pyhtcc.session.request = unittest.mock.Mock(
             return_value=FakeResult("not json")
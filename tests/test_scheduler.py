@@ -0,0 +1,167 @@
+"""
+includes all tests for pyhtcc.scheduler
+"""
+import datetime
+import pathlib
+import sys
+import time
+import unittest.mock
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from pyhtcc import DetailLevel, Zone
+from pyhtcc.plan import PlanError
+from pyhtcc.scheduler import CatchUp, SetpointScheduler
+
+SCHEDULES = {
+    "*": {"06:00": {"fan": "auto"}},
+    "Upstairs": {"06:00": {"heat": 68}, "22:00": {"heat": 62}},
+    "2": {"22:00": {"cool": 80}},
+}
+
+
+def _at(day, hour, minute=0, second=0):
+    return datetime.datetime(2024, 1, day, hour, minute, second)
+
+
+@pytest.fixture
+def pyhtcc():
+    pyhtcc = unittest.mock.Mock()
+    pyhtcc.get_all_zones.return_value = [
+        Zone({"DeviceID": 1, "Name": "Upstairs"}, pyhtcc),
+        Zone({"DeviceID": 2, "Name": "Downstairs"}, pyhtcc),
+    ]
+    return pyhtcc
+
+
+def _submitted(pyhtcc):
+    return {c[0][0]: c[0][1] for c in pyhtcc.submit_raw_control_changes.call_args_list}
+
+
+def test_catch_up_latest_on_start(pyhtcc):
+    scheduler = SetpointScheduler(pyhtcc, SCHEDULES)
+    results = scheduler.run_pending(_at(1, 12))
+
+    # each zone gets its most recent transition, merged with the '*' one
+    assert results == {
+        "Upstairs": {
+            "FanMode": 0,
+            "HeatSetpoint": 68,
+            "StatusHeat": 2,
+            "StatusCool": 2,
+            "SystemSwitch": 1,
+        },
+        # its most recent transition is 22:00 yesterday
+        "Downstairs": {
+            "FanMode": 0,
+            "CoolSetpoint": 80,
+            "StatusHeat": 2,
+            "StatusCool": 2,
+            "SystemSwitch": 3,
+        },
+    }
+    pyhtcc.get_all_zones.assert_called_once_with(detail=DetailLevel.Names)
+    assert scheduler.get_next_run_time() == _at(1, 22)
+
+
+def test_catch_up_skip(pyhtcc):
+    scheduler = SetpointScheduler(pyhtcc, SCHEDULES, catch_up=CatchUp.Skip)
+    assert scheduler.run_pending(_at(1, 12)) == {}
+    pyhtcc.submit_raw_control_changes.assert_not_called()
+
+    # after being down for a day, missed transitions are skipped too
+    assert scheduler.run_pending(_at(2, 23)) == {}
+    assert scheduler.get_next_run_time() == _at(3, 6)
+
+
+def test_simultaneous_transitions_are_merged_per_zone(pyhtcc):
+    scheduler = SetpointScheduler(pyhtcc, SCHEDULES, catch_up=CatchUp.Skip)
+    scheduler.run_pending(_at(1, 12))
+
+    assert scheduler.run_pending(_at(1, 21, 59)) == {}
+    scheduler.run_pending(_at(1, 22, 0, 30))
+
+    # one request per zone
+    assert pyhtcc.submit_raw_control_changes.call_count == 2
+    assert _submitted(pyhtcc)[1]["HeatSetpoint"] == 62
+    assert _submitted(pyhtcc)[2]["CoolSetpoint"] == 80
+
+    pyhtcc.submit_raw_control_changes.reset_mock()
+    scheduler.run_pending(_at(2, 6))
+    assert _submitted(pyhtcc)[1] == {
+        "FanMode": 0,
+        "HeatSetpoint": 68,
+        "StatusHeat": 2,
+        "StatusCool": 2,
+        "SystemSwitch": 1,
+    }
+    assert _submitted(pyhtcc)[2] == {"FanMode": 0}
+
+
+def test_missed_transitions_catch_up_latest(pyhtcc):
+    scheduler = SetpointScheduler(pyhtcc, {"Upstairs": SCHEDULES["Upstairs"]})
+    scheduler.run_pending(_at(1, 12))
+    pyhtcc.submit_raw_control_changes.reset_mock()
+
+    # down from before 22:00 until after 06:00 and 22:00 the next day: only the latest is applied
+    scheduler.run_pending(_at(2, 23))
+    pyhtcc.submit_raw_control_changes.assert_called_once()
+    assert _submitted(pyhtcc)[1]["HeatSetpoint"] == 62
+    assert scheduler.get_next_run_time() == _at(3, 6)
+
+
+def test_failures_are_reported(pyhtcc):
+    pyhtcc.submit_raw_control_changes.side_effect = ValueError("nope")
+    scheduler = SetpointScheduler(pyhtcc, {"Upstairs": {"06:00": {"heat": 68}}})
+    results = scheduler.run_pending(_at(1, 12))
+    assert isinstance(results["Upstairs"], ValueError)
+    assert scheduler.results == results
+
+
+def test_invalid_schedules_raise(pyhtcc):
+    with pytest.raises(PlanError):
+        SetpointScheduler(pyhtcc, {"Upstairs": {"6am": {"heat": 68}}})
+
+    with pytest.raises(PlanError):
+        SetpointScheduler(pyhtcc, {"Upstairs": {"06:00": {"heat": 68, "bogus": 1}}})
+
+
+def test_start_and_stop(pyhtcc):
+    with SetpointScheduler(pyhtcc, {"Upstairs": {"00:00": {"heat": 68}}}):
+        deadline = time.monotonic() + 5
+        while (
+            not pyhtcc.submit_raw_control_changes.called and time.monotonic() < deadline
+        ):
+            time.sleep(0.01)
+
+    pyhtcc.submit_raw_control_changes.assert_called_once()
+
+
+def test_unknown_zone_keys_dont_stop_the_others(pyhtcc):
+    schedules = {"Upstairs": {"06:00": {"heat": 68}}, "Attic": {"06:00": {"heat": 60}}}
+    scheduler = SetpointScheduler(pyhtcc, schedules, catch_up=CatchUp.Skip)
+    scheduler.run_pending(_at(1, 5))
+
+    results = scheduler.run_pending(_at(1, 6))
+    assert isinstance(results["Attic"], PlanError)
+    assert results["Upstairs"]["HeatSetpoint"] == 68
+    # zones were gotten again in case Attic was just added
+    assert pyhtcc.get_all_zones.call_count == 2
+
+    # once the zone shows up, it gets its transitions too
+    pyhtcc.get_all_zones.return_value = pyhtcc.get_all_zones.return_value + [
+        Zone({"DeviceID": 3, "Name": "Attic"}, pyhtcc)
+    ]
+    pyhtcc.submit_raw_control_changes.reset_mock()
+    results = scheduler.run_pending(_at(2, 6))
+    assert results["Attic"]["HeatSetpoint"] == 60
+    assert _submitted(pyhtcc)[3]["HeatSetpoint"] == 60
+    assert _submitted(pyhtcc)[1]["HeatSetpoint"] == 68
+
+
+def test_start_checks_zone_keys(pyhtcc):
+    scheduler = SetpointScheduler(pyhtcc, {"Attic": {"06:00": {"heat": 60}}})
+    with pytest.raises(PlanError):
+        scheduler.start()
+    assert scheduler._thread is None